@@ -0,0 +1,245 @@
+# coding=utf-8
+"""
+Breakout Game
+Batch runner for tuning levels: plays every level many times without a
+display, over a spread of launch angles and seeds, on all cores. Reports how
+long levels take to clear, how often balls are lost and how often each block
+gets hit.
+
+usage: python batch.py [--levels assets/levels.txt] [--angles 9] [--seeds 8] [--policy track|random]
+"""
+
+import argparse, json, os, random, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import util
+
+import engine
+from engine import Game, Input
+from levelpack import load_level_pack
+
+
+class CountingLevel(engine.Level):
+    # counts hits on each block and lives lost. hits are kept per level number,
+    # as clearing a level moves straight on to the next.
+    def __init__(self, sim, canvas, radius, game_levels):
+        self.hits_by_level = {}
+        self.lives_lost = 0
+        engine.Level.__init__(self, sim, canvas, radius, game_levels)
+
+    def new_level(self, level):
+        engine.Level.new_level(self, level)
+        self.block_hits = self.hits_by_level[level] = [0] * len(self.blocks)
+
+    def hit_block(self, block):
+        self.block_hits[block.index] += 1
+        return engine.Level.hit_block(self, block)
+
+    def lose_life(self):
+        self.lives_lost += 1
+        engine.Level.lose_life(self)
+
+
+class BatchSimulation(engine.Simulation):
+    def create_level(self, game_levels):
+        return CountingLevel(self, self.canvas, self.radius, game_levels)
+
+
+class TrackPolicy:
+    # keeps the paddle under the lowest falling ball, hitting it off centre by
+    # an offset picked per game so the bounces vary
+    def __init__(self, rnd):
+        self.aim = rnd.uniform(-30, 30)
+
+    def __call__(self, sim):
+        if sim.game.state == Game.PREGAME:
+            return Input.KEY | Input.LAUNCH
+        target = None
+        for ball in sim.balls:
+            if ball.dy > 0 and (target is None or ball.y > target[1]):
+                target = (ball.x, ball.y)
+        multiball = sim.level.multiball
+        n = multiball.count
+        if n:
+            falling = multiball.dy[:n] > 0
+            if falling.any():
+                i = int((multiball.y[:n] * falling).argmax())
+                if target is None or multiball.y[i] > target[1]:
+                    target = (float(multiball.x[i]), float(multiball.y[i]))
+        if target is None:
+            return Input.NONE
+        px = sim.paddle.x + sim.canvas.offset_x + self.aim
+        if target[0] < px - sim.paddle_speed:
+            return Input.LEFT
+        if target[0] > px + sim.paddle_speed:
+            return Input.RIGHT
+        return Input.NONE
+
+
+class RandomPolicy:
+    # holds left, right or nothing for a random number of ticks at a time
+    def __init__(self, rnd):
+        self.random = rnd
+        self.inputs = Input.NONE
+        self.hold = 0
+
+    def __call__(self, sim):
+        if sim.game.state == Game.PREGAME:
+            return Input.KEY | Input.LAUNCH
+        if self.hold <= 0:
+            self.inputs = self.random.choice((Input.NONE, Input.LEFT, Input.RIGHT))
+            self.hold = self.random.randint(5, 60)
+        self.hold -= 1
+        return self.inputs
+
+
+policies = {'track': TrackPolicy, 'random': RandomPolicy}
+
+# per worker process, set by init_worker
+worker_levels = None
+worker_tick_rate = None
+
+
+def init_worker(levels_path, tick_rate):
+    global worker_levels, worker_tick_rate
+    worker_levels = load_level_pack(levels_path)
+    worker_tick_rate = tick_rate
+    # closed as the worker process exits
+    util.Finalize(None, worker_levels.close, exitpriority=1)
+
+
+def play_game(job):
+    # plays one level until it is cleared, the game is lost or max_ticks run out
+    level_index, heading, seed, policy_name, lives, max_ticks = job
+    sim = BatchSimulation(game_levels=worker_levels, seed=seed, tick_rate=worker_tick_rate, event_driven=True)
+    level = sim.level
+    level.launch_heading = heading
+    level.lives = lives
+    level.new_level(level_index)
+    sim.game.state = Game.PREGAME
+    policy = policies[policy_name](random.Random(seed))
+    state = sim.game.state
+    while sim.ticks < max_ticks:
+        state = sim.step(policy(sim))
+        if state in (Game.LEVEL_CLEARED, Game.WIN, Game.LOSS):
+            break
+    return {
+        'level': level_index,
+        'heading': heading,
+        'seed': seed,
+        'cleared': state in (Game.LEVEL_CLEARED, Game.WIN),
+        'game_over': state == Game.LOSS,
+        'ticks': sim.ticks,
+        'lives_lost': level.lives_lost,
+        'block_hits': level.hits_by_level[level_index],
+    }
+
+
+def launch_headings(count, spread):
+    # count headings evenly spread either side of the resting ball's heading
+    base = engine.Level.launch_heading
+    if count == 1:
+        return [base]
+    return [base - spread + 2 * spread * i / (count - 1) for i in range(count)]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def summarize(level_index, level, games, tick_rate):
+    # per level results from the games played on it
+    played = len(games)
+    seconds = [game['ticks'] / float(tick_rate) for game in games]
+    clear_times = [s for s, game in zip(seconds, games) if game['cleared']]
+    lives_lost = sum(game['lives_lost'] for game in games)
+    hits = [0] * len(level['blocks'])
+    for game in games:
+        for index, count in enumerate(game['block_hits']):
+            hits[index] += count
+    blocks = [{'bx': block['bx'], 'by': block['by'], 'material': block['material'], 'reward': block['reward'],
+               'hits_per_game': count / float(played)} for block, count in zip(level['blocks'], hits)]
+    summary = {
+        'level': level_index,
+        'name': level['name'],
+        'games': played,
+        'cleared': len(clear_times) / float(played),
+        'game_over': sum(game['game_over'] for game in games) / float(played),
+        'timed_out': sum(not game['cleared'] and not game['game_over'] for game in games) / float(played),
+        'lives_lost_per_game': lives_lost / float(played),
+        'lives_lost_per_minute': lives_lost / (sum(seconds) / 60.0) if sum(seconds) else 0.0,
+        'clear_time': None,
+        'blocks': blocks,
+    }
+    if clear_times:
+        summary['clear_time'] = {'min': min(clear_times), 'p10': percentile(clear_times, 0.1),
+                                 'median': percentile(clear_times, 0.5), 'p90': percentile(clear_times, 0.9),
+                                 'max': max(clear_times), 'mean': sum(clear_times) / len(clear_times)}
+    return summary
+
+
+def report(summary):
+    lines = ['%d. %s: %d games, %.0f%% cleared, %.0f%% game over, %.0f%% timed out' % (
+        summary['level'] + 1, summary['name'], summary['games'], summary['cleared'] * 100, summary['game_over'] * 100,
+        summary['timed_out'] * 100)]
+    clear_time = summary['clear_time']
+    if clear_time:
+        lines.append('   clear time s: min %.1f  p10 %.1f  median %.1f  p90 %.1f  max %.1f' % (
+            clear_time['min'], clear_time['p10'], clear_time['median'], clear_time['p90'], clear_time['max']))
+    lines.append('   lives lost: %.2f per game, %.2f per minute' % (summary['lives_lost_per_game'],
+                                                                   summary['lives_lost_per_minute']))
+    blocks = summary['blocks']
+    if blocks:
+        never = [b for b in blocks if b['hits_per_game'] == 0]
+        hottest = sorted(blocks, key=lambda b: -b['hits_per_game'])[:3]
+        lines.append('   block hits per game: never hit %d of %d, most hit %s' % (
+            len(never), len(blocks), ', '.join('(%d,%d) %.1f' % (b['bx'], b['by'], b['hits_per_game'])
+                                               for b in hottest)))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play levels many times over without a display')
+    parser.add_argument('--levels', default='assets/levels.txt', help='level file to play')
+    parser.add_argument('--level', type=int, nargs='+', help='level numbers to play, from 1, default all')
+    parser.add_argument('--policy', choices=sorted(policies), default='track', help='how the paddle is moved')
+    parser.add_argument('--angles', type=int, default=9, help='launch angles per level')
+    parser.add_argument('--spread', type=float, default=0.5, help='radians either side of the usual launch heading')
+    parser.add_argument('--seeds', type=int, default=8, help='games per launch angle')
+    parser.add_argument('--lives', type=int, default=3, help='lives per game')
+    parser.add_argument('--max-seconds', type=float, default=300, help='game time before a game is given up')
+    parser.add_argument('--tick-rate', type=int, default=engine.base_tick_rate, help='physics ticks per second')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--output', help='also write the full results, with per block hits, as JSON')
+    args = parser.parse_args(argv)
+
+    with load_level_pack(args.levels) as levels:
+        level_indexes = [n - 1 for n in args.level] if args.level else list(range(len(levels)))
+        max_ticks = int(args.max_seconds * args.tick_rate)
+        jobs = [(level_index, heading, seed, args.policy, args.lives, max_ticks)
+                for level_index in level_indexes
+                for heading in launch_headings(args.angles, args.spread)
+                for seed in range(args.seeds)]
+
+        start = time.perf_counter()
+        games = {level_index: [] for level_index in level_indexes}
+        with ProcessPoolExecutor(args.jobs, initializer=init_worker, initargs=(args.levels, args.tick_rate)) as pool:
+            chunksize = max(1, len(jobs) // (args.jobs * 8))
+            for game in pool.map(play_game, jobs, chunksize=chunksize):
+                games[game['level']].append(game)
+        elapsed = time.perf_counter() - start
+
+        summaries = [summarize(level_index, levels[level_index], games[level_index], args.tick_rate)
+                     for level_index in level_indexes]
+    for summary in summaries:
+        print(report(summary))
+    ticks = sum(game['ticks'] for level_games in games.values() for game in level_games)
+    print('%d games, %d ticks in %.1f s on %d processes' % (len(jobs), ticks, elapsed, args.jobs))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'levels': summaries}, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+# coding=utf-8
+"""
+Breakout Game
+Benchmarks for the swept collision tests, level loading, whole level simulations
+and full frames, on synthetic levels from 8x8 up to 200x200 blocks, and for
+the particle pool with thousands of particles live.
+Rendering goes through SDL's dummy video driver. Results are written as JSON
+so runs from different commits can be compared.
+
+usage: python bench.py [--quick] [--output results.json] [--compare baseline.json]
+"""
+
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse, contextlib, io, json, math, platform, random, subprocess, sys, tempfile, time
+
+import numpy
+import pygame
+
+import engine
+import particles
+from blocks import sweep_rect
+from engine import Game, Input
+
+sizes = [8, 16, 32, 64, 128, 200]
+quick_sizes = [8, 32]
+
+
+def synthetic_levels(size, seed=0):
+    # a size x size level in the levels.txt format, every block present with a random material and reward
+    rnd = random.Random(seed)
+    lines = []
+    for _ in range(size):
+        lines.append(' '.join(rnd.choice('ABCDEFS') + rnd.choice('....LSB') for _ in range(size)))
+    lines.append('name:Synthetic %dx%d' % (size, size))
+    return '\n'.join(lines) + '\n'
+
+
+def write_levels(directory, size):
+    path = os.path.join(directory, 'levels%d.txt' % size)
+    with open(path, 'w') as level_file:
+        level_file.write(synthetic_levels(size))
+    return path
+
+
+def fresh_levels(path):
+    # levels for one simulation. playing a level changes its blocks, so
+    # simulations never share them or one run would skew the next.
+    return engine.build_game_levels(path)
+
+
+def measure(fn, number, repeat=5):
+    # best time per call in microseconds over repeat runs of number calls
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000000
+
+
+def follow_ball(sim):
+    # input for a paddle that chases the first ball, launching whenever it can
+    if sim.game.state in (Game.PREGAME, Game.LEVEL_CLEARED):
+        return Input.KEY | Input.LAUNCH
+    balls = sim.balls
+    if not balls:
+        return Input.NONE
+    px = sim.paddle.x + sim.canvas.offset_x
+    if balls[0].x < px - 5:
+        return Input.LEFT
+    if balls[0].x > px + 5:
+        return Input.RIGHT
+    return Input.NONE
+
+
+def bench_collision(results, size, path):
+    # the swept tests Ball.update runs every tick, against the middle block of the level
+    sim = engine.Simulation(game_levels=fresh_levels(path), seed=1)
+    level = sim.level
+    blocks = level.blocks
+    index = len(blocks) // 2
+    rect = blocks[index]['rect']
+    r = sim.radius
+    speed = level.ball_speed * sim.speed_scale
+    # one ball just under the block going straight up into it, one in the open going sideways
+    hit = level.create_ball(rect.centerx, rect.bottom + r + speed / 2, speed, math.pi, True)
+    miss = level.create_ball(sim.canvas.offset_x + sim.canvas.width / 2, sim.paddle.y + sim.canvas.offset_y - 60,
+                             speed, math.pi / 2, True)
+    results.append(('Ball.find_impact hit', size, measure(lambda: hit.find_impact(1.0), 20000)))
+    results.append(('Ball.find_impact miss', size, measure(lambda: miss.find_impact(1.0), 20000)))
+    x, y, dx, dy = hit.x, hit.y, hit.dx, hit.dy
+    results.append(('BlockTable.sweep', size, measure(lambda: blocks.sweep(index, x, y, dx, dy, 1.0), 20000)))
+    left, top, right, bottom = rect.x, rect.y, rect.right, rect.bottom
+    results.append(('sweep_rect', size,
+                    measure(lambda: sweep_rect(left, top, right, bottom, r, x, y, dx, dy, 1.0), 20000)))
+    grid = level.block_grid
+    results.append(('BlockGrid.query_area', size,
+                    measure(lambda: grid.query_area(x, y, x + dx, y + dy), 20000)))
+
+
+def bench_levels(results, size, path):
+    results.append(('build_game_levels', size, measure(lambda: engine.build_game_levels(path), 3, 3)))
+    sim = engine.Simulation(game_levels=fresh_levels(path), seed=1)
+    results.append(('Level.new_level', size, measure(lambda: sim.level.new_level(0), 3, 3)))
+
+
+def bench_simulation(results, size, path, ticks):
+    for name, event_driven in (('Simulation.step', False), ('Simulation.step (event driven)', True)):
+        sim = engine.Simulation(game_levels=fresh_levels(path), seed=1, event_driven=event_driven)
+        start = time.perf_counter()
+        for _ in range(ticks):
+            sim.step(follow_ball(sim))
+        elapsed = time.perf_counter() - start
+        results.append((name, size, elapsed / ticks * 1000000))
+
+
+def bench_frames(results, size, path, frames):
+    import main
+    for mode, argv in (('full', []), ('dirty', ['--dirty-rects']), ('texture', ['--renderer', 'texture'])):
+        with contextlib.redirect_stdout(io.StringIO()):
+            window = main.setup(main.parse_options(argv + ['--levels', path]))
+        # get a ball moving first so frames have something to redraw
+        main.breakout.step(Input.KEY | Input.LAUNCH)
+        main.refresh_screen(window)
+
+        def frame():
+            main.breakout.step(follow_ball(main.breakout))
+            rects = main.refresh_screen(window)
+            if rects is None:
+                pygame.display.update()
+            elif rects:
+                pygame.display.update(rects)
+
+        results.append(('frame (%s redraw)' % mode, size, measure(frame, frames, 3)))
+        main.shutdown()
+        pygame.display.quit()
+
+
+def bench_particles(results, frames):
+    # size is the number of particles live, kept topped up as they die
+    surface = pygame.Surface((800, 500))
+    for count in (1000, 4000, 8000):
+        pool = particles.ParticlePool(surface.get_rect(), seed=1)
+        pool.life[:] = 10 ** 6
+
+        def refill():
+            while pool.count < count:
+                pool.emit(400, 250, count - pool.count, (200, 120, 60), 2, 10 ** 6, 3)
+
+        def update():
+            refill()
+            pool.update()
+
+        refill()
+        results.append(('ParticlePool.update', count, measure(update, frames, 3)))
+        refill()
+        results.append(('ParticlePool.draw_pixels', count, measure(lambda: pool.draw_pixels(surface), frames, 3)))
+
+
+def bench_drops(results, frames):
+    # size is the number of drops falling, topped up as they are caught or lost
+    with engine.Simulation(seed=1) as sim:
+        level = sim.level
+        drops = level.drops
+        field = sim.canvas.ball_box_rect
+        rnd = random.Random(1)
+        for count in (8, 32, drops.capacity):
+            drops.clear()
+
+            def update():
+                while drops.count < count:
+                    drops.spawn(rnd.uniform(field.left, field.right), rnd.uniform(field.top, field.bottom), ord('L'))
+                drops.update()
+
+            results.append(('Drops.update', count, measure(update, frames, 3)))
+
+
+def metadata():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'video_driver': os.environ.get('SDL_VIDEODRIVER'),
+    }
+
+
+def compare(results, baseline):
+    # prints the change against an earlier results file, slower is positive
+    before = dict(((r['name'], r['size']), r['us']) for r in baseline['results'])
+    for r in results:
+        old = before.get((r['name'], r['size']))
+        if old:
+            print('%-34s %4d %+7.1f%%' % (r['name'], r['size'], (r['us'] - old) / old * 100))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Breakout benchmarks')
+    parser.add_argument('--quick', action='store_true', help='only the %s sizes' % quick_sizes)
+    parser.add_argument('--sizes', type=int, nargs='+', help='level sizes to run')
+    parser.add_argument('--ticks', type=int, default=2000, help='ticks per whole level simulation')
+    parser.add_argument('--frames', type=int, default=200, help='frames per frame cost run')
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    parser.add_argument('--compare', metavar='BASELINE', help='earlier JSON results to compare against')
+    args = parser.parse_args(argv)
+    run_sizes = args.sizes or (quick_sizes if args.quick else sizes)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in run_sizes:
+            print('size %dx%d' % (size, size), file=sys.stderr)
+            path = write_levels(directory, size)
+            bench_levels(results, size, path)
+            bench_collision(results, size, path)
+            bench_simulation(results, size, path, args.ticks)
+            bench_frames(results, size, path, args.frames)
+    bench_particles(results, args.frames)
+    bench_drops(results, args.frames)
+
+    report = {
+        'meta': metadata(),
+        'results': [{'name': name, 'size': size, 'us': round(us, 3)} for name, size, us in results],
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(report['results'], json.load(baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
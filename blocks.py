@@ -0,0 +1,192 @@
+# coding=utf-8
+"""
+Breakout Game
+Block table: a level's blocks kept as typed columns instead of a dict and a Rect
+per block, with a small view class for looking at one block
+"""
+
+import math
+from array import array
+
+import numpy as np
+import pygame
+
+# a block as stored in a level pack, the same layout as levelpack.block_entry
+entry_dtype = np.dtype([('bx', '<u2'), ('by', '<u2'), ('material', 'S1'), ('reward', 'S1')])
+
+# column name, array typecode and the matching numpy dtype
+columns = (('bx', 'H', np.uint16), ('by', 'H', np.uint16), ('material', 'B', np.uint8), ('reward', 'B', np.uint8),
+           ('hits', 'B', np.uint8), ('left', 'i', np.int32), ('top', 'i', np.int32), ('right', 'i', np.int32),
+           ('bottom', 'i', np.int32))
+dtypes = dict((name, dtype) for name, _, dtype in columns)
+
+
+def ray_circle_time(x, y, dx, dy, cx, cy, r):
+    # earliest t >= 0 at which the point x + dx * t, y + dy * t touches the
+    # circle while moving into it. None if it never does.
+    fx = x - cx
+    fy = y - cy
+    a = dx * dx + dy * dy
+    b = fx * dx + fy * dy
+    if a == 0 or b >= 0:
+        return None
+    c = fx * fx + fy * fy - r * r
+    if c <= 0:
+        return 0.0
+    disc = b * b - a * c
+    if disc < 0:
+        return None
+    return (-b - math.sqrt(disc)) / a
+
+
+def sweep_rect(left, top, right, bottom, r, x, y, dx, dy, limit):
+    # swept test of a ball of radius r moving from x, y by dx, dy per tick
+    # against the rect expanded by r (rounded corners). returns (t, nx, ny)
+    # for the earliest impact with t <= limit and the surface normal at that
+    # point, or None.
+    best = None
+    if dy > 0:
+        t = (top - r - y) / dy
+        if -0.000001 <= t <= limit and left <= x + dx * t <= right:
+            best = (max(t, 0.0), 0.0, -1.0)
+    elif dy < 0:
+        t = (bottom + r - y) / dy
+        if -0.000001 <= t <= limit and left <= x + dx * t <= right:
+            best = (max(t, 0.0), 0.0, 1.0)
+    if dx > 0:
+        t = (left - r - x) / dx
+        if -0.000001 <= t <= limit and top <= y + dy * t <= bottom and (best is None or t < best[0]):
+            best = (max(t, 0.0), -1.0, 0.0)
+    elif dx < 0:
+        t = (right + r - x) / dx
+        if -0.000001 <= t <= limit and top <= y + dy * t <= bottom and (best is None or t < best[0]):
+            best = (max(t, 0.0), 1.0, 0.0)
+    for cx, cy in ((left, top), (right, top), (left, bottom), (right, bottom)):
+        t = ray_circle_time(x, y, dx, dy, cx, cy, r)
+        if t is not None and t <= limit and (best is None or t < best[0]):
+            nx = x + dx * t - cx
+            ny = y + dy * t - cy
+            length = math.sqrt(nx * nx + ny * ny) or 1
+            best = (t, nx / length, ny / length)
+    return best
+
+
+class BlockTable:
+    # one entry per block in level order. bx, by, material and reward come from
+    # the level and hits counts down as the block is hit. left, top, right and
+    # bottom are the block's rect once layout() has placed it on the screen.
+    # materials and rewards are stored as character codes.
+    def __init__(self):
+        for name, typecode, _ in columns:
+            setattr(self, name, array(typecode))
+        self.margin = 0
+
+    @classmethod
+    def from_columns(cls, bx, by, material, reward):
+        # builds a table from sequences of bx and by and from the materials and
+        # rewards as arrays of character codes or as bytes
+        table = cls()
+        count = len(bx)
+        material = np.frombuffer(material, dtype=np.uint8) if isinstance(material, bytes) else material
+        reward = np.frombuffer(reward, dtype=np.uint8) if isinstance(reward, bytes) else reward
+        values = {'bx': bx, 'by': by, 'material': material, 'reward': reward,
+                  'hits': np.where(np.asarray(material) == ord('S'), 3, 1)}
+        for name, _, dtype in columns:
+            column = values.get(name)
+            if column is None:
+                column = np.zeros(count, dtype)
+            getattr(table, name).frombytes(np.ascontiguousarray(column, dtype).tobytes())
+        return table
+
+    @classmethod
+    def from_entries(cls, entries):
+        # builds a table from an array of entry_dtype records, e.g. straight out of a level pack
+        return cls.from_columns(entries['bx'], entries['by'], entries['material'].astype('S1').view(np.uint8),
+                                entries['reward'].astype('S1').view(np.uint8))
+
+    def __len__(self):
+        return len(self.bx)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('block index out of range')
+        return BlockView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield BlockView(self, index)
+
+    def column(self, name):
+        # a column as a NumPy array sharing its memory, for batched queries
+        return np.frombuffer(getattr(self, name), dtype=dtypes[name])
+
+    def entries(self):
+        # the blocks as entry_dtype records, for writing level packs
+        entries = np.zeros(len(self), entry_dtype)
+        for name in ('bx', 'by'):
+            entries[name] = self.column(name)
+        for name in ('material', 'reward'):
+            entries[name] = self.column(name).view('S1')
+        return entries
+
+    def layout(self, x, y, width, height, margin):
+        # places block bx, by at x + bx * width, y + by * height on the screen,
+        # truncated to whole pixels like pygame.Rect. margin is the ball radius.
+        self.margin = margin
+        left = (self.column('bx').astype(np.intp) * width + x).astype(np.int32)
+        top = (self.column('by').astype(np.intp) * height + y).astype(np.int32)
+        self.column('left')[:] = left
+        self.column('top')[:] = top
+        self.column('right')[:] = left + int(width)
+        self.column('bottom')[:] = top + int(height)
+
+    def rect(self, index):
+        left = self.left[index]
+        top = self.top[index]
+        return pygame.Rect(left, top, self.right[index] - left, self.bottom[index] - top)
+
+    def sweep(self, index, x, y, dx, dy, limit):
+        return sweep_rect(self.left[index], self.top[index], self.right[index], self.bottom[index], self.margin,
+                          x, y, dx, dy, limit)
+
+    def nbytes(self):
+        return sum(getattr(self, name).itemsize * len(self) for name, _, _ in columns)
+
+
+class BlockView:
+    # one block of a table, read like the per block dicts levels used to hold:
+    # block['hits'], block['rect'] and so on. hits is the only writable key.
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        if key == 'rect':
+            return self.table.rect(self.index)
+        if key not in dtypes:
+            raise KeyError(key)
+        value = getattr(self.table, key)[self.index]
+        if key in ('material', 'reward'):
+            return chr(value)
+        return value
+
+    def __setitem__(self, key, value):
+        if key != 'hits':
+            raise KeyError(key)
+        self.table.hits[self.index] = value
+
+    def __eq__(self, other):
+        return isinstance(other, BlockView) and other.table is self.table and other.index == self.index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.table), self.index))
+
+    def __repr__(self):
+        return '<block %d at %d, %d>' % (self.index, self['bx'], self['by'])
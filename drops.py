@@ -0,0 +1,59 @@
+# coding=utf-8
+"""
+Breakout Game
+Drops: the power-ups broken reward blocks let fall, kept as NumPy arrays in a
+pool of fixed size and moved and tested against the paddle in one batched
+pass per tick
+"""
+
+import numpy as np
+
+import pool
+
+
+class Drops(pool.MovingPool):
+    # pool of the drops falling, culled once caught or out of the field. kind
+    # is the reward's character code, 'L', 'S' or 'B'.
+    capacity = 64
+    fields = pool.MovingPool.fields + (('kind', np.uint8, ()),)
+    width = 40  # size of the reward artwork
+    height = 15
+    fall_speed = 3  # pixels per tick at the base tick rate
+
+    def __init__(self, canvas, level):
+        self.canvas = canvas
+        self.level = level
+        pool.MovingPool.__init__(self)
+
+    def spawn(self, x, y, kind):
+        # one drop of kind, a character code, falling from x, y
+        live = self.reserve(1)
+        if live is None:
+            return
+        n = live.start
+        self.x[n] = self.prev_x[n] = x
+        self.y[n] = self.prev_y[n] = y
+        self.kind[n] = kind
+
+    def update(self):
+        n = self.count
+        if n == 0:
+            return
+        y = self.y[:n]
+        y += self.fall_speed * self.level.sim.speed_scale
+
+        # caught where the drop overlaps the paddle, lost once wholly below the field
+        paddle = self.level.paddle
+        px = paddle.x + self.canvas.offset_x
+        py = paddle.y + self.canvas.offset_y
+        caught = np.abs(self.x[:n] - px) < (self.width + paddle.width) / 2
+        caught &= np.abs(y - py) < (self.height + paddle.height) / 2
+        gone = caught | (y - self.height / 2 >= self.canvas.ball_box.inside_rect.bottom)
+        if not gone.any():
+            return
+        rewards = self.kind[:n][caught].tolist()
+        self.keep(~gone)
+
+        # in the order the drops were let fall
+        for reward in rewards:
+            self.level.collect(reward)
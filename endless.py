@@ -0,0 +1,199 @@
+# coding=utf-8
+"""
+Breakout Game
+Endless mode: the blocks scroll slowly down the field, new rows sliding in at
+the top as they come into view and rows that reach the bottom of the block
+area dropping out. Rows are generated or read from a level file a chunk at a
+time, and only the rows on screen are held, so memory and the cost of a tick
+stay the same however long the game goes on.
+"""
+
+from collections import deque
+
+import numpy as np
+
+import engine
+from blocks import BlockTable
+from engine import Game
+
+
+class RandomChunks:
+    # random rows of blocks, chunk_rows at a time
+    materials = 'ABCDEF'
+
+    def __init__(self, columns=10, chunk_rows=8, density=0.5):
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.density = density
+
+    def __len__(self):
+        # one level that never ends
+        return 1
+
+    def next_chunk(self, rnd):
+        # a list of rows, each a list of (bx, material, reward). rnd is the
+        # simulation's random generator, so a seed gives the same rows.
+        rows = []
+        for _ in range(self.chunk_rows):
+            row = []
+            for bx in range(self.columns):
+                if rnd.random() < self.density:
+                    material = 'S' if rnd.random() < 0.1 else rnd.choice(self.materials)
+                    reward = rnd.choice('LSB') if rnd.random() < 0.05 else '.'
+                    row.append((bx, material, reward))
+            rows.append(row)
+        return rows
+
+
+class LevelChunks:
+    # the levels of a level pack or list as chunks, one level at a time and
+    # starting over after the last. the first level sets the number of columns,
+    # blocks past it in wider levels are left out.
+    def __init__(self, game_levels):
+        self.game_levels = game_levels
+        self.columns = game_levels[0]['width']
+        self.next_level = 0
+
+    def __len__(self):
+        return 1
+
+    def next_chunk(self, rnd):
+        level = self.game_levels[self.next_level]
+        self.next_level = (self.next_level + 1) % len(self.game_levels)
+        # height is the last row's by
+        rows = [[] for _ in range(level['height'] + 1)]
+        for block in level['blocks']:
+            if block['bx'] < self.columns:
+                rows[block['by']].append((block['bx'], block['material'], block['reward']))
+        # the bottom row scrolls into view first
+        rows.reverse()
+        return rows
+
+
+class EndlessLevel(engine.Level):
+    # the block area is a fixed table with a slot for every bx, by on screen,
+    # slot by * columns + bx, and empty slots have no hits. row 0 is the row
+    # sliding in above the top of the block area. scrolling moves the table
+    # down a pixel at a time, and a whole row scrolled shifts the slots down a
+    # row, drops the bottom row and reads the next one in at the top.
+    scroll_speed = 0.25  # pixels per tick at the base tick rate
+    start_rows = 6  # rows already on screen when the level starts
+
+    def __init__(self, sim, canvas, radius, game_levels):
+        # game_levels is a chunk source such as RandomChunks, or levels to read with LevelChunks
+        self.source = game_levels if hasattr(game_levels, 'next_chunk') else LevelChunks(game_levels)
+        self.pending = deque()  # rows of the current chunk still to come
+        self.x = 0
+        self.top = 0
+        self.offset = 0  # pixels row 0 has scrolled down
+        self.scroll = 0.0  # fraction of a pixel not yet scrolled
+        self.rows_scrolled = 0
+        self.chunks_read = 0
+        self.blocks_dropped = 0
+        engine.Level.__init__(self, sim, canvas, radius, game_levels)
+
+    def new_level(self, level):
+        self.current_level = level
+        columns = self.source.columns
+        self.block_width = (self.canvas.width - 300) / columns
+        self.block_height = int(self.block_width / 2.5)
+        self.x = self.canvas.offset_x + 150
+        self.top = self.canvas.offset_y + 20
+        # rows drop out this far above the bottom, well clear of the paddle
+        bottom = self.canvas.offset_y + self.canvas.height - 200
+        rows = int((bottom - self.top) / self.block_height) + 1
+        slots = rows * columns
+        self.blocks = BlockTable.from_columns(np.tile(np.arange(columns), rows), np.repeat(np.arange(rows), columns),
+                                              bytes(slots), bytes(slots))
+        self.blocks.column('hits')[:] = 0
+        self.name = 'Endless'
+        self.level = {'name': self.name, 'width': columns, 'height': rows, 'blocks': self.blocks}
+        self.block_grid = engine.BlockGrid(self.x, self.top, self.block_width, self.block_height, columns, rows,
+                                           self.canvas.radius)
+        self.block_grid.fill(self.blocks)
+        self.pending.clear()
+        self.offset = 0
+        self.scroll = 0.0
+        self.rows_scrolled = 0
+        for _ in range(self.start_rows):
+            self.push_row()
+        self.layout()
+        self.reset_balls()
+
+    def layout(self):
+        y = self.top - self.block_height + self.offset
+        self.blocks.layout(self.x, y, self.block_width, self.block_height, self.canvas.radius)
+        self.block_grid.y = y
+        self.multiball.set_grid(self.block_grid)
+
+    def next_row(self):
+        if not self.pending:
+            self.pending.extend(self.source.next_chunk(self.sim.random))
+            self.chunks_read += 1
+        return self.pending.popleft()
+
+    def push_row(self):
+        # shifts every row down one slot row, the bottom one dropping out, and reads the next row in at the top
+        columns = self.source.columns
+        hits = self.blocks.column('hits')
+        self.blocks_dropped += int(np.count_nonzero(hits[-columns:]))
+        for name in ('material', 'reward', 'hits'):
+            column = self.blocks.column(name)
+            column[columns:] = column[:-columns].copy()
+            column[:columns] = 0
+        material = self.blocks.column('material')
+        reward = self.blocks.column('reward')
+        for bx, block_material, block_reward in self.next_row():
+            material[bx] = ord(block_material)
+            reward[bx] = ord(block_reward)
+            hits[bx] = 3 if block_material == 'S' else 1
+        self.block_grid.clear()
+        self.block_grid.fill(self.blocks)
+        self.rows_scrolled += 1
+
+    def update(self):
+        if self.game.state == Game.GAME:
+            self.scroll += self.scroll_speed * self.sim.speed_scale
+            if self.scroll >= 1:
+                pixels = int(self.scroll)
+                self.scroll -= pixels
+                self.scroll_by(pixels)
+        engine.Level.update(self)
+
+    def scroll_by(self, pixels):
+        self.offset += pixels
+        rows = 0
+        while self.offset >= self.block_height:
+            self.offset -= self.block_height
+            self.push_row()
+            rows += 1
+        self.layout()
+        if self.sim.event_driven:
+            # the blocks moved under every prediction
+            for ball in self.balls:
+                self.invalidate(ball)
+        self.scrolled(rows)
+
+    def scrolled(self, rows):
+        # called after the blocks move, with the number of new rows read in
+        pass
+
+    def is_level_cleared(self):
+        return False
+
+
+class EndlessSimulation(engine.Simulation):
+    def __init__(self, canvas=None, game_levels=None, game=None, seed=None, tick_rate=engine.base_tick_rate,
+                 event_driven=False):
+        if game_levels is None:
+            game_levels = RandomChunks()
+        engine.Simulation.__init__(self, canvas, game_levels, game, seed, tick_rate, event_driven)
+
+    def create_level(self, game_levels):
+        return EndlessLevel(self, self.canvas, self.radius, game_levels)
+
+    def idle_ticks(self, inputs):
+        # the blocks scroll a little every tick in play, so none of those ticks can be skipped
+        if self.game.state == Game.GAME:
+            return 0
+        return engine.Simulation.idle_ticks(self, inputs)
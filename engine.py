@@ -0,0 +1,801 @@
+# coding=utf-8
+"""
+Breakout Game
+Headless simulation core: game state, balls, blocks and paddle.
+No window and no image loading, so it can be stepped as fast as needed.
+"""
+
+import heapq, math, random
+from array import array
+
+import numpy as np
+import pygame
+
+from blocks import ray_circle_time
+from drops import Drops
+from levelpack import load_level_pack, parse_levels
+from multiball import MultiBall
+
+
+class Game:
+    INTRO = 1
+    PREGAME = 2
+    GAME = 3
+    SETTINGS = 4
+    PAUSE = 5
+    LEVEL_CLEARED = 6
+    WIN = 7
+    LOSS = 8
+    EXIT_PROMPT = 9
+
+    def __init__(self, state=PREGAME):
+        self.state = state
+
+
+class Input:
+    # bit flags describing player input for a single simulation tick
+    NONE = 0
+    LEFT = 1  # held
+    RIGHT = 2  # held
+    KEY = 4  # any key went down this tick
+    LAUNCH = 8  # space went down this tick
+    POINTER = 16  # the mouse moved this tick
+
+
+# ball and paddle speeds are given in pixels per tick at this tick rate
+# and scaled to whatever rate the simulation actually runs at
+base_tick_rate = 30
+
+# dimensions of the stock artwork, used when running without a display
+side_panel_width = 250
+canvas_width = 800
+canvas_height = 500
+border_width = 16
+paddle_width = 100
+paddle_height = 30
+radius = 10
+
+
+def reflect(dx, dy, nx, ny):
+    # reflects the vector dx, dy off a surface with unit normal nx, ny
+    d = 2 * (dx * nx + dy * ny)
+    return dx - d * nx, dy - d * ny
+
+
+def build_game_levels(path='assets/levels.txt'):
+    with open(path, 'r') as level_file:
+        return list(parse_levels(level_file))
+
+
+class CollisionBox:
+    NONE = 0
+    RIGHT = 1
+    LEFT = 2
+    TOP = 4
+    BOTTOM = 8
+    INVALID = 15
+
+    def get_collision(self, x, y):
+        return CollisionBox.INVALID
+
+
+class BallBox(CollisionBox):
+
+    def __init__(self, rect, margin):
+        self.outside_rect = rect.copy()
+        self.inside_rect = self.outside_rect.inflate(-margin * 2, -margin * 2)
+        self.margin = margin
+
+    def get_collision(self, x, y):
+        if self.inside_rect.collidepoint(x, y):
+            return BallBox.NONE
+
+        result = BallBox.NONE
+        if x < self.inside_rect.x:
+            result |= BallBox.LEFT
+        elif x >= self.inside_rect.right:
+            result |= BallBox.RIGHT
+
+        if y < self.inside_rect.y:
+            result |= BallBox.TOP
+        elif y >= self.inside_rect.bottom:
+            result |= BallBox.BOTTOM
+
+        if result == BallBox.NONE:
+            return BallBox.INVALID
+
+        return result
+
+    def direction_to_vector(self, angle, length):
+        dx = length * math.sin(angle)
+        dy = length * math.cos(angle)
+        return dx, dy
+
+
+class BlockGrid:
+    # uniform grid over the level's block layout. each cell holds the index in
+    # the level's BlockTable of the live block at that bx, by, or -1, so a point
+    # maps to the few blocks whose collision box could contain it, instead of
+    # scanning the whole level.
+    def __init__(self, x, y, cell_width, cell_height, columns, rows, margin):
+        self.x = x
+        self.y = y
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.columns = columns
+        self.rows = rows
+        # rects are truncated to whole pixels, so allow one extra pixel
+        self.margin = margin + 1
+        self.blocks = None
+        self.cells = array('i', [-1]) * (columns * rows)
+        # 1 for every occupied cell, shared with MultiBall as a zero-copy array
+        self.live = bytearray(columns * rows)
+        self.count = 0
+
+    def fill(self, blocks):
+        # adds every block of the table that has hits left, later blocks winning a shared cell
+        self.blocks = blocks
+        index = np.flatnonzero(blocks.column('hits')).astype(np.int32)
+        cell = blocks.column('by')[index].astype(np.intp) * self.columns + blocks.column('bx')[index]
+        np.frombuffer(self.cells, dtype=np.int32)[cell] = index
+        live = np.frombuffer(self.live, dtype=np.uint8)
+        live[cell] = 1
+        self.count = int(np.count_nonzero(live))
+
+    def clear(self):
+        np.frombuffer(self.cells, dtype=np.int32)[:] = -1
+        np.frombuffer(self.live, dtype=np.uint8)[:] = 0
+        self.count = 0
+
+    def remove(self, index):
+        cell = self.blocks.by[index] * self.columns + self.blocks.bx[index]
+        if self.cells[cell] == index:
+            self.cells[cell] = -1
+            self.live[cell] = 0
+            self.count -= 1
+
+    def crossing(self, x, y, dx, dy, limit):
+        # the times between 0 and limit that a point moving from x, y by dx, dy
+        # per tick spends within margin of the grid, or None, None if it never is
+        start = 0.0
+        end = limit
+        for p, d, low, high in ((x, dx, self.x, self.x + self.columns * self.cell_width),
+                                (y, dy, self.y, self.y + self.rows * self.cell_height)):
+            low -= self.margin
+            high += self.margin
+            if d == 0:
+                if p < low or p > high:
+                    return None, None
+                continue
+            t1 = (low - p) / d
+            t2 = (high - p) / d
+            start = max(start, min(t1, t2))
+            end = min(end, max(t1, t2))
+        if start > end:
+            return None, None
+        return start, end
+
+    def query_area(self, x1, y1, x2, y2):
+        # returns the indexes of the live blocks near the box spanned by the two points, e.g. a swept ball path
+        bx1 = max(int(math.floor((min(x1, x2) - self.margin - self.x) / self.cell_width)), 0)
+        bx2 = min(int(math.floor((max(x1, x2) + self.margin - self.x) / self.cell_width)), self.columns - 1)
+        by1 = max(int(math.floor((min(y1, y2) - self.margin - self.y) / self.cell_height)), 0)
+        by2 = min(int(math.floor((max(y1, y2) + self.margin - self.y) / self.cell_height)), self.rows - 1)
+        result = []
+        for by in range(by1, by2 + 1):
+            row = by * self.columns
+            for bx in range(bx1, bx2 + 1):
+                index = self.cells[row + bx]
+                if index >= 0:
+                    result.append(index)
+        return result
+
+
+class Field:
+    # geometry of the playing field, the part of Canvas the simulation needs
+    def __init__(self, x, y, width, height, border_width, radius):
+        self.border_width = border_width
+        self.header_height = 0
+        self.width = width
+        self.height = height
+        self.ball_box_rect = pygame.Rect(x + self.border_width, y + self.header_height, self.width, self.height)
+        self.ball_box = BallBox(self.ball_box_rect, radius)
+        self.offset_x = x + self.border_width
+        self.offset_y = y + self.header_height
+        self.radius = radius
+
+    def update(self):
+        pass
+
+
+class Ball:
+    max_bounces = 8  # impacts resolved per tick before the ball just stops for the tick
+    # event driven mode only, see Level.advance_balls
+    moved = 0  # the Level.moves its position is up to date with
+    event_seq = None  # sequence number of its live entry in Level.impacts
+    target_block = None  # index of the block its predicted impact is with
+    def __init__(self, canvas, level, color, x, y, radius, speed, heading, visible):
+        self.color = color
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.speed = speed
+        self.heading = heading
+        self.visible = visible
+        self.canvas = canvas
+        self.level = level
+        self.game = level.game
+        self.motion_enabled = True
+        self.dx, self.dy = canvas.ball_box.direction_to_vector(heading, speed)
+        # position at the start of the tick, for render interpolation
+        self.prev_x = x
+        self.prev_y = y
+        self.colliding_with_block = False
+
+    def update(self):
+        if self.game.state != Game.GAME:
+            return
+        if not self.motion_enabled:
+            return
+        if self.speed == 0:
+            return
+
+        # move through the whole tick, stopping at each impact in turn so
+        # fast balls can't skip past thin blocks and can bounce several times
+        self.colliding_with_block = False
+        remaining = 1.0
+        for _ in range(self.max_bounces):
+            impact = self.find_impact(remaining)
+            if impact is None:
+                break
+            t, wall, block, hc, nx, ny = impact
+            self.x += self.dx * t
+            self.y += self.dy * t
+            remaining -= t
+            if wall:
+                if wall & BallBox.BOTTOM:
+                    self.level.delete_ball(self)
+                    return
+                if wall & (BallBox.LEFT | BallBox.RIGHT):
+                    self.dx = -self.dx
+                if wall & (BallBox.TOP | BallBox.BOTTOM):
+                    self.dy = -self.dy
+                # inverse of BallBox.direction_to_vector
+                self.heading = math.atan2(self.dx, self.dy)
+            elif block is not None:
+                self.dx, self.dy = reflect(self.dx, self.dy, nx, ny)
+                self.colliding_with_block = True
+                self.level.hit_block(block)
+                if self not in self.level.balls:
+                    # the level was cleared and this ball went with it
+                    return
+            else:
+                # ball always bounces in y direction, picking up spin from where it hit the paddle
+                pw = hc[3]
+                offset = self.x - hc[0]
+                self.dx += max(-pw, min(pw, offset)) * 0.1 * self.level.sim.speed_scale
+                self.dy = -self.dy
+        else:
+            remaining = 0
+        self.x += self.dx * remaining
+        self.y += self.dy * remaining
+
+    def find_impact(self, limit):
+        # earliest wall, block or paddle contact within limit ticks, as
+        # (t, wall flags, block, paddle hit circle, normal x, normal y) or None
+        x, y, dx, dy = self.x, self.y, self.dx, self.dy
+        best = None
+
+        inside = self.canvas.ball_box.inside_rect
+        nx = x + dx * limit
+        ny = y + dy * limit
+        if nx < inside.x and dx < 0:
+            best = (max((inside.x - x) / dx, 0.0), BallBox.LEFT, None, None, 1.0, 0.0)
+        elif nx >= inside.right and dx > 0:
+            best = (max((inside.right - x) / dx, 0.0), BallBox.RIGHT, None, None, -1.0, 0.0)
+        if ny < inside.y and dy < 0:
+            t = max((inside.y - y) / dy, 0.0)
+            if best is None or t < best[0]:
+                best = (t, BallBox.TOP, None, None, 0.0, 1.0)
+        elif ny >= inside.bottom and dy > 0:
+            t = max((inside.bottom - y) / dy, 0.0)
+            if best is None or t < best[0]:
+                best = (t, BallBox.BOTTOM, None, None, 0.0, -1.0)
+
+        blocks = self.level.blocks
+        for index in self.level.block_grid.query_area(x, y, nx, ny):
+            hit = blocks.sweep(index, x, y, dx, dy, limit if best is None else best[0])
+            if hit and (best is None or hit[0] < best[0]):
+                best = (hit[0], BallBox.NONE, index, None, hit[1], hit[2])
+
+        hc = self.level.paddle.get_hit_circle()
+        t = ray_circle_time(x, y, dx, dy, hc[0], hc[1], hc[2] + self.radius)
+        if t is not None and t <= limit and (best is None or t < best[0]):
+            px = x + dx * t
+            py = y + dy * t
+            # only the top of the paddle circle is solid
+            if abs(px - hc[0]) <= hc[3] and py <= hc[1] - hc[2] + 10:
+                best = (t, BallBox.NONE, None, hc, 0.0, -1.0)
+        if best is not None and best[2] is not None:
+            best = best[:2] + (blocks[best[2]],) + best[3:]
+        return best
+
+    def time_to_impact(self):
+        # ticks until the ball could next touch a wall, a block or the paddle's
+        # reach if it keeps going straight, and the block's index if that is what it hits.
+        # the paddle moves with the inputs, so reaching its height counts as an impact.
+        x, y, dx, dy = self.x, self.y, self.dx, self.dy
+        inside = self.canvas.ball_box.inside_rect
+        limit = math.inf
+        if dx < 0:
+            limit = (inside.x - x) / dx
+        elif dx > 0:
+            limit = (inside.right - x) / dx
+        if dy < 0:
+            limit = min(limit, (inside.y - y) / dy)
+        elif dy > 0:
+            limit = min(limit, (inside.bottom - y) / dy)
+        hc = self.level.paddle.get_hit_circle()
+        reach = hc[1] - hc[2] - self.radius
+        if y >= reach:
+            return 0.0, None
+        if dy > 0:
+            limit = min(limit, (reach - y) / dy)
+        if limit == math.inf:
+            return limit, None
+
+        # walk the part of the path over the grid a cell at a time until a block is hit
+        grid = self.level.block_grid
+        t, end = grid.crossing(x, y, dx, dy, limit)
+        if t is None:
+            return limit, None
+        end_of_grid = end
+        step = min(grid.cell_width, grid.cell_height) / math.sqrt(dx * dx + dy * dy)
+        blocks = self.level.blocks
+        best = None
+        while t < end_of_grid and (best is None or t < best[0]):
+            end = min(t + step, end_of_grid)
+            for index in grid.query_area(x + dx * t, y + dy * t, x + dx * end, y + dy * end):
+                hit = blocks.sweep(index, x, y, dx, dy, limit if best is None else best[0])
+                if hit and (best is None or hit[0] < best[0]):
+                    best = (hit[0], index)
+            t = end
+        if best is None:
+            return limit, None
+        return max(best[0], 0.0), best[1]
+
+    def sync(self, moves):
+        # catches up on straight line ticks skipped in event driven mode. adding
+        # one tick at a time keeps the position bit for bit what update() gives.
+        x, y, dx, dy = self.x, self.y, self.dx, self.dy
+        for _ in range(moves - self.moved):
+            x += dx
+            y += dy
+            self.colliding_with_block = False
+        self.x, self.y = x, y
+        self.moved = moves
+
+    def move(self, x, y):
+        self.x, self.y = x, y
+
+    def get_position(self, alpha):
+        # position alpha of the way through the last tick
+        return self.prev_x + (self.x - self.prev_x) * alpha, self.prev_y + (self.y - self.prev_y) * alpha
+
+    def set_speed(self, speed):
+        event_driven = self.level.sim.event_driven
+        if event_driven:
+            self.sync(self.level.moves)
+        self.speed = speed
+        self.dx, self.dy = self.canvas.ball_box.direction_to_vector(self.heading, self.speed)
+        if event_driven:
+            self.level.invalidate(self)
+
+
+class Level:
+    ball_class = Ball
+    multiball_class = MultiBall
+    drops_class = Drops
+    ball_speed = 5
+    slow_down = 0.75  # caught 'S' drops slow every ball in play by this much
+    min_speed = 0.5  # but not below this much of ball_speed
+    launch_heading = math.pi * 0.75  # heading of the ball resting on the paddle
+
+    def __init__(self, sim, canvas, radius, game_levels):
+        self.sim = sim
+        self.game = sim.game
+        self.canvas = canvas
+        self.game_levels = game_levels
+        self.current_level = 0
+        self.level_count = len(self.game_levels)
+        self.level = None
+        self.name = None
+        self.score = 0
+        self.lives = 3
+        self.block_width = None
+        self.block_height = None
+        self.blocks = None
+        self.block_grid = None
+        self.radius = radius
+        self.resting_ball = None
+        self.active_balls = 0
+        self.balls = []
+        self.multiball = self.multiball_class(canvas, self, radius)
+        # power-ups falling from broken reward blocks
+        self.drops = self.drops_class(canvas, self)
+        self.paddle = None
+        # event driven mode: ticks the balls have moved for, and the heap of
+        # (Level.moves of the next tick needing a full update, sequence, ball)
+        self.moves = 0
+        self.impacts = []
+        self.impact_seq = 0
+        # list every block hit's index is appended to, see rewind.Rewind
+        self.hit_log = None
+
+        self.new_level(self.current_level)
+
+    def new_level(self, level):
+        self.current_level = level
+        self.level = self.game_levels[self.current_level]
+        self.blocks = self.level['blocks']
+        width = self.level['width']
+        self.name = self.level['name']
+        self.block_width = (self.canvas.width - 300) / width
+        self.block_height = int(self.block_width / 2.5)
+        x = self.canvas.offset_x + 150
+        y = self.canvas.offset_y + 20
+        self.blocks.layout(x, y, self.block_width, self.block_height, self.canvas.radius)
+        self.block_grid = BlockGrid(x, y, self.block_width, self.block_height, width, self.level['height'] + 1,
+                                    self.canvas.radius)
+        self.block_grid.fill(self.blocks)
+        self.multiball.set_grid(self.block_grid)
+        self.reset_balls()
+
+    def reset_balls(self):
+        # balls left over from the previous level must not carry on into this one
+        for ball in list(self.balls):
+            self.remove_ball(ball)
+        self.multiball.clear()
+        self.drops.clear()
+        self.impacts = []
+        self.active_balls = 0
+        self.create_resting_ball()
+
+    def create_resting_ball(self):
+        bx = self.canvas.width / 2 + self.canvas.offset_x
+        by = self.canvas.height - 60 + self.canvas.offset_y - 25
+        self.resting_ball = self.create_ball(bx, by, 0, self.launch_heading, True)
+
+    def update(self):
+        if self.game.state == Game.GAME:
+            if self.resting_ball:
+                self.resting_ball.set_speed(self.ball_speed * self.sim.speed_scale)
+                self.resting_ball = None
+            self.update_pools()
+
+    def update_pools(self):
+        self.multiball.update()
+        self.drops.update()
+
+    def hit_block(self, block):
+        # one hit on a live block, a BlockView. returns True if it broke.
+        index = block.index
+        hits = self.blocks.hits
+        if hits[index] <= 0:
+            return False
+        if self.hit_log is not None:
+            self.hit_log.append(index)
+        hits[index] -= 1
+        if hits[index] != 0:
+            return False
+        self.block_grid.remove(index)
+        if self.sim.event_driven:
+            # predictions can only have been cut short by this block going
+            for ball in self.balls:
+                if ball.target_block == index:
+                    self.invalidate(ball)
+        blocks = self.blocks
+        if blocks.reward[index] != ord('.'):
+            self.drops.spawn((blocks.left[index] + blocks.right[index]) / 2,
+                             (blocks.top[index] + blocks.bottom[index]) / 2, blocks.reward[index])
+        if self.is_level_cleared():
+            self.level_cleared()
+        return True
+
+    def collect(self, reward):
+        # the paddle caught a drop of reward, a character code
+        if reward == ord('L'):
+            self.lives += 1
+        elif reward == ord('S'):
+            self.slow_balls()
+        elif reward == ord('B'):
+            if self.sim.event_driven:
+                self.sync_balls()
+            self.multiball.split(self.balls)
+
+    def slow_balls(self):
+        slowest = self.ball_speed * self.sim.speed_scale * self.min_speed
+        for ball in self.balls:
+            speed = math.hypot(ball.dx, ball.dy)
+            if speed <= slowest:
+                continue
+            if self.sim.event_driven:
+                ball.sync(self.moves)
+            scale = max(self.slow_down, slowest / speed)
+            ball.dx *= scale
+            ball.dy *= scale
+            ball.speed *= scale
+            if self.sim.event_driven:
+                self.invalidate(ball)
+        multiball = self.multiball
+        n = multiball.count
+        if n:
+            speed = np.hypot(multiball.dx[:n], multiball.dy[:n])
+            scale = np.minimum(np.maximum(self.slow_down, slowest / np.maximum(speed, 1e-9)), 1.0)
+            multiball.dx[:n] *= scale
+            multiball.dy[:n] *= scale
+
+    def restore_blocks(self, indices):
+        # blocks of this level whose hits were set back, e.g. by rewind.Rewind
+        self.block_grid.clear()
+        self.block_grid.fill(self.blocks)
+
+    def is_level_cleared(self):
+        # the grid counts the live blocks as they go
+        return self.block_grid.count == 0
+
+    def level_cleared(self):
+        if self.current_level == self.level_count - 1:
+            self.game.state = Game.WIN
+        else:
+            self.game.state = Game.LEVEL_CLEARED
+            self.new_level(self.current_level + 1)
+
+    def create_ball(self, x, y, speed, heading, visible):
+        self.active_balls += 1
+        ball = self.ball_class(self.canvas, self, (255, 255, 255), x, y, self.radius, speed, heading, visible)
+        ball.moved = self.moves
+        self.balls.append(ball)
+        if speed and self.sim.event_driven:
+            self.invalidate(ball)
+        return ball
+
+    def remove_ball(self, ball):
+        self.balls.remove(ball)
+        ball.event_seq = None
+
+    def schedule(self, ball, moves):
+        # the ball moves in a straight line until a full update at moves
+        self.impact_seq += 1
+        ball.event_seq = self.impact_seq
+        heapq.heappush(self.impacts, (moves, self.impact_seq, ball))
+
+    def invalidate(self, ball):
+        # drops the ball's predicted impact, giving it a full update next tick
+        ball.sync(self.moves)
+        ball.target_block = None
+        self.schedule(ball, self.moves + 1)
+
+    def sync_balls(self):
+        for ball in self.balls:
+            ball.sync(self.moves)
+
+    def advance_balls(self):
+        # event driven counterpart of calling update() on every ball each tick.
+        # balls only get a full, swept update on ticks where they could hit
+        # something. the rest of the time they go straight, which is only
+        # applied when the position is next needed, see Ball.sync.
+        # only one regular ball is ever in play at once, so the order they
+        # are updated in within a tick doesn't come into it.
+        if self.game.state != Game.GAME:
+            return
+        self.moves += 1
+        due = []
+        while self.impacts and self.impacts[0][0] <= self.moves:
+            _, seq, ball = heapq.heappop(self.impacts)
+            if ball.event_seq == seq:
+                ball.event_seq = None
+                due.append(ball)
+        for ball in due:
+            if ball not in self.balls:
+                continue
+            ball.sync(self.moves - 1)
+            ball.moved = self.moves
+            ball.update()
+            if ball in self.balls:
+                if not ball.motion_enabled or ball.speed == 0:
+                    continue
+                t, ball.target_block = ball.time_to_impact()
+                if t == math.inf:
+                    continue
+                # one tick to spare, as the straight line ticks add up with rounding
+                self.schedule(ball, self.moves + max(int(t) - 1, 0) + 1)
+
+    def delete_ball(self, ball):
+        self.remove_ball(ball)
+        self.active_balls -= 1
+        if self.active_balls == 0 and self.multiball.count == 0:
+            self.lose_life()
+
+    def multiball_lost(self):
+        # the last multiball went out of play
+        if self.active_balls == 0:
+            self.lose_life()
+
+    def lose_life(self):
+        self.lives -= 1
+        if self.lives == 0:
+            self.game.state = Game.LOSS
+        else:
+            self.game.state = Game.PREGAME
+            self.create_resting_ball()
+
+
+class Paddle:
+    # represents the paddle
+    def __init__(self, canvas, level, width=paddle_width, height=paddle_height):
+        self.level = level
+        self.x = canvas.width / 2
+        self.y = canvas.height - 60
+        self.prev_x = self.x
+        self.width = width
+        self.height = height
+        self.canvas = canvas
+        level.paddle = self
+
+    def get_position(self, alpha):
+        return self.prev_x + (self.x - self.prev_x) * alpha, self.y
+
+    def get_hit_circle(self):
+        cx = self.x + self.canvas.offset_x
+        cy = self.y - (self.height / 2) + self.canvas.offset_y + 300
+        return cx, cy, 300, 10 + self.width / 2
+
+    def changePosition(self, dx):
+        temp = self.x + dx
+        hw = (self.width / 2)
+        if temp < hw:
+            temp = hw
+        elif temp > (self.canvas.width - hw):
+            temp = (self.canvas.width - hw)
+        self.x = temp
+        if self.level.resting_ball:
+            self.level.resting_ball.move(self.x + self.canvas.offset_x, self.y + self.canvas.offset_y - 25)
+
+    def update(self):
+        pass
+
+
+class Simulation:
+    # owns the game state machine, the level with its balls and blocks,
+    # and the paddle. advance it one tick at a time with step(inputs).
+    # event_driven skips the collision search on ticks where a ball can't hit
+    # anything, with identical results. ball positions are then only up to date
+    # when read through the balls property, so it is for headless use.
+    paddle_speed = 10
+
+    def __init__(self, canvas=None, game_levels=None, game=None, seed=None, tick_rate=base_tick_rate,
+                 event_driven=False):
+        if canvas is None:
+            canvas = Field(side_panel_width, 0, canvas_width, canvas_height, border_width, radius)
+        # a pack opened here rather than passed in is closed by close()
+        self.level_pack = None
+        if game_levels is None:
+            game_levels = self.level_pack = load_level_pack()
+        self.game = game if game is not None else Game()
+        self.canvas = canvas
+        self.radius = canvas.radius
+        # always seeded, so a recording of the inputs is enough to replay the game
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        self.random = random.Random(self.seed)
+        self.ticks = 0
+        self.tick_rate = tick_rate
+        self.speed_scale = float(base_tick_rate) / tick_rate
+        # how far rendering is between the previous tick and the current one
+        self.alpha = 1.0
+        self.event_driven = event_driven
+        self.level = self.create_level(game_levels)
+        self.paddle = self.create_paddle()
+
+    def create_level(self, game_levels):
+        return Level(self, self.canvas, self.radius, game_levels)
+
+    def create_paddle(self):
+        return Paddle(self.canvas, self.level)
+
+    def close(self):
+        # safe to call more than once
+        if self.level_pack is not None:
+            self.level_pack.close()
+            self.level_pack = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def balls(self):
+        if self.event_driven:
+            self.level.sync_balls()
+        return self.level.balls
+
+    def process_input(self, inputs):
+        if inputs & Input.KEY:
+            if self.game.state == Game.EXIT_PROMPT:
+                self.game.state = Game.GAME
+            elif self.game.state == Game.LEVEL_CLEARED:
+                self.game.state = Game.PREGAME
+            elif self.game.state == Game.PREGAME:
+                if inputs & Input.LAUNCH:
+                    self.game.state = Game.GAME
+        if inputs & Input.POINTER:
+            self.level.score += 10
+        if self.game.state in (Game.GAME, Game.PREGAME):
+            if inputs & Input.LEFT:
+                self.paddle.changePosition(-self.paddle_speed * self.speed_scale)
+            if inputs & Input.RIGHT:
+                self.paddle.changePosition(self.paddle_speed * self.speed_scale)
+
+    def update(self):
+        self.canvas.update()
+        self.level.update()
+        self.paddle.update()
+        if self.event_driven:
+            self.level.advance_balls()
+            return
+        for ball in list(self.level.balls):
+            if ball in self.level.balls:
+                ball.update()
+
+    def save_positions(self):
+        self.paddle.prev_x = self.paddle.x
+        for ball in self.level.balls:
+            ball.prev_x = ball.x
+            ball.prev_y = ball.y
+        self.level.multiball.save_positions()
+        self.level.drops.save_positions()
+
+    def step(self, inputs=Input.NONE):
+        self.save_positions()
+        self.process_input(inputs)
+        self.update()
+        self.ticks += 1
+        return self.game.state
+
+    def advance(self, ticks, inputs=Input.NONE):
+        # steps exactly ticks ticks with the same inputs. event driven, runs of
+        # ticks where only balls going in a straight line would change are
+        # skipped in one go.
+        while ticks > 0:
+            idle = min(self.idle_ticks(inputs), ticks) if self.event_driven else 0
+            if idle:
+                self.ticks += idle
+                if self.game.state == Game.GAME:
+                    self.level.moves += idle
+                self.paddle.prev_x = self.paddle.x
+                ticks -= idle
+            else:
+                self.step(inputs)
+                ticks -= 1
+
+    def idle_ticks(self, inputs):
+        # how many ticks from now nothing but straight line ball motion happens with these inputs
+        if inputs & (Input.KEY | Input.POINTER | Input.LEFT | Input.RIGHT):
+            return 0
+        if self.game.state != Game.GAME:
+            return math.inf
+        level = self.level
+        if level.resting_ball or level.multiball.count or level.drops.count:
+            return 0
+        if not level.impacts:
+            return math.inf
+        return max(level.impacts[0][0] - level.moves - 1, 0)
+
+    def run(self, ticks, inputs=Input.NONE):
+        # steps the simulation with the same inputs, stopping early if the game is over
+        for _ in range(ticks):
+            if self.step(inputs) in (Game.WIN, Game.LOSS):
+                break
+        return self.game.state
@@ -0,0 +1,101 @@
+# coding=utf-8
+"""
+Breakout Game
+Entity registry: drawables kept in one collection per type instead of one
+mixed list, added and removed in O(1) by handle, and scheduled by game state
+so a frame or tick only visits the types that draw or update anything in the
+current state.
+"""
+
+
+class Registry:
+    # every entity lives in the collection for its exact type, a dict from
+    # handle to entity, so removing one is a dict delete and iterating keeps
+    # the order they were added in. collections are visited by their type's
+    # draw_layer, lowest first, then by when the type was first added. a
+    # type's draw_states lists the game states it is drawn in, None for all.
+    # updates go the same way by update_layer and update_states, for the
+    # types that have an update method.
+    def __init__(self):
+        self.collections = {}  # type -> {handle: entity}
+        self.types = {}  # handle -> type
+        self.next_handle = 1
+        # state -> collections drawn in it, in draw order. made as states are
+        # first seen and thrown away whenever a new type comes in.
+        self.schedules = {}
+        self.update_schedules = {}  # the same for updates
+
+    def __len__(self):
+        return len(self.types)
+
+    def __iter__(self):
+        # every entity in draw order, whatever the state
+        for kind in self.draw_order():
+            for entity in self.collections[kind].values():
+                yield entity
+
+    def add(self, entity):
+        # returns the handle to remove the entity with
+        kind = type(entity)
+        entities = self.collections.get(kind)
+        if entities is None:
+            entities = self.collections[kind] = {}
+            self.schedules = {}
+            self.update_schedules = {}
+        handle = self.next_handle
+        self.next_handle += 1
+        entities[handle] = entity
+        self.types[handle] = kind
+        return handle
+
+    def remove(self, handle):
+        del self.collections[self.types.pop(handle)][handle]
+
+    def of_type(self, cls):
+        # the entities of cls and its subclasses
+        result = []
+        for kind, entities in self.collections.items():
+            if issubclass(kind, cls):
+                result.extend(entities.values())
+        return result
+
+    def draw_order(self):
+        # every type added so far, in draw order
+        return sorted(self.collections, key=lambda kind: getattr(kind, 'draw_layer', 0))
+
+    def scheduled(self, state):
+        # the collections drawn in state, in draw order
+        schedule = self.schedules.get(state)
+        if schedule is None:
+            schedule = self.schedules[state] = [
+                self.collections[kind] for kind in self.draw_order()
+                if getattr(kind, 'draw_states', None) is None or state in kind.draw_states]
+        return schedule
+
+    def active(self, state):
+        # the entities drawn in state, in draw order
+        for entities in self.scheduled(state):
+            for entity in entities.values():
+                yield entity
+
+    def update_order(self):
+        # every type added so far that has an update method, in update order
+        return sorted((kind for kind in self.collections if hasattr(kind, 'update')),
+                      key=lambda kind: getattr(kind, 'update_layer', 0))
+
+    def updating(self, state):
+        # the collections updated in state, in update order
+        schedule = self.update_schedules.get(state)
+        if schedule is None:
+            schedule = self.update_schedules[state] = [
+                self.collections[kind] for kind in self.update_order()
+                if getattr(kind, 'update_states', None) is None or state in kind.update_states]
+        return schedule
+
+    def updated(self, state):
+        # the entities updated in state, in update order. an update may remove
+        # entities, which are skipped once gone.
+        for entities in self.updating(state):
+            for handle, entity in list(entities.items()):
+                if handle in entities:
+                    yield entity
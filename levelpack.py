@@ -0,0 +1,146 @@
+# coding=utf-8
+"""
+Breakout Game
+Compiled level packs: levels.txt is compiled once into a binary file with an
+offset index, which is memory mapped so only the level being played is decoded
+"""
+
+import mmap, os, struct
+
+import numpy as np
+
+from blocks import BlockTable, entry_dtype
+
+# magic, version, level count, index offset, source mtime (ns), source size
+header = struct.Struct('<4sHIQqQ')
+# offset and length of each level record
+index_entry = struct.Struct('<QI')
+# name length, width, height, block count, followed by the utf-8 name and the blocks
+record_header = struct.Struct('<HHHI')
+# bx, by, material, reward, the same layout as blocks.entry_dtype
+block_entry = struct.Struct('<HHcc')
+
+magic = b'BRKP'
+version = 1
+
+
+def parse_levels(lines):
+    # yields the levels in the levels.txt format one at a time as they are read
+    by = -1
+    bxs, bys, materials, rewards = [], [], [], []
+    levelwidth = 0
+    for line in lines:
+        line = line.strip()
+        if not line.startswith('#'):
+            if line.startswith('name:'):
+                assert by >= 0
+                level = {}
+                level['name'] = line[5:]
+                level['blocks'] = BlockTable.from_columns(bxs, bys, ''.join(materials).encode('ascii'),
+                                                          ''.join(rewards).encode('ascii'))
+                level['height'] = by
+                level['width'] = levelwidth
+                yield level
+                bxs, bys, materials, rewards = [], [], [], []
+                by = -1
+            else:
+                blockmap = line.split(' ')
+                levelwidth = len(blockmap)
+                by += 1
+                for bx in range(0, len(blockmap)):
+                    block = blockmap[bx]
+                    if not block.startswith('.'):
+                        bxs.append(bx)
+                        bys.append(by)
+                        materials.append(block[0])
+                        rewards.append(block[1])
+
+
+def compile_levels(source, target):
+    # streams the text levels into a pack, so memory use doesn't grow with the number of levels
+    stat = os.stat(source)
+    offsets = []
+    temp = target + '.tmp'
+    with open(source, 'r') as lines, open(temp, 'wb') as pack:
+        pack.write(header.pack(magic, version, 0, 0, 0, 0))
+        for level in parse_levels(lines):
+            name = level['name'].encode('utf-8')
+            record = b''.join((record_header.pack(len(name), level['width'], level['height'], len(level['blocks'])),
+                               name, level['blocks'].entries().tobytes()))
+            offsets.append((pack.tell(), len(record)))
+            pack.write(record)
+        index_offset = pack.tell()
+        for offset, length in offsets:
+            pack.write(index_entry.pack(offset, length))
+        pack.seek(0)
+        pack.write(header.pack(magic, version, len(offsets), index_offset, stat.st_mtime_ns, stat.st_size))
+    os.replace(temp, target)
+
+
+class LevelPack:
+    # read-only sequence of levels backed by a memory mapped pack.
+    # indexing decodes a fresh level dict in the same shape build_game_levels returns,
+    # copying the blocks straight into a BlockTable.
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, file_version, self.count, self.index_offset, self.source_mtime, self.source_size = \
+            header.unpack_from(self.data, 0)
+        if file_magic != magic or file_version != version:
+            self.close()
+            raise ValueError('%s is not a version %d level pack' % (path, version))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if i < 0 or i >= self.count:
+            raise IndexError('level index out of range')
+        offset, length = index_entry.unpack_from(self.data, self.index_offset + i * index_entry.size)
+        name_length, width, height, block_count = record_header.unpack_from(self.data, offset)
+        offset += record_header.size
+        level = {}
+        level['name'] = self.data[offset:offset + name_length].decode('utf-8')
+        level['height'] = height
+        level['width'] = width
+        offset += name_length
+        entries = np.frombuffer(self.data, dtype=entry_dtype, count=block_count, offset=offset)
+        level['blocks'] = BlockTable.from_entries(entries)
+        del entries
+        return level
+
+    def is_current(self, source):
+        stat = os.stat(source)
+        return stat.st_mtime_ns == self.source_mtime and stat.st_size == self.source_size
+
+    def close(self):
+        # safe to call more than once
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_level_pack(source='assets/levels.txt', target=None):
+    # opens the compiled pack for source, recompiling it first if the text has changed since.
+    # a pack shipped without its source is used as is.
+    if target is None:
+        target = os.path.splitext(source)[0] + '.pack'
+    if os.path.exists(target):
+        try:
+            pack = LevelPack(target)
+        except ValueError:
+            pack = None
+        if pack is not None:
+            if not os.path.exists(source) or pack.is_current(source):
+                return pack
+            pack.close()
+    compile_levels(source, target)
+    return LevelPack(target)
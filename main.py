@@ -4,63 +4,22 @@ Breakout Game
 Made with PyGame
 """
 
-import pygame, sys, time, random, math, pprint
-
-
-class Game:
-    INTRO = 1
-    PREGAME = 2
-    GAME = 3
-    SETTINGS = 4
-    PAUSE = 5
-    LEVEL_CLEARED = 6
-    WIN = 7
-    LOSS = 8
-    EXIT_PROMPT = 9
-
-    state = PREGAME
-
-
-# single global game object that represents global game state
-
-def distance_between_points(x1, y1, x2, y2):
-    return math.sqrt((x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1))
-
-def build_game_levels():
-    game_levels = []
-    level_file = open('assets/levels.txt', 'r')
-    lines = level_file.readlines()
-    by = -1
-    blocks = []
-    levelwidth = 0
-    for line in lines:
-        line = line.strip()
-        if not line.startswith('#'):
-            if line.startswith('name:'):
-                assert by >= 0
-                level = {}
-                level['name'] = line[5:]
-                level['blocks'] = blocks
-                level['height'] = by
-                level['width'] = levelwidth
-                game_levels.append(level)
-                blocks = []
-                by = -1
-            else:
-                blockmap = line.split(' ')
-                levelwidth = len(blockmap)
-                by += 1
-                for bx in range(0, len(blockmap)):
-                    block = blockmap[bx]
-                    if not block.startswith('.'):
-                        blockinfo = {}
-                        blockinfo['bx'] = bx
-                        blockinfo['by'] = by
-                        blockinfo['material'] = block[0]
-                        blockinfo['reward'] = block[1]
-                        blockinfo['hits'] = 3 if block[0] == 'S' else 1
-                        blocks.append(blockinfo)
-    return game_levels
+import time
+
+start_time = time.perf_counter()
+
+import pygame, sys, random, math, argparse, contextlib
+import numpy as np
+
+import drops
+import engine
+import entities
+import multiball
+import particles
+import render
+from resources import AssetManager
+from engine import Game, Input
+from levelpack import load_level_pack
 
 
 # Colors (R, G, B)
@@ -71,347 +30,579 @@ green = pygame.Color(0, 255, 0)
 blue = pygame.Color(0, 0, 255)
 
 
-class CollisionBox:
-    NONE = 0
-    RIGHT = 1
-    LEFT = 2
-    TOP = 4
-    BOTTOM = 8
-    INVALID = 15
+class Canvas(engine.Field):
+    draw_layer = 0
+    draw_states = (Game.GAME, Game.PREGAME, Game.LEVEL_CLEARED)
+    update_states = ()  # nothing on the field moves by itself
 
-    def get_collision(self, x, y):
-        return CollisionBox.INVALID
+    def __init__(self, game, assets, x, y, radius):
+        self.game = game
+        self.bg = assets.image("breakoutbg")
+        self.header = assets.image("header")
+        self.rightbg = assets.image("rightbg")
+        self.leftbg = assets.image("leftbg")
+        engine.Field.__init__(self, x, y, self.bg.get_width(), self.bg.get_height(), self.rightbg.get_width(), radius)
 
+    def draw(self, surface):
+        self.draw_background(surface, self.game.state)
 
-class BallBox(CollisionBox):
+    def draw_background(self, surface, state):
+        if state in (Game.GAME, Game.PREGAME):
+            # surface.blit(self.rightbg, (surface.get_width() - self.border_width, 0))
+            surface.blit(self.bg, (self.offset_x, self.header_height))  # self.border_width
+            surface.blit(self.rightbg, (surface.get_width() - self.border_width, 0))
+            surface.blit(self.leftbg, (self.offset_x - self.border_width, 0))
+            # pygame.draw.rect(surface, pygame.Color(0, 100, 0), self.ball_box_rect)
+            # for debugging to show ball box dimensions
+        elif state == Game.LEVEL_CLEARED:
+            pygame.draw.rect(surface, pygame.Color(0, 0, 0), (0, 0, self.width, self.height))
 
-    def __init__(self, rect, margin):
-        self.outside_rect = rect.copy()
-        self.inside_rect = self.outside_rect.inflate(-margin * 2, -margin * 2)
-        self.margin = margin
+    def draw_textures(self, target):
+        if self.game.state in (Game.GAME, Game.PREGAME):
+            target.blit(self.bg, (self.offset_x, self.header_height))
+            target.blit(self.rightbg, (target.width - self.border_width, 0))
+            target.blit(self.leftbg, (self.offset_x - self.border_width, 0))
+        elif self.game.state == Game.LEVEL_CLEARED:
+            target.fill((0, 0, 0), (0, 0, self.width, self.height))
+
+    def dirty_rects(self):
+        # backgrounds only change along with the game state, which redraws everything
+        return []
+
+
+def block_materials(assets, width, height):
+    # the block images for each material, indexed by hits left - 1
+    materials = {}
+    for name in 'ABCDEF':
+        materials[name] = [assets.scaled(name + '1', width, height)]
+    materials['S'] = [assets.scaled('S1', width, height), assets.scaled('S2', width, height),
+                      assets.scaled('S3', width, height)]
+    return materials
+
+
+class Ball(engine.Ball):
+    draw_layer = 4
+    draw_states = (Game.GAME, Game.PREGAME)
+    update_layer = 5
+    update_states = (Game.GAME,)
+    handle = None  # in the World
+    drawn_rect = None
+    drawn_color = None
 
-    def get_collision(self, x, y):
-        if self.inside_rect.collidepoint(x, y):
-            return BallBox.NONE
+    def draw(self, surface):
+        if self.visible:
+            position = self.get_position(self.level.sim.alpha)
+            if self.colliding_with_block:
+                pygame.draw.circle(surface, pygame.Color(255, 0, 0), position, self.radius)
+            else:
+                pygame.draw.circle(surface, self.color, position, self.radius)
 
-        result = BallBox.NONE
-        if x < self.inside_rect.x:
-            result |= BallBox.LEFT
-        elif x >= self.inside_rect.right:
-            result |= BallBox.RIGHT
+    def draw_textures(self, target):
+        if self.visible:
+            color = (255, 0, 0) if self.colliding_with_block else self.color
+            target.circle(color, self.get_position(self.level.sim.alpha), self.radius)
+
+    def get_rect(self):
+        r = self.radius + 1
+        x, y = self.get_position(self.level.sim.alpha)
+        return pygame.Rect(int(x) - r, int(y) - r, r * 2 + 1, r * 2 + 1)
+
+    def dirty_rects(self):
+        rect = self.get_rect() if self.visible else None
+        color = self.colliding_with_block
+        if rect == self.drawn_rect and color == self.drawn_color:
+            return []
+        result = [r for r in (self.drawn_rect, rect) if r]
+        self.drawn_rect = rect
+        self.drawn_color = color
+        return result
 
-        if y < self.inside_rect.y:
-            result |= BallBox.TOP
-        elif y >= self.inside_rect.bottom:
-            result |= BallBox.BOTTOM
 
-        if result == BallBox.NONE:
-            return BallBox.INVALID
+class PoolView:
+    # drawing side of the pools below. the part of the screen they change is
+    # one box around everything in the pool, old and new positions, from
+    # get_rect.
+    drawn_rect = None
 
+    def dirty_rects(self):
+        rect = self.get_rect()
+        result = [r for r in (self.drawn_rect, rect) if r]
+        self.drawn_rect = rect
         return result
 
-    def direction_to_vector(self, angle, length):
-        dx = length * math.sin(angle)
-        dy = length * math.cos(angle)
-        return dx, dy
-
-
-class BlockBox(CollisionBox):
-    def __init__(self, rect, margin):
-        self.inside_rect = rect.copy()
-        self.margin = margin
-        self.top_bottom_rect = pygame.Rect(self.inside_rect.x, self.inside_rect.y - self.margin, self.inside_rect.width,
-                                           self.inside_rect.height + self.margin * 2)
-
-        self.left_right_rect = pygame.Rect(self.inside_rect.x - self.margin, self.inside_rect.y,
-                                           self.inside_rect.width + self.margin * 2, self.inside_rect.height)
-
-    def get_collision(self, x, y):
-        if self.top_bottom_rect.collidepoint(x, y):
-            return BlockBox.TOP | BlockBox.BOTTOM
-        if self.left_right_rect.collidepoint(x, y):
-            return BlockBox.LEFT | BlockBox.RIGHT
-        if self.point_in_circle(x, y, self.inside_rect.x, self.inside_rect.y, self.margin):
-            return BlockBox.TOP | BlockBox.LEFT
-        if self.point_in_circle(x, y, self.inside_rect.x + self.inside_rect.width, self.inside_rect.y, self.margin):
-            return BlockBox.TOP | BlockBox.RIGHT
-        if self.point_in_circle(x, y, self.inside_rect.x, self.inside_rect.y + self.inside_rect.height, self.margin):
-            return BlockBox.LEFT | BlockBox.BOTTOM
-        if self.point_in_circle(x, y, self.inside_rect.x + self.inside_rect.width,
-                                self.inside_rect.y + self.inside_rect.height, self.margin):
-            return BlockBox.RIGHT | BlockBox.BOTTOM
-        return BlockBox.NONE
-
-    def point_in_circle(self, x, y, cx, cy, r):
-        dx = cx - x
-        dy = cy - y
-        return dx * dx + dy * dy <= r * r
-
-    def calc_bounce(self, cx, cy, dx, dy):
-        # function accepts current location of the ball in cx,cy,
-        # proposed coordinate changes as dx, dy. if proposed
-        # position is inside the box, the function calculates
-        # returns the collision point between the ball and the
-        # box. as well as the updated dx, dy to reflect
-        # the ball's bounce.
-        if dy == 0:
-            return self.special_calc_bounce(cx, cy, dx, dy)
-        return self.normal_calc_bounce(cx, cy, dx, dy)
-
-    def normal_calc_bounce(self, cx, cy, dx, dy):
-        px = cx + dx
-        py = cy + dy
-        slope = (py - cy) / (px - cx)
-        r = self.margin
-        Rx1 = self.inside_rect.x - r
-        Rx2 = self.inside_rect.x + self.inside_rect.width + r
-        Ry1 = self.inside_rect.y - r
-        Ry2 = self.inside_rect.y + self.inside_rect.height + r
-        top_collision = None
-        bottom_collision = None
-        left_collision = None
-        right_collision = None
-        collision_bitmap = 0
-
-        # checking bottom
-        # y = Ry + Rh + r
-        x = ((Ry2 - cy) / slope) + cx
-
-        if x >= Rx1 and x <= Rx2:
-            bottom_collision = (x, Ry2)
-            collision_bitmap += 1
-
-        # checking top
-        x = ((Ry1 - cy) / slope) + cx
-        if x >= Rx1 and x <= Rx2:
-            top_collision = (x, Ry1)
-            collision_bitmap += 4
-
-        # checking left
-        y = ((slope * (Rx1 - cx)) + cy)
-        if y >= Ry1 and y <= Ry2:
-            left_collision = (Rx1, y)
-            collision_bitmap += 8
-
-        # checking right
-        y = ((slope * (Rx2 - cx)) + cy)
-        if y >= Ry1 and y <= Ry2:
-            right_collision = (Rx2, y)
-            collision_bitmap += 2
-
-        if collision_bitmap == 3:  # bottom or right
-            if dy > 0:
-                return right_collision, (-dx, dy)
-            return bottom_collision, (dx, -dy)
-        elif collision_bitmap == 5:  # top or bottom
-            if dy > 0:
-                return top_collision, (dx, -dy)
-            return bottom_collision, (dx, -dy)
-        elif collision_bitmap == 6:  # top or right
-            if dy > 0:
-                return top_collision, (dx, -dy)
-            return right_collision, (-dx, dy)
-        elif collision_bitmap == 9:  # bottom or left
-            if dy > 0:
-                return left_collision, (-dx, dy)
-            return bottom_collision, (dx, -dy)
-        elif collision_bitmap == 10:  # left or right
-            if dx > 0:
-                return left_collision, (-dx, dy)
-            return right_collision, (-dx, dy)
-        elif collision_bitmap == 12:  # top or left
-            if dy > 0:
-                return top_collision, (dx, -dy)
-            return left_collision, (-dx, dy)
-        return None
 
-    def special_calc_bounce(self, cx, cy, dx, dy):
-        pass
+class MultiBall(PoolView, multiball.MultiBall):
+    draw_layer = 5
+    draw_states = (Game.GAME, Game.PREGAME)
+    update_layer = 2
+    update_states = (Game.GAME,)
 
+    def draw(self, surface):
+        xs, ys = self.get_positions(self.level.sim.alpha)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            pygame.draw.circle(surface, self.color, (x, y), self.radius)
+
+    def draw_textures(self, target):
+        xs, ys = self.get_positions(self.level.sim.alpha)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            target.circle(self.color, (x, y), self.radius)
 
-class Canvas:
-    def __init__(self, x, y, radius):
-        self.bg = pygame.image.load("assets/breakoutbg.png")
-        self.header = pygame.image.load("assets/header.png")
-        self.rightbg = pygame.image.load("assets/rightbg.png")
-        self.leftbg = pygame.image.load("assets/leftbg.png")
-        self.border_width = self.rightbg.get_width()
-        self.header_height = 0  # self.header.get_height()
-        self.width = self.bg.get_width()
-        self.height = self.bg.get_height()
-        self.ball_box_rect = pygame.Rect(x + self.border_width, y + self.header_height, self.width, self.height)
-        self.ball_box = BallBox(self.ball_box_rect, radius)
-        self.offset_x = x + self.border_width
-        self.offset_y = y + self.header_height
-        self.radius = radius
+    def get_rect(self):
+        if self.count == 0:
+            return None
+        r = self.radius + 1
+        xs, ys = self.get_positions(self.level.sim.alpha)
+        x1 = int(xs.min()) - r
+        y1 = int(ys.min()) - r
+        x2 = int(xs.max()) + r + 1
+        y2 = int(ys.max()) + r + 1
+        return pygame.Rect(x1, y1, x2 - x1, y2 - y1)
+
+
+class Drops(PoolView, drops.Drops):
+    draw_layer = 2  # under the paddle that catches them
+    draw_states = (Game.GAME, Game.PREGAME)
+    update_layer = 3
+    update_states = (Game.GAME,)
+    images = None
+
+    def get_images(self):
+        # by character code. the reward art is a deferred asset, so it is looked up when first drawn
+        if self.images is None:
+            self.images = dict((ord(name), self.level.assets.image('reward' + name)) for name in 'LSB')
+        return self.images
+
+    def positions(self):
+        # top left corners and images of every drop
+        images = self.get_images()
+        xs, ys = self.get_positions(self.level.sim.alpha)
+        return [(x - self.width / 2, y - self.height / 2, images[kind])
+                for x, y, kind in zip(xs.tolist(), ys.tolist(), self.kind[:self.count].tolist()) if kind in images]
 
     def draw(self, surface):
-        if Game.state in (Game.GAME, Game.PREGAME):
-            # surface.blit(self.rightbg, (window_width - self.border_width, 0))
-            surface.blit(self.bg, (self.offset_x, self.header_height))  # self.border_width
-            surface.blit(self.rightbg, (window_width - self.border_width, 0))
-            surface.blit(self.leftbg, (self.offset_x - self.border_width, 0))
-            # pygame.draw.rect(surface, pygame.Color(0, 100, 0), self.ball_box_rect)
-            # for debugging to show ball box dimensions
-        elif Game.state == Game.LEVEL_CLEARED:
-            pygame.draw.rect(surface, pygame.Color(0, 0, 0), (0, 0, self.width, self.height))
+        for x, y, image in self.positions():
+            surface.blit(image, (x, y))
 
-    def update(self):
-        pass
+    def draw_textures(self, target):
+        for x, y, image in self.positions():
+            target.blit(image, (x, y))
+
+    def get_rect(self):
+        if self.count == 0:
+            return None
+        xs, ys = self.get_positions(self.level.sim.alpha)
+        x1 = int(xs.min() - self.width / 2) - 1
+        y1 = int(ys.min() - self.height / 2) - 1
+        x2 = int(xs.max() + self.width / 2) + 2
+        y2 = int(ys.max() + self.height / 2) + 2
+        return pygame.Rect(x1, y1, x2 - x1, y2 - y1)
+
+
+class Particles(PoolView, particles.ParticlePool):
+    draw_layer = 6
+    draw_states = (Game.GAME, Game.PREGAME)
+    update_layer = 4
+    update_states = (Game.GAME,)
+    layer = None  # the field sized surface particles are drawn into for render.TextureRenderer
+    layer_rect = None
+
+    def __init__(self, level, bounds, speed_scale):
+        self.level = level
+        particles.ParticlePool.__init__(self, bounds, speed_scale)
 
+    def draw(self, surface):
+        self.draw_pixels(surface)
 
-class Level:
-    def __init__(self, world, canvas, radius):
+    def draw_textures(self, target):
+        # only the part of the layer the particles were on or are on now is
+        # uploaded again, and only the part they are on now is drawn
+        rect = self.get_rect()
+        if rect is None and self.layer_rect is None:
+            return
+        if self.layer is None:
+            self.layer = pygame.Surface(self.bounds.size, pygame.SRCALPHA)
+        origin = (-self.bounds.x, -self.bounds.y)
+        changed = [r for r in (self.layer_rect, rect) if r]
+        if self.layer_rect:
+            self.layer.fill((0, 0, 0, 0), self.layer_rect.move(origin))
+        self.draw_pixels(self.layer, origin)
+        self.layer_rect = rect
+        target.upload(self.layer, changed[0].unionall(changed[1:]).move(origin).clip(self.layer.get_rect()))
+        if rect:
+            area = rect.move(origin).clip(self.layer.get_rect())
+            target.blit(self.layer, (area.x + self.bounds.x, area.y + self.bounds.y), area)
+
+
+class Level(engine.Level):
+    draw_layer = 1
+    draw_states = (Game.GAME, Game.PREGAME, Game.PAUSE, Game.EXIT_PROMPT)
+    update_layer = 1
+    update_states = (Game.GAME,)
+    ball_class = Ball
+    multiball_class = MultiBall
+    drops_class = Drops
+
+    def __init__(self, sim, world, assets, canvas, radius, game_levels):
         self.world = world
-        self.canvas = canvas
-        self.game_levels = build_game_levels()
-        self.current_level = 0
-        self.level_count = len(self.game_levels)
-        self.level = None
-        self.name = None
-        self.score = 0
-        self.lives = 3
+        self.assets = assets
         self.materials = None
-        self.block_width = None
-        self.block_height = None
-        self.radius = radius
-        self.resting_ball = None
-        self.active_balls = 0
-        self.paddle = None
-
-        print(canvas.radius)
+        self.dirty = []
+        # a new level was set up since the last frame, e.g. by rewinding into an earlier one
+        self.new_layout = True
+        self.drawn_hud = None
+        self.block_layer = None
+        self.block_layer_rect = None
+        # the block layer as a texture when drawn with render.TextureRenderer, and blocks redrawn since
+        self.block_texture = None
+        self.redrawn_blocks = []
+        # debris and sparks off blocks being hit, tinted like the block
+        self.particles = Particles(self, canvas.ball_box_rect, sim.speed_scale)
+        self.tints = None
 
         self.font = pygame.font.SysFont('Comic Sans MS', 25)
-        self.new_level(self.current_level)
+        self.score_text = render.DigitCounter(self.font, (255, 255, 255), 'Score: ', 6)
+        self.lives_text = render.HudText(self.font, (255, 255, 255), 'Lives: %d')
+        self.name_text = render.HudText(self.font, (255, 255, 255))
+        super().__init__(sim, canvas, radius, game_levels)
+        self.world.add(self.drops)
+        self.world.add(self.multiball)
+        self.world.add(self.particles)
 
     def new_level(self, level):
-        self.current_level = level
-        self.level = self.game_levels[self.current_level]
-        blocks = self.level['blocks']
-        height = self.level['height']
-        width = self.level['width']
-        self.name = self.level['name']
-        self.block_width = (self.canvas.width - 300) / width
-        self.block_height = int(self.block_width / 2.5)
-        self.materials = {}
-        self.materials['A'] = [self.load_scaled("A1")]
-        self.materials['B'] = [self.load_scaled("B1")]
-        self.materials['C'] = [self.load_scaled("C1")]
-        self.materials['D'] = [self.load_scaled("D1")]
-        self.materials['E'] = [self.load_scaled("E1")]
-        self.materials['F'] = [self.load_scaled("F1")]
-        self.materials['S'] = [self.load_scaled("S1"), self.load_scaled("S2"), self.load_scaled("S3")]
-        for block in blocks:
-            bx = block['bx']
-            by = block['by']
-            block['rect'] = pygame.Rect(bx * self.block_width + self.canvas.offset_x + 150,
-                                        by * self.block_height + self.canvas.offset_y + 20, self.block_width,
-                                        self.block_height)
-            block['box'] = BlockBox(block['rect'], canvas.radius)
-        pp = pprint.PrettyPrinter(indent=4)
-        pp.pprint(self.level)
-        self.active_balls = 0
-        self.create_resting_ball()
-
-    def create_resting_ball(self):
-        bx = self.canvas.width / 2 + self.canvas.offset_x
-        by = self.canvas.height - 60 + self.canvas.offset_y - 25
-        self.resting_ball = self.create_ball(bx, by, 0, math.pi * 0.75, True)
-
-    def load_scaled(self, name):
-        return pygame.transform.smoothscale(pygame.image.load("assets/" + name + ".png"),
-                                            (self.block_width, self.block_height))
-
-    def draw(self, surface):
-        if Game.state not in (Game.GAME, Game.PREGAME, Game.PAUSE, Game.EXIT_PROMPT):
+        super().new_level(level)
+        self.materials = block_materials(self.assets, self.block_width, self.block_height)
+        self.tints = dict((name, pygame.transform.average_color(images[0])[:3])
+                          for name, images in self.materials.items())
+        self.particles.clear()
+        self.build_block_layer()
+        self.new_layout = True
+
+    def build_block_layer(self):
+        # all blocks pre-composited into one surface, patched as blocks get hit
+        blocks = self.blocks
+        self.block_texture = None
+        if not len(blocks):
+            self.block_layer = None
             return
-        textsurface = self.font.render('Score: %06d' % self.score, False, (255, 255, 255))
-        surface.blit(textsurface, (20, 30))
-        textsurface = self.font.render('Lives: %d' % self.lives, False, (255, 255, 255))
-        surface.blit(textsurface, (20, 60))
-        textsurface = self.font.render(self.name, False, (255, 255, 255))
-        surface.blit(textsurface, (20, 0))
-        blocks = self.level['blocks']
+        left = min(blocks.left)
+        top = min(blocks.top)
+        self.block_layer_rect = pygame.Rect(left, top, max(blocks.right) - left, max(blocks.bottom) - top)
+        self.block_layer = pygame.Surface(self.block_layer_rect.size, pygame.SRCALPHA)
         for block in blocks:
-            if block['hits'] != 0:
-                # pygame.draw.rect(surface, pygame.Color(0, 0, 120), block['rect'])
-                material_name = block['material']
-                material = self.materials[material_name]
-                index = block['hits'] - 1
-                image = material[index]
-                r = block['rect']
-                surface.blit(image, (r.x, r.y))
-
-    def update(self):
-        if Game.state == Game.GAME:
-            if self.resting_ball:
-                self.resting_ball.set_speed(5)
-                self.resting_ball = None
-
-    def is_colliding_with_block(self, x, y, nx, ny, r):
-        blocks = self.level['blocks']
+            self.draw_block(block)
+
+    def draw_block(self, block):
+        r = block['rect'].move(-self.block_layer_rect.x, -self.block_layer_rect.y)
+        self.block_layer.fill((0, 0, 0, 0), r)
+        if block['hits'] != 0:
+            material_name = block['material']
+            material = self.materials[material_name]
+            index = block['hits'] - 1
+            image = material[index]
+            self.block_layer.blit(image, r)
+        if self.block_texture is not None:
+            self.redrawn_blocks.append(block)
+
+    def draw_block_textures(self, target, blocks, clear):
+        # draws blocks onto the layer texture grouped by image, so each material is one run of copies
+        x, y = self.block_layer_rect.topleft
+        rects = []
+        batches = {}
         for block in blocks:
-            if block['box'].get_collision(nx, ny) != BallBox.NONE:
-                if block['hits'] > 0:
-                    return block
-        return None
+            r = block['rect'].move(-x, -y)
+            rects.append(r)
+            hits = block['hits']
+            if hits != 0:
+                batches.setdefault((block['material'], hits), []).append(r)
+        target.draw_batches(self.block_texture, rects if clear else [],
+                            [(self.materials[material][hits - 1], r) for (material, hits), r in batches.items()])
 
-    def is_colliding_with_paddle(self, x, y, nx, ny, r):
-        hc = self.paddle.get_hit_circle()
-        if abs(nx - hc[0]) > hc[3] or ny > (hc[1] - hc[2] + 10):
+    def draw(self, surface):
+        surface.blit(self.score_text.get(self.score), (20, 30))
+        surface.blit(self.lives_text.get(self.lives), (20, 60))
+        surface.blit(self.name_text.get(self.name), (20, 0))
+        if self.block_layer:
+            surface.blit(self.block_layer, self.block_layer_rect)
+
+    def draw_textures(self, target):
+        # the counter draws into the same surface every time, so its texture goes by the score
+        target.blit(self.score_text.get(self.score), (20, 30), version=self.score)
+        target.blit(self.lives_text.get(self.lives), (20, 60))
+        target.blit(self.name_text.get(self.name), (20, 0))
+        if not self.block_layer:
+            return
+        if self.block_texture is None:
+            self.block_texture = target.create_layer(self.block_layer_rect.size)
+            self.draw_block_textures(target, self.blocks, False)
+        elif self.redrawn_blocks:
+            self.draw_block_textures(target, self.redrawn_blocks, True)
+        self.redrawn_blocks = []
+        self.block_texture.draw(dstrect=self.block_layer_rect)
+
+    def dirty_rects(self):
+        result = self.dirty
+        self.dirty = []
+        if self.new_layout:
+            self.new_layout = False
             return None
-        d = distance_between_points(nx, ny, hc[0], hc[1])
-        if d <= (hc[2] + r):
-            return hc
-        return None
+        hud = (self.score, self.lives, self.name)
+        if hud != self.drawn_hud:
+            self.drawn_hud = hud
+            result.append(pygame.Rect(0, 0, self.canvas.offset_x - self.canvas.border_width, 100))
+        return result
 
-    def is_level_cleared(self):
-        blocks = self.level['blocks']
-        for block in blocks:
-            if block['hits'] != 0:
-                return False
-        return True
+    def update_pools(self):
+        # the world updates the pools, right after the level
+        pass
 
-    def level_cleared(self):
-        if self.current_level == self.level_count - 1:
-            Game.state = Game.WIN
-        else:
-            Game.state = Game.LEVEL_CLEARED
-            self.new_level(self.current_level + 1)
+    def hit_block(self, block):
+        level = self.level
+        self.dirty.append(block['rect'])
+        broke = engine.Level.hit_block(self, block)
+        if self.level is level:
+            self.draw_block(block)
+            self.particles.burst(block['rect'], self.tints[block['material']], broke)
+        return broke
+
+    def restore_blocks(self, indices):
+        engine.Level.restore_blocks(self, indices)
+        for index in indices:
+            block = self.blocks[index]
+            self.dirty.append(block['rect'])
+            self.draw_block(block)
 
     def create_ball(self, x, y, speed, heading, visible):
-        self.active_balls += 1
-        # math.pi * 2 * random.random()
-        ball = Ball(self.canvas, self, white, x, y, self.radius, speed, heading, visible)
-        self.world.objects.append(ball)
+        ball = engine.Level.create_ball(self, x, y, speed, heading, visible)
+        ball.handle = self.world.add(ball)
         return ball
 
-    def delete_ball(self, ball):
-        self.world.objects.remove(ball)
-        self.active_balls -= 1
-        if self.active_balls == 0:
-            self.lives -= 1
-            if self.lives == 0:
-                Game.state = Game.LOSS
-            else:
-                Game.state = Game.PREGAME
-                self.create_resting_ball()
+    def remove_ball(self, ball):
+        engine.Level.remove_ball(self, ball)
+        self.world.remove(ball.handle)
+        if ball.drawn_rect:
+            self.dirty.append(ball.drawn_rect)
+
+
+def endless_level_class():
+    # Level scrolling like endless.EndlessLevel, built when called so endless.py
+    # is only imported when --endless is given
+    import endless
+
+    class EndlessLevel(Level, endless.EndlessLevel):
+        # the block layer covers every row on screen and moves with the blocks
+        def scrolled(self, rows):
+            if self.block_layer is None:
+                return
+            old_rect = self.block_layer_rect.copy()
+            self.block_layer_rect.y = self.blocks.top[0]
+            rows = min(rows, self.level['height'])
+            if rows:
+                # the layer texture is drawn again from scratch rather than scrolled
+                self.block_texture = None
+                self.redrawn_blocks = []
+                self.block_layer.scroll(0, rows * self.block_height)
+                for index in range(rows * self.level['width']):
+                    self.draw_block(self.blocks[index])
+            self.dirty.append(old_rect.union(self.block_layer_rect))
+
+    return EndlessLevel
+
+
+class Paddle(engine.Paddle):
+    # represents the paddle
+    draw_layer = 3
+    draw_states = (Game.GAME, Game.PREGAME, Game.PAUSE)
+    update_states = ()  # moved by input
 
+    def __init__(self, canvas, level, assets):
+        self.paddle_img = assets.image("Paddle")
+        engine.Paddle.__init__(self, canvas, level, self.paddle_img.get_width(), self.paddle_img.get_height())
+        self.game = level.game
+        self.drawn_rect = None
+
+    def draw(self, surface):
+        # pygame.draw.rect(surface, pygame.Color(0, 255, 0), self.canvas.ball_box.inside_rect)
+        x, y = self.get_position(self.level.sim.alpha)
+        x = x - (self.paddle_img.get_width() / 2) + self.canvas.offset_x
+        y = y - (self.paddle_img.get_height() / 2) + self.canvas.offset_y
+        hit_circle = self.get_hit_circle()
+        # hit circle don't remove this code for debugging
+        # pygame.draw.circle(surface, pygame.Color(0, 0, 255), (hit_circle[0], hit_circle[1]), hit_circle[2])
+        surface.blit(self.paddle_img, (x, y))
+
+    def draw_textures(self, target):
+        x, y = self.get_position(self.level.sim.alpha)
+        x = x - (self.paddle_img.get_width() / 2) + self.canvas.offset_x
+        y = y - (self.paddle_img.get_height() / 2) + self.canvas.offset_y
+        target.blit(self.paddle_img, (x, y))
+
+    def get_rect(self):
+        x, y = self.get_position(self.level.sim.alpha)
+        x = x - (self.paddle_img.get_width() / 2) + self.canvas.offset_x
+        y = y - (self.paddle_img.get_height() / 2) + self.canvas.offset_y
+        return pygame.Rect(int(x) - 1, int(y) - 1, self.paddle_img.get_width() + 2, self.paddle_img.get_height() + 2)
+
+    def dirty_rects(self):
+        rect = self.get_rect()
+        if rect == self.drawn_rect:
+            return []
+        result = [r for r in (self.drawn_rect, rect) if r]
+        self.drawn_rect = rect
+        return result
 
-class World:
-    def __init__(self):
-        self.objects = []
+
+class SnapshotView:
+    # draws the newest snapshot from source, a simthread.SimulationThread or a
+    # spectate.SpectatorClient, in place of Canvas, Level, Paddle and the balls.
+    # snapshots are tick_rate a second.
+    draw_layer = 1
+
+    def __init__(self, source, tick_rate, canvas, assets):
+        self.source = source
+        self.canvas = canvas
+        self.assets = assets
+        self.tick_time = 1.0 / tick_rate
+        self.paddle_img = assets.image("Paddle")
+        self.font = pygame.font.SysFont('Comic Sans MS', 25)
+        self.score_text = render.DigitCounter(self.font, (255, 255, 255), 'Score: ', 6)
+        self.lives_text = render.HudText(self.font, (255, 255, 255), 'Lives: %d')
+        self.name_text = render.HudText(self.font, (255, 255, 255))
+        self.layout = None
+        self.hits = None
+        self.materials = None
+        self.block_layer = None
+        self.block_layer_rect = None
+        self.drop_images = None
+
+    def sync_blocks(self, snapshot):
+        # brings the block layer up to date with the snapshot's blocks
+        layout = snapshot.layout
+        if layout is not self.layout:
+            self.layout = layout
+            self.hits = snapshot.hits
+            self.materials = block_materials(self.assets, layout.block_width, layout.block_height)
+            self.block_layer = None
+            if len(layout):
+                left = int(layout.left.min())
+                top = int(layout.top.min())
+                self.block_layer_rect = pygame.Rect(left, top, int(layout.right.max()) - left,
+                                                    int(layout.bottom.max()) - top)
+                self.block_layer = pygame.Surface(self.block_layer_rect.size, pygame.SRCALPHA)
+                for index in range(len(layout)):
+                    self.draw_block(index)
+        elif snapshot.hits is not self.hits:
+            changed = np.flatnonzero(np.frombuffer(snapshot.hits, dtype=np.uint8) !=
+                                     np.frombuffer(self.hits, dtype=np.uint8))
+            self.hits = snapshot.hits
+            for index in changed.tolist():
+                self.draw_block(index)
+
+    def draw_block(self, index):
+        layout = self.layout
+        left = int(layout.left[index])
+        top = int(layout.top[index])
+        r = pygame.Rect(left - self.block_layer_rect.x, top - self.block_layer_rect.y,
+                        int(layout.right[index]) - left, int(layout.bottom[index]) - top)
+        self.block_layer.fill((0, 0, 0, 0), r)
+        hits = self.hits[index]
+        if hits != 0:
+            self.block_layer.blit(self.materials[chr(layout.material[index])][hits - 1], r)
 
     def draw(self, surface):
-        for o in self.objects:
-            o.draw(surface)
+        snapshot = self.source.snapshot
+        alpha = min((time.perf_counter() - snapshot.time) / self.tick_time, 1.0)
+        state = snapshot.state
+        canvas = self.canvas
+        canvas.draw_background(surface, state)
+        if state in (Game.GAME, Game.PREGAME, Game.PAUSE, Game.EXIT_PROMPT):
+            surface.blit(self.score_text.get(snapshot.score), (20, 30))
+            surface.blit(self.lives_text.get(snapshot.lives), (20, 60))
+            surface.blit(self.name_text.get(snapshot.layout.name), (20, 0))
+            self.sync_blocks(snapshot)
+            if self.block_layer:
+                surface.blit(self.block_layer, self.block_layer_rect)
+        if state in (Game.GAME, Game.PREGAME) and len(snapshot.drops[4]):
+            if self.drop_images is None:
+                self.drop_images = dict((ord(name), self.assets.image('reward' + name)) for name in 'LSB')
+            xs, ys, kinds = snapshot.drop_positions(alpha)
+            for x, y, kind in zip(xs.tolist(), ys.tolist(), kinds.tolist()):
+                if kind in self.drop_images:
+                    surface.blit(self.drop_images[kind], (x - drops.Drops.width / 2, y - drops.Drops.height / 2))
+        if state in (Game.GAME, Game.PREGAME, Game.PAUSE):
+            prev_x, x, y = snapshot.paddle
+            x = prev_x + (x - prev_x) * alpha - (self.paddle_img.get_width() / 2) + canvas.offset_x
+            y = y - (self.paddle_img.get_height() / 2) + canvas.offset_y
+            surface.blit(self.paddle_img, (x, y))
+        if state in (Game.GAME, Game.PREGAME):
+            balls, xs, ys = snapshot.positions(alpha)
+            for x, y, visible, colliding in balls:
+                if visible:
+                    pygame.draw.circle(surface, red if colliding else white, (x, y), canvas.radius)
+            for x, y in zip(xs.tolist(), ys.tolist()):
+                pygame.draw.circle(surface, white, (x, y), canvas.radius)
+
+    def dirty_rects(self):
+        # everything moves on its own clock, so every frame is a full redraw
+        return None
+
+
+class Breakout(engine.Simulation):
+    # the simulation wired up to the display classes above
+    profiler = None
+
+    def __init__(self, world, canvas, game, assets, tick_rate, game_levels, level_class=Level):
+        self.world = world
+        self.assets = assets
+        self.level_class = level_class
+        engine.Simulation.__init__(self, canvas, game_levels, game, tick_rate=tick_rate)
+
+    def create_level(self, game_levels):
+        return self.level_class(self, self.world, self.assets, self.canvas, self.radius, game_levels)
+
+    def create_paddle(self):
+        return Paddle(self.canvas, self.level, self.assets)
 
     def update(self):
-        for o in self.objects:
+        # the world's entities, scheduled by game state like drawing. the level
+        # comes before the balls as in engine.Simulation.update
+        if self.profiler is None:
+            for o in self.world.updated(self.game.state):
+                o.update()
+            return
+        record = self.profiler.record
+        for o in self.world.updated(self.game.state):
+            start = time.perf_counter()
             o.update()
+            record(type(o).__name__ + '.update', start, 'update')
+
+
+class World(entities.Registry):
+    # everything drawn and updated, scheduled by the state of game
+    def __init__(self, game):
+        entities.Registry.__init__(self)
+        self.game = game
+        self.profiler = None
+
+    def visible(self):
+        # the entities drawn in the current state, in draw order
+        return self.active(self.game.state)
+
+    def draw(self, surface):
+        if self.profiler is None:
+            for objects in self.scheduled(self.game.state):
+                for o in objects.values():
+                    o.draw(surface)
+            return
+        record = self.profiler.record
+        for o in self.visible():
+            start = time.perf_counter()
+            o.draw(surface)
+            record(type(o).__name__ + '.draw', start, 'draw')
 
 
 class AnimatedLine:
+    draw_layer = 7
+
     def __init__(self):
         self.x = random.randint(0, 300)
         self.y = random.randint(0, 300)
@@ -429,8 +620,17 @@ class AnimatedLine:
     def draw(self, surface):
         pygame.draw.line(surface, white, (self.x, self.y), (self.x2, self.y2))
 
+    def draw_textures(self, target):
+        target.renderer.draw_color = white
+        target.renderer.draw_line((self.x, self.y), (self.x2, self.y2))
+
+    def dirty_rects(self):
+        return None
+
 
 class Block:
+    draw_layer = 7
+
     def __init__(self, color, x, y, width, height, visible):
         self.color = color
         self.x = x
@@ -443,176 +643,18 @@ class Block:
         if self.visible:
             pygame.draw.rect(surface, self.color, [self.x, self.y, self.width, self.height])
 
-    def update(self):
-        pass
-
-
-class Ball:
-    def __init__(self, canvas, level, color, x, y, radius, speed, heading, visible):
-        self.color = color
-        self.x = x
-        self.y = y
-        self.radius = radius
-        self.speed = speed
-        self.heading = heading
-        self.visible = visible
-        self.canvas = canvas
-        self.level = level
-        self.motion_enabled = True
-        self.dx, self.dy = canvas.ball_box.direction_to_vector(heading, speed)
-        self.colliding_with_block = False
-
-    def draw(self, surface):
-        if Game.state not in (Game.GAME, Game.PREGAME):
-            return
+    def draw_textures(self, target):
         if self.visible:
-            if self.colliding_with_block:
-                pygame.draw.circle(surface, pygame.Color(255, 0, 0), (self.x, self.y), self.radius)
-            else:
-                pygame.draw.circle(surface, self.color, (self.x, self.y), self.radius)
-
-    def update(self):
-        if Game.state != Game.GAME:
-            return
-        if not self.motion_enabled:
-            return
-        if self.speed == 0:
-            return
-        x = self.x + self.dx
-        y = self.y + self.dy
-
-        self.colliding_with_block = False
-        result = self.canvas.ball_box.get_collision(x, y)
-        if result == BallBox.NONE:
-            result_block = self.level.is_colliding_with_block(self.x, self.y, x, y, self.radius)
-            if result_block:
-                box = result_block['box']
-                bounce_result = box.calc_bounce(self.x, self.y, self.dx, self.dy)
-                if bounce_result:
-                    np, nd = bounce_result
-                    self.x, self.y = np
-                    self.dx, self.dy = nd
-
-                    self.colliding_with_block = True
-                    if result_block['hits'] > 0:
-                        result_block['hits'] -= 1
-                        if result_block['hits'] == 0:
-                            if self.level.is_level_cleared():
-                                level.level_cleared()
-            else:
-                hc = self.level.is_colliding_with_paddle(self.x, self.y, x, y, self.radius)
-                if hc:
-                    x1, y1 = hc[0], hc[1]
-                    x2, y2 = self.x, self.y
-                    R = hc[2]
-                    pw = hc[3]
-
-                    r = self.radius
-
-                    if abs(x1 - x2) < 0.001:
-                        # handle as vertical collision
-                        ny = y1-(R+r)
-                        self.y = ny
-                        self.dy = -self.dy  # handle bounce straight up
-                    else:
-                        m = (y2 - y1) / (x2 - x1)
-                        a = 1 + m * m
-                        b = -(2 * x1 + 2 * m*m * x1)
-                        c1 = x1*x1 + m*m * x1*x1 - R*R
-                        c2 = x1*x1 + m*m * x1*x1 - (R+r)*(R+r)
-
-                        disc1 = math.sqrt(b*b - 4 * a * c1)
-                        disc2 = math.sqrt(b*b - 4 * a * c2)
-
-                        sol1_x1 = (-b + disc2) / (2 * a)
-                        sol1_x2 = (-b - disc2) / (2 * a)
-
-                        sol2_x1 = (-b + disc2) / (2 * a)
-                        sol2_x2 = (-b - disc2) / (2 * a)
-
-                        sol1_y1 = m * (sol1_x1 - x1) + y1
-                        sol1_y2 = m * (sol1_x2 - x1) + y1
-
-                        sol2_y1 = m * (sol2_x1 - x1) + y1
-                        sol2_y2 = m * (sol2_x2 - x1) + y1
-
-                        # self.x, self.y, self.dx, self.dy where ball is now and where it wants to go
-                        if sol2_y1 < sol2_y2:
-                            # sol2_x1, sol2_y1
-                            offset = min(pw, (sol2_x1 - x1)) if sol2_x1 > x1 else max(-pw, (sol2_x1-x1))
-                            self.dx += offset * 0.1
-                            self.x = sol2_x1
-                            self.y = sol2_y1
-                        else:
-                            # sol2_x2, sol2_y2
-                            offset = min(pw, (sol2_x2 - x1)) if sol2_x2 > x1 else max(-pw, (sol2_x2-x1))
-                            self.dx += offset * 0.1
-                            self.x = sol2_x2
-                            self.y = sol2_y2
-                        self.dy = -self.dy  # ball always bounces in y direction
-                else:
-                    self.x, self.y = x, y
-
-            return
-        if result & BallBox.BOTTOM:
-            self.level.delete_ball(self)
-            return
-        if result & (BallBox.LEFT | BallBox.RIGHT):
-            self.dx = -self.dx
-        if result & (BallBox.TOP | BallBox.BOTTOM):
-            self.dy = -self.dy
-        self.heading = math.asin(self.dy / self.speed)
-
-    def move(self, x, y):
-        self.x, self.y = x, y
-
-    def set_speed(self, speed):
-        self.speed = speed
-        self.dx, self.dy = self.canvas.ball_box.direction_to_vector(self.heading, self.speed)
-
-
-class Paddle:
-    # represents the paddle
-    def __init__(self, canvas, level):
-        self.level = level
-        self.x = canvas.width / 2
-        self.y = canvas.height - 60
-        self.canvas = canvas
-        self.paddle_img = pygame.image.load("assets/Paddle.png")
-        level.paddle = self
-
-    def draw(self, surface):
-        if Game.state not in (Game.GAME, Game.PREGAME, Game.PAUSE):
-            return
-        # pygame.draw.rect(surface, pygame.Color(0, 255, 0), self.canvas.ball_box.inside_rect)
-        x = self.x - (self.paddle_img.get_width() / 2) + self.canvas.offset_x
-        y = self.y - (self.paddle_img.get_height() / 2) + self.canvas.offset_y
-        hit_circle = self.get_hit_circle()
-        # hit circle don't remove this code for debugging
-        # pygame.draw.circle(surface, pygame.Color(0, 0, 255), (hit_circle[0], hit_circle[1]), hit_circle[2])
-        surface.blit(self.paddle_img, (x, y))
-
-    def get_hit_circle(self):
-        cx = self.x + self.canvas.offset_x
-        cy = self.y - (self.paddle_img.get_height() / 2) + self.canvas.offset_y + 300
-        return cx, cy, 300, 10 + self.paddle_img.get_width() / 2
-
-    def changePosition(self, dx):
-        temp = self.x + dx
-        hw = (self.paddle_img.get_width() / 2)
-        if temp < hw:
-            temp = hw
-        elif temp > (canvas.width - hw):
-            temp = (canvas.width - hw)
-        self.x = temp
-        if self.level.resting_ball:
-            self.level.resting_ball.move(self.x + self.canvas.offset_x, self.y + self.canvas.offset_y - 25)
+            target.fill(self.color, (self.x, self.y, self.width, self.height))
 
     def update(self):
         pass
 
+    def dirty_rects(self):
+        return []
 
-def initialize(window_width, window_height, window_title):
+
+def initialize(window_width, window_height, window_title, textures=False):
     # Checks for errors encountered
     check_errors = pygame.init()
     # pygame.init() example output -> (6, 0)
@@ -624,45 +666,59 @@ def initialize(window_width, window_height, window_title):
         print('[+] Game successfully initialised')
 
     # Initialise game window
+    if textures:
+        # drawn by render.TextureRenderer, with no display surface
+        return render.video.Window(window_title, (window_width, window_height))
     pygame.display.set_caption(window_title)
     game_window = pygame.display.set_mode((window_width, window_height))
     return game_window
 
 
+# inputs collected from events since the last simulation tick
+pending_inputs = Input.NONE
+# the rewind key is held, update_world goes back instead of forward
+rewinding = False
+
+
 def process_keyboard_event(event):
-    # W -> Up; S -> Down; A -> Left; D -> Right
-    # if event.key == pygame.K_UP or event.key == ord('w'):
-    # change_to = 'UP'
-    # if event.key == pygame.K_DOWN or event.key == ord('s'):
-    # change_to = 'DOWN'
-    # if event.key == pygame.K_LEFT or event.key == ord('a'):
-    # playerPaddle.changePosition(-10)
-    # if event.key == pygame.K_RIGHT or event.key == ord('d'):
-    # playerPaddle.changePosition(10)
+    global pending_inputs
     # Esc -> Create event to quit the game
-    if Game.state == Game.EXIT_PROMPT:
-        if event.key == pygame.K_y:
-            pygame.event.post(pygame.event.Event(pygame.QUIT))
-        else:
-            Game.state = Game.GAME
-    elif Game.state == Game.LEVEL_CLEARED:
-        Game.state = Game.PREGAME
-    elif Game.state == Game.PREGAME:
-        if event.key == pygame.K_SPACE:
-            Game.state = Game.GAME
+    if game.state == Game.EXIT_PROMPT and event.key == pygame.K_y:
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+        return
+    if rewinder and event.key == pygame.K_BACKSPACE:
+        return
+    pending_inputs |= Input.KEY
+    if event.key == pygame.K_SPACE:
+        pending_inputs |= Input.LAUNCH
 
 
 def process_mouse_event(event):
-    for o in world.objects:
-        if isinstance(o, Ball):
-            if not o.motion_enabled:
-                o.x, o.y = pygame.mouse.get_pos()
-        if isinstance(o, Level):
-            o.score += 10
+    global pending_inputs
+    for ball in world.of_type(Ball):
+        if not ball.motion_enabled:
+            ball.x, ball.y = pygame.mouse.get_pos()
+    if world.of_type(Level) or world.of_type(SnapshotView):
+        pending_inputs |= Input.POINTER
+
+
+def shutdown():
+    # stops and saves everything setup() started, before the window closes
+    if sim_thread:
+        sim_thread.stop()
+    if spectators:
+        spectators.close()
+    if recorder:
+        recorder.save(options.record)
+    if frame_profiler:
+        frame_profiler.save(options.profile)
+    if level_pack:
+        level_pack.close()
 
 
 def process_event(event):
     if event.type == pygame.QUIT:
+        shutdown()
         pygame.quit()
         sys.exit()
     # Whenever a key is pressed down
@@ -673,63 +729,294 @@ def process_event(event):
 
 
 def process_keyboard_state():
-    if Game.state in (Game.GAME, Game.PREGAME):
-        pressed_keys = pygame.key.get_pressed()
-        if pressed_keys[pygame.K_LEFT] or pressed_keys[pygame.K_a]:
-            playerPaddle.changePosition(-10)
-        if pressed_keys[pygame.K_RIGHT] or pressed_keys[pygame.K_d]:
-            playerPaddle.changePosition(10)
+    global pending_inputs, rewinding
+    pressed_keys = pygame.key.get_pressed()
+    rewinding = rewinder is not None and pressed_keys[pygame.K_BACKSPACE]
+    if pressed_keys[pygame.K_LEFT] or pressed_keys[pygame.K_a]:
+        pending_inputs |= Input.LEFT
+    if pressed_keys[pygame.K_RIGHT] or pressed_keys[pygame.K_d]:
+        pending_inputs |= Input.RIGHT
+
+
+def send_inputs():
+    # the threaded counterpart of update_world, the simulation thread does the stepping
+    global pending_inputs
+    sim_thread.send(pending_inputs)
+    pending_inputs = Input.NONE
 
 
 def update_world():
-    world.update()
+    global pending_inputs
+    if rewinding:
+        # scrubbing back twice as fast as the game plays
+        rewinder.back(2)
+        if recorder:
+            recorder.truncate(breakout.ticks)
+    else:
+        if recorder:
+            recorder.record(pending_inputs)
+        breakout.step(pending_inputs)
+        if rewinder:
+            rewinder.record()
+    pending_inputs = Input.NONE
+    if spectators:
+        spectators.broadcast()
 
 
 def refresh_screen(game_window):
+    # returns the areas of the window that changed, None for all of it
+    if dirty_renderer:
+        return dirty_renderer.render(game_window)
+    if texture_renderer:
+        # presented as it is drawn
+        texture_renderer.render()
+        return []
     game_window.fill(black)
     world.draw(game_window)
+    return None
 
 
 def run(game_window):
+    # physics advances in fixed ticks of tick_time seconds however long frames
+    # take. rendering happens once per frame and interpolates ball and paddle
+    # positions by how far the frame is into the next tick.
     # FPS (frames per second) controller
     fps_controller = pygame.time.Clock()
+    tick_time = 1.0 / breakout.tick_rate
+    accumulator = 0.0
+    previous = time.perf_counter()
+    # each phase is timed when profiling, otherwise phase() does nothing
+    phase = frame_profiler.phase if frame_profiler else no_phase
+    if sim_thread:
+        sim_thread.start()
     while True:
-        for event in pygame.event.get():
-            process_event(event)
-        process_keyboard_state()
-        update_world()
-        refresh_screen(game_window)
+        now = frame_profiler.begin_frame() if frame_profiler else time.perf_counter()
+        # after a long stall drop the lost time rather than fast forwarding through it
+        accumulator += min(now - previous, 0.25)
+        previous = now
+        with phase('event pump'):
+            for event in pygame.event.get():
+                process_event(event)
+        if sim_thread:
+            # physics keeps its own time on the simulation thread
+            with phase('keyboard state'):
+                process_keyboard_state()
+            send_inputs()
+        else:
+            while accumulator >= tick_time:
+                with phase('keyboard state'):
+                    process_keyboard_state()
+                with phase('update_world'):
+                    update_world()
+                accumulator -= tick_time
+            breakout.alpha = accumulator / tick_time
+        with phase('refresh_screen'):
+            rects = refresh_screen(game_window)
         # Refresh game screen
-        pygame.display.update()
-        # Refresh rate
-        fps_controller.tick(30)
+        with phase('display.update'):
+            if rects is None:
+                pygame.display.update()
+            elif rects:
+                pygame.display.update(rects)
+        if startup.first_frame is None:
+            first_frame_presented()
+        # Refresh rate, 0 leaves it uncapped
+        with phase('tick'):
+            fps_controller.tick(options.max_fps)
+
+
+def no_phase(name):
+    return contextlib.nullcontext()
+
+
+class StartupTimer:
+    # records how long each stage of a cold start takes
+    def __init__(self, start):
+        self.start = start
+        self.last = start
+        self.stages = []
+        self.first_frame = None
+
+    def mark(self, name):
+        # ends the current stage
+        now = time.perf_counter()
+        self.stages.append((name, now - self.last))
+        self.last = now
+
+    def add(self, name, seconds):
+        # a stage that ran alongside the others, e.g. on another thread
+        self.stages.append((name, seconds))
+
+    def report(self):
+        lines = ['Startup times:']
+        for name, seconds in self.stages:
+            lines.append('  %-24s %8.1f ms' % (name, seconds * 1000))
+        lines.append('  %-24s %8.1f ms' % ('first frame after start', (self.first_frame - self.start) * 1000))
+        return '\n'.join(lines)
+
+
+# images only needed once the game is under way, read after the first frame is up
+deferred_assets = ["WinScreen", "gameover", "rewardB", "rewardL", "rewardS"]
+
+# the game objects, built by setup() rather than on import
+options = None
+world = None
+game = None
+assets = None
+canvas = None
+breakout = None
+level = None
+playerPaddle = None
+dirty_renderer = None
+texture_renderer = None
+level_pack = None
+sim_thread = None
+spectators = None
+rewinder = None
+recorder = None
+frame_profiler = None
+startup = None
+
+
+def parse_options(argv=None):
+    parser = argparse.ArgumentParser(description='Breakout')
+    parser.add_argument('--dirty-rects', action='store_true', help='only redraw the parts of the window that changed')
+    parser.add_argument('--renderer', choices=['surface', 'texture'], default='surface',
+                        help='draw by blitting surfaces, or with SDL textures on the GPU where there is one')
+    parser.add_argument('--tick-rate', type=int, default=120, help='physics ticks per second')
+    parser.add_argument('--max-fps', type=int, default=0, help='frame rate cap, 0 for none')
+    parser.add_argument('--levels', default='assets/levels.txt', help='level file to play')
+    parser.add_argument('--startup-report', action='store_true', help='print where start up time went')
+    parser.add_argument('--record', metavar='PATH', help='record the inputs of this game to PATH for replay.py')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='time each frame phase, graph frame times and save a Chrome trace to PATH on exit')
+    parser.add_argument('--threaded', action='store_true',
+                        help='run the game logic on its own thread, so slow frames never hold up physics')
+    parser.add_argument('--spectate', metavar='PORT', type=int, nargs='?', const=0,
+                        help="stream the game to spectate.py viewers on this local port, spectate.py's own by default")
+    parser.add_argument('--rewind', metavar='SECONDS', type=float, nargs='?', const=10,
+                        help='keep the last SECONDS of the game, 10 by default, to go back through holding backspace')
+    parser.add_argument('--endless', nargs='?', const='random', choices=['random', 'levels'],
+                        help='scrolling level that never ends, rows made up at random or read from --levels')
+    args = parser.parse_args(argv)
+    if args.endless and args.record:
+        parser.error('--record does not support --endless')
+    if args.renderer == 'texture' and args.dirty_rects:
+        parser.error('--dirty-rects only applies to the surface renderer')
+    if args.threaded and (args.endless or args.renderer == 'texture'):
+        parser.error('--threaded only supports regular levels and the surface renderer')
+    if args.spectate is not None and (args.threaded or args.endless):
+        parser.error('--spectate only supports regular levels without --threaded')
+    if args.rewind and (args.threaded or args.endless or args.spectate is not None):
+        parser.error('--rewind only supports regular levels without --threaded or --spectate')
+    return args
+
+
+def setup(game_options):
+    # opens the window and builds the game objects. returns the window surface.
+    global options, world, game, assets, canvas, breakout, level, playerPaddle, dirty_renderer, texture_renderer, \
+        level_pack, sim_thread, spectators, rewinder, recorder, frame_profiler, startup
+    options = game_options
+    startup = StartupTimer(start_time)
+    startup.mark('imports')
+
+    game = Game()
+    world = World(game)
+    side_panel_width = 250
+    radius = 10
+    pygame.font.init()
+
+    # the window is opened first so images can be converted to its pixel format as they load
+    assets = AssetManager()
+    window_width = side_panel_width + assets.image("breakoutbg").get_width() + assets.image("rightbg").get_width() * 2
+    window_height = assets.image("breakoutbg").get_height()
+    game_window = initialize(window_width, window_height, "breakout", options.renderer == 'texture')
+    assets.convert()
+    startup.mark('window')
+
+    canvas = Canvas(game, assets, side_panel_width, 0, radius)
+    sim_thread = None
+    # closed by shutdown()
+    level_pack = None if options.endless == 'random' else load_level_pack(options.levels)
+
+    # the modules behind options are only imported when the option is given
+    if options.threaded:
+        import simthread
+        breakout = simthread.SnapshotSimulation(canvas, level_pack, game, options.tick_rate,
+                                                assets.image("Paddle").get_size())
+        sim_thread = simthread.SimulationThread(breakout)
+        world.add(SnapshotView(sim_thread, breakout.tick_rate, canvas, assets))
+    elif options.endless:
+        import endless
+        chunks = endless.RandomChunks() if options.endless == 'random' else endless.LevelChunks(level_pack)
+        breakout = Breakout(world, canvas, game, assets, options.tick_rate, chunks, endless_level_class())
+    else:
+        breakout = Breakout(world, canvas, game, assets, options.tick_rate, level_pack)
+    level = breakout.level
+    playerPaddle = breakout.paddle
+    if not sim_thread:
+        for o in (canvas, level, playerPaddle):
+            world.add(o)
+    startup.mark('levels and game objects')
+
+    # only redraw and present the parts of the window that changed
+    dirty_renderer = render.DirtyRenderer(world, game, black) if options.dirty_rects else None
+    texture_renderer = render.TextureRenderer(game_window, world, black) if options.renderer == 'texture' else None
+    recorder = None
+    if options.record:
+        import replay
+        recorder = replay.Recorder(breakout)
+    rewinder = None
+    if options.rewind:
+        import rewind
+        rewinder = rewind.Rewind(breakout, options.rewind)
+    if sim_thread:
+        sim_thread.recorder = recorder
+    spectators = None
+    if options.spectate is not None:
+        import spectate
+        listener = spectate.SocketListener('127.0.0.1', options.spectate or spectate.default_port)
+        spectators = spectate.SpectatorServer(breakout, listener)
+
+    frame_profiler = None
+    if options.profile:
+        import profiler
+        frame_profiler = profiler.FrameProfiler()
+        world.profiler = frame_profiler
+        breakout.profiler = frame_profiler
+        if sim_thread:
+            sim_thread.profiler = frame_profiler
+        graph_font = pygame.font.SysFont('Comic Sans MS', 16)
+        world.add(profiler.FrameGraph(frame_profiler, graph_font, 5, window_height - 130, 100))
+
+    # for x in range(0, 300, 50):
+    #     for y in range(0, 200, 20):
+    #         block = Block(red, x, y, 48, 18, True)
+    #         world.add(block)
+
+    # for i in range(0, 1):
+    #     line = AnimatedLine()
+    #     world.add(line)
 
+    return game_window
 
-world = World()
-side_panel_width = 250
-radius = 10
-pygame.font.init()
 
-canvas = Canvas(side_panel_width, 0, radius)
-world.objects.append(canvas)
+def first_frame_presented():
+    startup.mark('first frame')
+    startup.first_frame = startup.last
 
-level = Level(world, canvas, radius)
-world.objects.append(level)
+    def loaded(seconds):
+        startup.add('deferred assets (thread)', seconds)
+        if options.startup_report:
+            print(startup.report())
 
-playerPaddle = Paddle(canvas, level)
-world.objects.append(playerPaddle)
+    assets.load_in_background(deferred_assets, loaded)
 
-# for x in range(0, 300, 50):
-#     for y in range(0, 200, 20):
-#         block = Block(red, x, y, 48, 18, True)
-#         world.objects.append(block)
 
-# for i in range(0, 1):
-#     line = AnimatedLine()
-#     world.objects.append(line)
+def main(argv=None):
+    game_window = setup(parse_options(argv))
+    run(game_window)
 
 
-window_width = side_panel_width + canvas.width + canvas.border_width * 2
-window_height = canvas.height + canvas.header_height
-game_window = initialize(window_width, window_height, "breakout")
-run(game_window)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# coding=utf-8
+"""
+Breakout Game
+Multiball: extra balls kept as NumPy arrays and moved in one batched pass per tick
+"""
+
+import math
+
+import numpy as np
+
+import pool
+
+
+class MultiBall(pool.MovingPool):
+    # pool of the balls released by caught 'B' drops, with their velocities
+    capacity = 512
+    fields = pool.MovingPool.fields + (('dx', float, ()), ('dy', float, ()))
+    spread = 0.35  # radians between the copies a split produces
+
+    def __init__(self, canvas, level, radius):
+        self.canvas = canvas
+        self.level = level
+        self.radius = radius
+        self.color = (255, 255, 255)
+        pool.MovingPool.__init__(self)
+        # bumped whenever the balls are cleared, so an update interrupted by a level change can stop
+        self.generation = 0
+        self.grid = None
+        self.live = None
+        self.left = None
+        self.top = None
+        self.right = None
+        self.bottom = None
+
+    def set_grid(self, grid):
+        # block rects laid out per grid cell, truncated to whole pixels like pygame.Rect
+        self.grid = grid
+        self.live = np.frombuffer(grid.live, dtype=np.uint8)
+        bx = np.tile(np.arange(grid.columns), grid.rows)
+        by = np.repeat(np.arange(grid.rows), grid.columns)
+        self.left = np.floor(bx * grid.cell_width + grid.x)
+        self.top = np.floor(by * grid.cell_height + grid.y)
+        self.right = self.left + int(grid.cell_width)
+        self.bottom = self.top + int(grid.cell_height)
+
+    def clear(self):
+        pool.MovingPool.clear(self)
+        self.generation += 1
+
+    def split(self, balls):
+        # every live ball, including the regular Ball objects passed in, releases
+        # two copies turned left and right of its own heading
+        x = np.concatenate((self.x[:self.count], [b.x for b in balls]))
+        y = np.concatenate((self.y[:self.count], [b.y for b in balls]))
+        dx = np.concatenate((self.dx[:self.count], [b.dx for b in balls]))
+        dy = np.concatenate((self.dy[:self.count], [b.dy for b in balls]))
+        for angle in (-self.spread, self.spread):
+            c = math.cos(angle)
+            s = math.sin(angle)
+            self.add(x, y, dx * c - dy * s, dx * s + dy * c)
+
+    def update(self):
+        n = self.count
+        if n == 0:
+            return
+        generation = self.generation
+        r = self.radius
+        x = self.x[:n]
+        y = self.y[:n]
+        dx = self.dx[:n]
+        dy = self.dy[:n]
+        nx = x + dx
+        ny = y + dy
+
+        # walls, same rules as BallBox.get_collision
+        inside = self.canvas.ball_box.inside_rect
+        hit_left = nx < inside.x
+        hit_right = nx >= inside.right
+        hit_top = ny < inside.y
+        lost = ny >= inside.bottom
+        hit_wall = hit_left | hit_right | hit_top | lost
+        dx[hit_left | hit_right] *= -1
+        dy[hit_top] *= -1
+        free = ~hit_wall
+
+        # blocks, testing the 2x2 grid cells around each ball in row-major order
+        grid = self.grid
+        hit_cell = np.full(n, -1)
+        bx1 = np.floor((nx - grid.margin - grid.x) / grid.cell_width).astype(int)
+        by1 = np.floor((ny - grid.margin - grid.y) / grid.cell_height).astype(int)
+        for oy in (0, 1):
+            for ox in (0, 1):
+                bx = bx1 + ox
+                by = by1 + oy
+                cell = by * grid.columns + bx
+                valid = free & (hit_cell < 0) & (bx >= 0) & (bx < grid.columns) & (by >= 0) & (by < grid.rows)
+                cell = np.where(valid, cell, 0)
+                valid &= self.live[cell] != 0
+                hit = valid & self.collide(cell, nx, ny, r)
+                hit_cell[hit] = cell[hit]
+        hit_block = hit_cell >= 0
+        if hit_block.any():
+            cell = hit_cell[hit_block]
+            px = np.minimum(nx[hit_block] - (self.left[cell] - r), (self.right[cell] + r) - nx[hit_block])
+            py = np.minimum(ny[hit_block] - (self.top[cell] - r), (self.bottom[cell] + r) - ny[hit_block])
+            # reflect on the axis with the shallower penetration
+            bdx = dx[hit_block]
+            bdy = dy[hit_block]
+            side = px < py
+            bdx[side] *= -1
+            bdy[~side] *= -1
+            dx[hit_block] = bdx
+            dy[hit_block] = bdy
+        free &= ~hit_block
+
+        # paddle, same test and bounce as Ball.find_impact and Ball.update
+        cx, cy, R, pw = self.level.paddle.get_hit_circle()
+        hit_paddle = free & (np.abs(nx - cx) <= pw) & (ny <= cy - R + 10)
+        hit_paddle &= (nx - cx) * (nx - cx) + (ny - cy) * (ny - cy) <= (R + r) * (R + r)
+        if hit_paddle.any():
+            vx = x[hit_paddle] - cx
+            vy = y[hit_paddle] - cy
+            scale = (R + r) / np.maximum(np.hypot(vx, vy), 1e-9)
+            contact_x = vx * scale
+            x[hit_paddle] = cx + contact_x
+            y[hit_paddle] = cy + vy * scale
+            dx[hit_paddle] += np.clip(contact_x, -pw, pw) * 0.1 * self.level.sim.speed_scale
+            dy[hit_paddle] *= -1
+        free &= ~hit_paddle
+
+        x[free] = nx[free]
+        y[free] = ny[free]
+
+        lost_count = int(lost.sum())
+        if lost_count:
+            self.keep(~lost)
+
+        for cell in np.unique(hit_cell[hit_block]):
+            if self.generation != generation:
+                return
+            index = grid.cells[cell]
+            if index >= 0:
+                self.level.hit_block(grid.blocks[index])
+
+        if lost_count and self.count == 0 and self.generation == generation:
+            self.level.multiball_lost()
+
+    def collide(self, cell, nx, ny, r):
+        # whether balls at nx, ny overlap the blocks in cell, corners rounded by the radius r
+        left = self.left[cell]
+        top = self.top[cell]
+        right = self.right[cell]
+        bottom = self.bottom[cell]
+        result = (nx >= left) & (nx < right) & (ny >= top - r) & (ny < bottom + r)
+        result |= (nx >= left - r) & (nx < right + r) & (ny >= top) & (ny < bottom)
+        rr = r * r
+        for corner_x, corner_y in ((left, top), (right, top), (left, bottom), (right, bottom)):
+            result |= (corner_x - nx) * (corner_x - nx) + (corner_y - ny) * (corner_y - ny) <= rr
+        return result
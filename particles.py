@@ -0,0 +1,135 @@
+# coding=utf-8
+"""
+Breakout Game
+Particles: debris and sparks thrown off by blocks as they are hit, kept as
+NumPy arrays in a pool of fixed size, moved and culled in one batched pass per
+tick and drawn straight into a surface's pixels
+"""
+
+import math
+
+import numpy as np
+import pygame
+
+import pool
+
+
+class ParticlePool(pool.Pool):
+    # particles are culled once they run out of life or leave bounds. a burst
+    # with the pool full is cut short.
+    capacity = 8192
+    fields = (('x', float, ()), ('y', float, ()), ('dx', float, ()), ('dy', float, ()), ('age', np.int32, ()),
+              ('life', np.int32, ()), ('size', np.int32, ()), ('color', np.uint8, (3,)))
+    max_size = 3  # pixels square
+    gravity = 0.2  # pixels per tick per tick at the base tick rate
+
+    def __init__(self, bounds, speed_scale=1.0, seed=None):
+        # bounds is the screen rect particles live in. purely visual, so they
+        # have their own random generator and never touch the simulation's.
+        self.bounds = pygame.Rect(bounds)
+        self.speed_scale = speed_scale
+        self.random = np.random.default_rng(seed)
+        pool.Pool.__init__(self)
+
+    def emit(self, x, y, n, color, speed, life, size, spread=0.0):
+        # n particles flying off from around x, y in every direction, up to
+        # speed pixels per tick and living life ticks, both at the base tick rate
+        live = self.reserve(n)
+        if live is None:
+            return
+        start = live.start
+        end = live.stop
+        n = end - start
+        rnd = self.random
+        angle = rnd.uniform(0, 2 * math.pi, n)
+        velocity = rnd.uniform(0.3, 1.0, n) * speed * self.speed_scale
+        self.x[start:end] = x + rnd.uniform(-spread, spread, n)
+        self.y[start:end] = y + rnd.uniform(-spread / 2, spread / 2, n)
+        self.dx[start:end] = np.cos(angle) * velocity
+        self.dy[start:end] = np.sin(angle) * velocity
+        self.age[start:end] = 0
+        self.life[start:end] = rnd.integers(max(int(life / 2 / self.speed_scale), 1),
+                                            max(int(life / self.speed_scale), 1) + 1, n)
+        self.size[start:end] = size
+        self.color[start:end] = color
+
+    def burst(self, rect, color, broke):
+        # sparks off a block hit, and debris as well when it broke
+        cx, cy = rect.center
+        spark = tuple(min(c + (255 - c) * 2 // 3, 255) for c in color)
+        self.emit(cx, cy, 12, spark, 6, 10, 2, rect.width / 4)
+        if broke:
+            self.emit(cx, cy, 32, color, 3, 30, 3, rect.width / 2)
+
+    def update(self):
+        n = self.count
+        if n == 0:
+            return
+        x = self.x[:n]
+        y = self.y[:n]
+        dy = self.dy[:n]
+        age = self.age[:n]
+        x += self.dx[:n]
+        dy += self.gravity * self.speed_scale * self.speed_scale
+        y += dy
+        age += 1
+        bounds = self.bounds
+        alive = age < self.life[:n]
+        alive &= x >= bounds.left
+        alive &= x < bounds.right - self.max_size
+        alive &= y >= bounds.top
+        alive &= y < bounds.bottom - self.max_size
+        self.keep(alive)
+
+    def get_rect(self):
+        # the screen area the particles cover, or None
+        n = self.count
+        if n == 0:
+            return None
+        x1 = int(self.x[:n].min())
+        y1 = int(self.y[:n].min())
+        return pygame.Rect(x1, y1, int(self.x[:n].max()) - x1 + self.max_size,
+                           int(self.y[:n].max()) - y1 + self.max_size)
+
+    def draw_pixels(self, surface, offset=(0, 0)):
+        # writes every particle into the pixels of the surface, fading out
+        # over its life, within the surface's clip. offset is added to screen
+        # positions, for surfaces that are not the screen. particles are
+        # opaque on surfaces with per pixel alpha.
+        n = self.count
+        if n == 0:
+            return
+        if surface.get_bytesize() != 4:
+            # pixels are written as 32 bit words, so other depths go through a 32 bit layer
+            rect = self.get_rect().move(offset).clip(surface.get_clip())
+            if rect.width and rect.height:
+                layer = pygame.Surface(rect.size, pygame.SRCALPHA)
+                self.draw_pixels(layer, (offset[0] - rect.x, offset[1] - rect.y))
+                surface.blit(layer, rect)
+            return
+        fade = 1.0 - self.age[:n] / self.life[:n]
+        rgb = (self.color[:n] * fade[:, None]).astype(np.uint32)
+        red, green, blue, _ = surface.get_shifts()
+        color = (rgb[:, 0] << red) | (rgb[:, 1] << green) | (rgb[:, 2] << blue) | surface.get_masks()[3]
+        left = self.x[:n].astype(np.intp) + offset[0]
+        top = self.y[:n].astype(np.intp) + offset[1]
+        sizes = self.size[:n]
+        clip = surface.get_clip()
+        clipped = not clip.contains(self.bounds.move(offset))
+        pitch = surface.get_pitch() // 4
+        pixels = np.frombuffer(surface.get_buffer(), np.uint32)
+        # every pixel of the squares of one size at once
+        for size in range(1, self.max_size + 1):
+            pick = np.flatnonzero(sizes == size)
+            if not len(pick):
+                continue
+            x = (left[pick, None] + np.tile(np.arange(size), size)).ravel()
+            y = (top[pick, None] + np.repeat(np.arange(size), size)).ravel()
+            values = np.repeat(color[pick], size * size)
+            if clipped:
+                keep = (x >= clip.left) & (x < clip.right) & (y >= clip.top) & (y < clip.bottom)
+                x = x[keep]
+                y = y[keep]
+                values = values[keep]
+            pixels[y * pitch + x] = values
+        del pixels
@@ -0,0 +1,74 @@
+# coding=utf-8
+"""
+Breakout Game
+Pool: the struct-of-arrays store the multiballs, drops and particles are kept
+in, one NumPy array per field of a fixed capacity
+"""
+
+import numpy as np
+
+
+class Pool:
+    # the first self.count entries of every array are live. entries are culled
+    # by moving the ones kept down over them, so the rest stay in the order
+    # they were added. fields lists the arrays as (name, dtype, shape of one
+    # entry), set up as attributes of that name.
+    capacity = 0
+    fields = ()
+
+    def __init__(self):
+        for name, dtype, shape in self.fields:
+            setattr(self, name, np.zeros((self.capacity,) + shape, dtype))
+        self.count = 0
+
+    def clear(self):
+        self.count = 0
+
+    def reserve(self, n):
+        # the slice of up to n new entries for the caller to fill in. with the
+        # pool full the rest are lost, and with no room at all it is None.
+        n = min(n, self.capacity - self.count)
+        if n <= 0:
+            return None
+        start = self.count
+        self.count = start + n
+        return slice(start, start + n)
+
+    def keep(self, alive):
+        # culls the live entries where alive, a bool array of self.count, is false
+        n = self.count
+        k = int(np.count_nonzero(alive))
+        if k == n:
+            return
+        for name, _, _ in self.fields:
+            array = getattr(self, name)
+            array[:k] = array[:n][alive]
+        self.count = k
+
+
+class MovingPool(Pool):
+    # a pool of things moving about the field, which keeps their positions at
+    # the start of the tick for render interpolation. fields start with x, y,
+    # prev_x and prev_y, the centre of each entry.
+    fields = (('x', float, ()), ('y', float, ()), ('prev_x', float, ()), ('prev_y', float, ()))
+
+    def add(self, x, y, *values):
+        # entries at x, y with values for the fields after prev_x and prev_y,
+        # arrays of the same length
+        live = self.reserve(len(x))
+        if live is None:
+            return
+        n = live.stop - live.start
+        for (name, _, _), value in zip(self.fields, (x, y, x, y) + values):
+            getattr(self, name)[live] = value[:n]
+
+    def save_positions(self):
+        if self.count == 0:
+            return
+        self.prev_x[:self.count] = self.x[:self.count]
+        self.prev_y[:self.count] = self.y[:self.count]
+
+    def get_positions(self, alpha):
+        n = self.count
+        return (self.prev_x[:n] + (self.x[:n] - self.prev_x[:n]) * alpha,
+                self.prev_y[:n] + (self.y[:n] - self.prev_y[:n]) * alpha)
@@ -0,0 +1,135 @@
+# coding=utf-8
+"""
+Breakout Game
+Frame profiler: times each phase of the main loop and each world object's
+update and draw, shows recent frame times as a graph in the side panel and
+saves everything as a Chrome trace for chrome://tracing or ui.perfetto.dev
+"""
+
+import json, os, threading, time
+from collections import deque
+from contextlib import contextmanager
+
+import pygame
+
+import render
+
+
+class FrameProfiler:
+    history = 240  # frame times kept for the graph
+    max_events = 500000  # spans kept for the trace, oldest dropped first
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = deque(maxlen=self.max_events)  # (name, category, start, duration, thread)
+        self.frame_times = deque(maxlen=self.history)
+        self.frame_start = None
+        self.frames = 0
+
+    def begin_frame(self):
+        # closes the previous frame and starts the next, returns the time now
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.frame_times.append(now - self.frame_start)
+            self.events.append(('frame', 'frame', self.frame_start, now - self.frame_start, threading.get_ident()))
+        self.frame_start = now
+        self.frames += 1
+        return now
+
+    def record(self, name, start, category='phase'):
+        # adds a span from start until now. returns now, so back to back phases can chain.
+        now = time.perf_counter()
+        self.events.append((name, category, start, now - start, threading.get_ident()))
+        return now
+
+    @contextmanager
+    def phase(self, name, category='phase'):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, category)
+
+    def frame_stats(self):
+        # mean and worst of the recent frame times in seconds
+        if not self.frame_times:
+            return 0.0, 0.0
+        return sum(self.frame_times) / len(self.frame_times), max(self.frame_times)
+
+    def trace(self):
+        # the recorded spans in the Chrome trace event format, timestamps in microseconds
+        pid = os.getpid()
+        threads = {}
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'breakout'}}]
+        for name, category, start, duration, thread in list(self.events):
+            tid = threads.setdefault(thread, len(threads) + 1)
+            events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': round((start - self.origin) * 1000000, 3), 'dur': round(duration * 1000000, 3)})
+        for thread, tid in threads.items():
+            name = 'main' if thread == threading.main_thread().ident else 'thread %d' % tid
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump(self.trace(), trace_file)
+
+
+class FrameGraph:
+    # rolling bar graph of frame times, one column per frame, drawn in the side panel.
+    # the guide lines mark 60 and 30 frames per second.
+    scale_time = 1.0 / 20  # frame time at the top of the graph
+    guides = (1.0 / 60, 1.0 / 30)
+    draw_layer = 9  # over everything else, in every state
+
+    def __init__(self, profiler, font, x, y, height):
+        self.profiler = profiler
+        self.text_height = font.get_linesize()
+        # the stats line sits above the graph, both inside rect
+        self.rect = pygame.Rect(x, y, profiler.history, self.text_height + height)
+        self.graph = pygame.Surface((profiler.history, height))
+        self.stats_text = render.HudText(font, (255, 255, 255), 'frame %.1f ms, worst %.1f')
+        self.drawn_frames = 0
+        self.shown_frames = 0
+
+    def update_graph(self):
+        # scrolls in a column for every frame that finished since the last draw
+        times = self.profiler.frame_times
+        new = min(self.profiler.frames - self.drawn_frames, len(times))
+        self.drawn_frames = self.profiler.frames
+        if new <= 0:
+            return
+        width, height = self.graph.get_size()
+        self.graph.scroll(-new, 0)
+        self.graph.fill((0, 0, 0), (width - new, 0, new, height))
+        for i in range(new):
+            frame_time = times[len(times) - new + i]
+            bar = min(int(frame_time / self.scale_time * height), height)
+            color = (0, 200, 0) if frame_time <= self.guides[0] else (230, 200, 0) if frame_time <= self.guides[1] \
+                else (230, 40, 40)
+            pygame.draw.line(self.graph, color, (width - new + i, height - 1), (width - new + i, height - bar))
+        for guide in self.guides:
+            y = height - 1 - int(guide / self.scale_time * height)
+            self.graph.fill((90, 90, 90), (0, y, width, 1))
+
+    def draw(self, surface):
+        if self.drawn_frames != self.profiler.frames:
+            self.update_graph()
+        mean, worst = self.profiler.frame_stats()
+        text = self.stats_text.get((round(mean * 1000, 1), round(worst * 1000, 1)))
+        surface.blit(text, self.rect)
+        surface.blit(self.graph, (self.rect.x, self.rect.y + self.text_height))
+
+    def draw_textures(self, target):
+        if self.drawn_frames != self.profiler.frames:
+            self.update_graph()
+        mean, worst = self.profiler.frame_stats()
+        text = self.stats_text.get((round(mean * 1000, 1), round(worst * 1000, 1)))
+        target.blit(text, self.rect)
+        target.blit(self.graph, (self.rect.x, self.rect.y + self.text_height), version=self.drawn_frames)
+
+    def dirty_rects(self):
+        if self.shown_frames == self.profiler.frames:
+            return []
+        self.shown_frames = self.profiler.frames
+        return [self.rect]
@@ -0,0 +1,231 @@
+# coding=utf-8
+"""
+Breakout Game
+Dirty rectangle rendering: redraw and present only the parts of the window that changed,
+and a texture renderer that draws with SDL's 2D renderer instead of blitting surfaces
+"""
+
+import weakref
+
+import pygame
+
+try:
+    from pygame._sdl2 import video
+except ImportError:
+    video = None
+
+
+def merge_rects(rects):
+    # unions overlapping rects so each area is redrawn once
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        if rect.width <= 0 or rect.height <= 0:
+            continue
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect.union_ip(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+class DirtyRenderer:
+    # every drawable in the world implements dirty_rects(), returning the
+    # screen areas it changed since the last frame, or None to ask for a full
+    # redraw. only those areas are cleared, redrawn and presented.
+    max_rects = 24  # past this many areas a full redraw is cheaper
+
+    def __init__(self, world, game, background=(0, 0, 0)):
+        self.world = world
+        self.game = game
+        self.background = background
+        self.state = None
+
+    def render(self, surface):
+        # draws the frame and returns the list of rects to pass to pygame.display.update
+        full = self.state != self.game.state
+        self.state = self.game.state
+        rects = []
+        for o in self.world.visible():
+            dirty = o.dirty_rects()
+            if dirty is None:
+                full = True
+            elif not full:
+                rects.extend(dirty)
+        if not full:
+            rects = merge_rects(rects)
+            full = len(rects) > self.max_rects
+        if full:
+            surface.set_clip(None)
+            surface.fill(self.background)
+            self.world.draw(surface)
+            return [surface.get_rect()]
+        for rect in rects:
+            surface.set_clip(rect)
+            surface.fill(self.background, rect)
+            self.world.draw(surface)
+        surface.set_clip(None)
+        return rects
+
+
+class TextureRenderer:
+    # draws the world with SDL's 2D renderer. every drawable in the world
+    # implements draw_textures(target), target being this renderer. images are
+    # uploaded as textures the first time they are drawn and stay there, so a
+    # frame is a list of texture copies rather than pixel copies on the CPU.
+    # uses a hardware renderer where there is one and SDL's software renderer
+    # otherwise.
+    def __init__(self, window, world, background=(0, 0, 0)):
+        if video is None:
+            raise RuntimeError('this pygame has no pygame._sdl2.video')
+        try:
+            self.renderer = video.Renderer(window, accelerated=1, target_texture=True)
+            self.accelerated = True
+        except video.error:
+            self.renderer = video.Renderer(window, accelerated=0, target_texture=True)
+            self.accelerated = False
+        self.world = world
+        self.background = background
+        self.width, self.height = window.size
+        # surface -> [texture, version], dropped along with the surface
+        self.textures = weakref.WeakKeyDictionary()
+        self.circles = {}
+
+    def texture(self, surface, version=None):
+        # the texture for a surface, uploaded again when version changes. surfaces
+        # that are drawn into after their first use need a version, e.g. DigitCounter's.
+        entry = self.textures.get(surface)
+        if entry is None:
+            entry = self.textures[surface] = [video.Texture.from_surface(self.renderer, surface), version]
+        elif entry[1] != version:
+            entry[0].update(surface)
+            entry[1] = version
+        return entry[0]
+
+    def upload(self, surface, rect):
+        # uploads just rect of surface to its texture, for surfaces that are
+        # drawn into a small part at a time
+        entry = self.textures.get(surface)
+        if entry is None:
+            self.texture(surface)
+        elif rect.width and rect.height:
+            entry[0].update(surface.subsurface(rect), rect)
+
+    def blit(self, surface, dest, area=None, version=None):
+        # like Surface.blit, dest a position or a rect
+        texture = self.texture(surface, version)
+        if area is None:
+            area = pygame.Rect(0, 0, texture.width, texture.height)
+        texture.draw(srcrect=area, dstrect=(int(dest[0]), int(dest[1]), area[2], area[3]))
+
+    def circle(self, color, center, radius):
+        # a filled circle like pygame.draw.circle, drawn once per color and radius and then copied
+        key = (tuple(color), radius)
+        texture = self.circles.get(key)
+        if texture is None:
+            surface = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+            pygame.draw.circle(surface, color, (radius, radius), radius)
+            texture = self.circles[key] = video.Texture.from_surface(self.renderer, surface)
+            texture.blend_mode = pygame.BLENDMODE_BLEND
+        texture.draw(dstrect=(int(center[0]) - radius, int(center[1]) - radius, radius * 2, radius * 2))
+
+    def fill(self, color, rect):
+        # draw_color needs all four channels
+        self.renderer.draw_color = pygame.Color(color)
+        self.renderer.fill_rect(rect)
+
+    def create_layer(self, size):
+        # a transparent texture to draw into once and copy every frame, like a surface layer
+        layer = video.Texture(self.renderer, size, target=True)
+        layer.blend_mode = pygame.BLENDMODE_BLEND
+        self.renderer.target = layer
+        self.renderer.draw_blend_mode = pygame.BLENDMODE_NONE
+        self.renderer.draw_color = (0, 0, 0, 0)
+        self.renderer.clear()
+        self.renderer.target = None
+        return layer
+
+    def draw_batches(self, layer, clear_rects, batches):
+        # clears clear_rects of the layer to transparent, then draws each
+        # (surface, rects) batch onto it, one texture at a time so the
+        # renderer can batch the copies of each image
+        renderer = self.renderer
+        renderer.target = layer
+        renderer.draw_blend_mode = pygame.BLENDMODE_NONE
+        renderer.draw_color = (0, 0, 0, 0)
+        for rect in clear_rects:
+            renderer.fill_rect(rect)
+        for surface, rects in batches:
+            texture = self.texture(surface)
+            for rect in rects:
+                texture.draw(dstrect=rect)
+        renderer.target = None
+
+    def draw(self):
+        # draws the frame without presenting it
+        renderer = self.renderer
+        renderer.draw_blend_mode = pygame.BLENDMODE_BLEND
+        renderer.draw_color = pygame.Color(self.background)
+        renderer.clear()
+        for o in self.world.visible():
+            o.draw_textures(self)
+
+    def render(self):
+        self.draw()
+        self.renderer.present()
+
+    def to_surface(self):
+        # the frame drawn since the last present, as a surface
+        return self.renderer.to_surface()
+
+
+class HudText:
+    # a line of HUD text that is only rasterized again when its value changes
+    def __init__(self, font, color, text_format='%s'):
+        self.font = font
+        self.color = color
+        self.text_format = text_format
+        self.value = None
+        self.surface = None
+
+    def get(self, value):
+        if self.surface is None or value != self.value:
+            self.value = value
+            self.surface = self.font.render(self.text_format % value, False, self.color)
+        return self.surface
+
+
+class DigitCounter:
+    # a label followed by a zero padded number, composed from a strip of
+    # digits rendered once, so changing the number never calls the font rasterizer.
+    # a number with more digits than that widens the counter from then on.
+    def __init__(self, font, color, label, digits):
+        self.label = font.render(label, False, color)
+        self.glyphs = [font.render(str(d), False, color) for d in range(10)]
+        self.digit_width = max(glyph.get_width() for glyph in self.glyphs)
+        self.height = max([self.label.get_height()] + [glyph.get_height() for glyph in self.glyphs])
+        self.resize(digits)
+
+    def resize(self, digits):
+        self.digits = digits
+        self.surface = pygame.Surface((self.label.get_width() + self.digit_width * digits, self.height),
+                                      pygame.SRCALPHA)
+        self.value = None
+
+    def get(self, value):
+        if value != self.value:
+            text = '%0*d' % (self.digits, value)
+            if len(text) > self.digits:
+                # a new surface, so renderers caching its texture upload it afresh
+                self.resize(len(text))
+            self.value = value
+            self.surface.fill((0, 0, 0, 0))
+            self.surface.blit(self.label, (0, 0))
+            x = self.label.get_width()
+            for digit in text:
+                glyph = self.glyphs[ord(digit) - 48]
+                # digits are centred in equal cells so the counter doesn't jitter as it changes
+                self.surface.blit(glyph, (x + (self.digit_width - glyph.get_width()) // 2, 0))
+                x += self.digit_width
+        return self.surface
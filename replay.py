@@ -0,0 +1,166 @@
+# coding=utf-8
+"""
+Breakout Game
+Input recordings: the RNG seed and every tick's inputs in a compact binary
+stream, replayed against the headless simulation as fast as it will go and
+checked against the score and block state the recording ended with.
+
+usage: python replay.py recording.bin [--levels assets/levels.txt]
+"""
+
+import argparse, struct, sys, time
+
+import engine
+from levelpack import load_level_pack
+
+# magic, version, seed, tick rate, field x, field width, field height, border width,
+# radius, paddle width, paddle height
+header = struct.Struct('<4sBIHHHHHHHH')
+# ticks, game state, level, score, lives, number of blocks
+final = struct.Struct('<IBHiiI')
+
+magic = b'BRKR'
+version = 2
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def final_state(sim):
+    # what a replay has to reproduce: ticks, state, level, score, lives and the hits left on every block
+    level = sim.level
+    hits = level.blocks.hits.tobytes()
+    return sim.ticks, sim.game.state, level.current_level, level.score, level.lives, hits
+
+
+class Recorder:
+    # collects the inputs passed to a simulation's step, run length encoded
+    def __init__(self, sim):
+        self.sim = sim
+        self.runs = []
+
+    def record(self, inputs):
+        # call once per tick, before stepping the simulation
+        if self.runs and self.runs[-1][0] == inputs:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([inputs, 1])
+
+    def truncate(self, ticks):
+        # forgets the inputs after the first ticks ticks, e.g. after rewinding to there
+        total = 0
+        for index, run in enumerate(self.runs):
+            if total + run[1] >= ticks:
+                run[1] = ticks - total
+                del self.runs[index + 1:]
+                if not run[1]:
+                    del self.runs[index]
+                return
+            total += run[1]
+
+    def encode(self):
+        sim = self.sim
+        canvas = sim.canvas
+        paddle = sim.paddle
+        out = bytearray(header.pack(magic, version, sim.seed, sim.tick_rate, canvas.offset_x - canvas.border_width,
+                                    canvas.width, canvas.height, canvas.border_width, canvas.radius,
+                                    int(paddle.width), int(paddle.height)))
+        ticks, state, level, score, lives, hits = final_state(sim)
+        out += final.pack(ticks, state, level, score, lives, len(hits))
+        out += hits
+        write_varint(out, len(self.runs))
+        for inputs, count in self.runs:
+            out.append(inputs)
+            write_varint(out, count)
+        return bytes(out)
+
+    def save(self, path):
+        with open(path, 'wb') as recording:
+            recording.write(self.encode())
+
+
+class Replay:
+    def __init__(self, data):
+        fields = header.unpack_from(data, 0)
+        if fields[0] != magic or fields[1] != version:
+            raise ValueError('not a version %d breakout recording' % version)
+        (self.seed, self.tick_rate, self.field_x, self.width, self.height, self.border_width, self.radius,
+         self.paddle_width, self.paddle_height) = fields[2:]
+        offset = header.size
+        ticks, state, level, score, lives, block_count = final.unpack_from(data, offset)
+        offset += final.size
+        hits = bytes(data[offset:offset + block_count])
+        offset += block_count
+        self.final_state = (ticks, state, level, score, lives, hits)
+        run_count, offset = read_varint(data, offset)
+        self.runs = []
+        for _ in range(run_count):
+            inputs = data[offset]
+            count, offset = read_varint(data, offset + 1)
+            self.runs.append((inputs, count))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as recording:
+            return cls(recording.read())
+
+    def create_simulation(self, game_levels=None):
+        canvas = engine.Field(self.field_x, 0, self.width, self.height, self.border_width, self.radius)
+        sim = engine.Simulation(canvas, game_levels, seed=self.seed, tick_rate=self.tick_rate, event_driven=True)
+        sim.paddle.width = self.paddle_width
+        sim.paddle.height = self.paddle_height
+        return sim
+
+    def play(self, game_levels=None):
+        # runs the recorded inputs with no frame cap or rendering. returns the simulation,
+        # which the caller closes if it opened the default level pack.
+        sim = self.create_simulation(game_levels)
+        for inputs, count in self.runs:
+            sim.advance(count, inputs)
+        return sim
+
+    def verify(self, game_levels=None):
+        # replays and returns the names of the final state fields that came out different
+        with self.play(game_levels) as sim:
+            result = final_state(sim)
+        names = ('ticks', 'state', 'level', 'score', 'lives', 'blocks')
+        return [name for name, expected, actual in zip(names, self.final_state, result) if expected != actual]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a game recorded with main.py --record')
+    parser.add_argument('recording')
+    parser.add_argument('--levels', default='assets/levels.txt', help='the level file the game was played with')
+    args = parser.parse_args(argv)
+    replay = Replay.load(args.recording)
+    start = time.perf_counter()
+    with load_level_pack(args.levels) as game_levels:
+        mismatches = replay.verify(game_levels)
+    elapsed = time.perf_counter() - start
+    ticks, state, level, score, lives, hits = replay.final_state
+    print('replayed %d ticks in %.1f ms' % (ticks, elapsed * 1000))
+    if mismatches:
+        print('MISMATCH: ' + ', '.join(mismatches))
+        return 1
+    print('OK: score %d, lives %d, level %d' % (score, lives, level + 1))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
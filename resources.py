@@ -0,0 +1,82 @@
+# coding=utf-8
+"""
+Breakout Game
+Asset manager: each image is loaded from disk once, converted to the display's
+pixel format, and scaled variants are kept in a small LRU cache
+"""
+
+import threading, time
+from collections import OrderedDict
+
+import pygame
+
+
+class AssetManager:
+    max_scaled = 64  # scaled variants kept before the least recently used is dropped
+
+    def __init__(self, path='assets'):
+        self.path = path
+        self.sources = {}  # images as loaded from disk, kept for scaling
+        self.images = {}  # the same images converted to the display format
+        self.scaled_images = OrderedDict()
+
+    def load(self, name):
+        source = self.sources.get(name)
+        if source is None:
+            source = pygame.image.load(self.path + "/" + name + ".png")
+            self.sources[name] = source
+        return source
+
+    def image(self, name):
+        image = self.images.get(name)
+        if image is None:
+            image = self.convert_image(self.load(name))
+            if image is None:
+                # no window yet, hand out the unconverted image and convert it later
+                return self.sources[name]
+            self.images[name] = image
+        return image
+
+    def scaled(self, name, width, height):
+        key = (name, int(width), int(height))
+        image = self.scaled_images.get(key)
+        if image is not None:
+            self.scaled_images.move_to_end(key)
+            return image
+        # smoothscale needs 24 or 32 bit input, so scale the image as loaded and convert the result
+        image = pygame.transform.smoothscale(self.load(name), key[1:])
+        image = self.convert_image(image) or image
+        self.scaled_images[key] = image
+        if len(self.scaled_images) > self.max_scaled:
+            self.scaled_images.popitem(last=False)
+        return image
+
+    def load_in_background(self, names, done=None):
+        # reads images from disk on a worker thread. conversion still happens on
+        # the main thread the first time image() is called for each of them.
+        # done, if given, is called on the worker with the seconds it took.
+        def load_all():
+            start = time.perf_counter()
+            for name in names:
+                self.load(name)
+            if done:
+                done(time.perf_counter() - start)
+
+        thread = threading.Thread(target=load_all, name='asset loader', daemon=True)
+        thread.start()
+        return thread
+
+    def convert(self):
+        # converts everything loaded before the window was opened
+        for name in list(self.sources):
+            self.images.pop(name, None)
+            self.image(name)
+        for key, image in self.scaled_images.items():
+            self.scaled_images[key] = self.convert_image(image) or image
+
+    def convert_image(self, image):
+        if pygame.display.get_surface() is None:
+            return None
+        if image.get_flags() & pygame.SRCALPHA:
+            return image.convert_alpha()
+        return image.convert()
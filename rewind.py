@@ -0,0 +1,238 @@
+# coding=utf-8
+"""
+Breakout Game
+Rewind: the last few seconds of a game kept in a ring buffer of fixed size,
+so play can be scrubbed back and carried on from any earlier tick. Each tick
+stores one fixed size row of the scalars, paddle and balls, and journals the
+blocks hit and the multiball and drop positions into fixed size pools. The block table
+itself is never copied, rewinding just puts the journaled hits back.
+"""
+
+import struct
+from array import array
+
+import numpy as np
+
+# ticks, game state, level, score, lives, paddle x, active balls, index of the
+# resting ball or -1, number of balls, number of blocks hit, number of multiballs, number of drops
+row_header = struct.Struct('<IBHiidhbBIHB')
+# x, y, dx, dy, speed, heading, visible, motion enabled, colliding with a block
+ball_entry = struct.Struct('<ddddddBBB')
+# regular balls kept per tick. the game only ever has one in play, the second is spare.
+ball_slots = 2
+row = struct.Struct(row_header.format + ball_entry.format[1:] * ball_slots)
+no_ball = (0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, 0, 0)
+
+
+def ring_write(pool, start, values):
+    # writes values into pool from the absolute position start, wrapping round the end
+    n = len(values)
+    if not n:
+        return
+    capacity = len(pool)
+    offset = start % capacity
+    first = min(n, capacity - offset)
+    pool[offset:offset + first] = values[:first]
+    if first < n:
+        pool[:n - first] = values[first:]
+
+
+def ring_read(pool, start, stop):
+    # the values between absolute positions start and stop
+    capacity = len(pool)
+    return pool[np.arange(start, stop) % capacity]
+
+
+class Rewind:
+    # records sim after every step. record() once after each sim.step(), and
+    # restore(ticks) or back(ticks) to go back. history is up to seconds long,
+    # less while the pools are full, e.g. with hundreds of multiballs in play.
+    # the pools are sized in entries, a block hit, a multiball or a drop for one tick.
+    def __init__(self, sim, seconds=10, hit_pool=1 << 16, multiball_pool=1 << 16, drop_pool=1 << 14):
+        self.sim = sim
+        self.capacity = int(seconds * sim.tick_rate) + 1
+        self.rows = bytearray(row.size * self.capacity)
+        # absolute pool positions each row's hits, multiballs and drops start at
+        self.hit_start = array('Q', bytes(8 * self.capacity))
+        self.multiball_start = array('Q', bytes(8 * self.capacity))
+        self.drop_start = array('Q', bytes(8 * self.capacity))
+        self.hit_index = np.zeros(hit_pool, np.int32)
+        self.hit_level = np.zeros(hit_pool, np.uint16)
+        # x, y, dx and dy of the multiballs
+        self.multiball = np.zeros((4, multiball_pool))
+        # x, y and kind of the drops
+        self.drops = np.zeros((3, drop_pool))
+        self.hits_used = 0
+        self.multiball_used = 0
+        self.drops_used = 0
+        # rows are numbered from when recording began, row n in slot n % capacity
+        self.oldest = 0
+        self.newest = -1
+        self.hit_log = []
+        sim.level.hit_log = self.hit_log
+        # the block table of each level played, by level number. a level pack
+        # decodes a fresh table every time a level starts, so rewinding into an
+        # earlier level copies the hits from here.
+        self.tables = {}
+        self.record()
+
+    def __len__(self):
+        return self.newest - self.oldest + 1
+
+    def tick(self, number):
+        return row_header.unpack_from(self.rows, (number % self.capacity) * row.size)[0]
+
+    def record(self):
+        # adds the state after the tick just stepped
+        sim = self.sim
+        level = sim.level
+        if sim.event_driven:
+            level.sync_balls()
+        number = self.newest + 1
+        slot = number % self.capacity
+        if self.tables.get(level.current_level) is not level.blocks:
+            # a new level, keep only the tables of the levels still in the history
+            first = row_header.unpack_from(self.rows, (self.oldest % self.capacity) * row.size)[2] \
+                if self.newest >= 0 else level.current_level
+            self.tables = dict((level_number, blocks) for level_number, blocks in self.tables.items()
+                               if first <= level_number < level.current_level)
+            self.tables[level.current_level] = level.blocks
+
+        hit_log = self.hit_log
+        hit_count = len(hit_log)
+        self.hit_start[slot] = self.hits_used
+        if hit_count:
+            # every hit in a tick is on the level it started on
+            ring_write(self.hit_index, self.hits_used, np.array(hit_log, np.int32))
+            ring_write(self.hit_level, self.hits_used, np.full(hit_count, self.level_at_start(), np.uint16))
+            self.hits_used += hit_count
+            del hit_log[:]
+
+        multiball = level.multiball
+        n = multiball.count
+        self.multiball_start[slot] = self.multiball_used
+        if n:
+            for pool, values in zip(self.multiball, (multiball.x, multiball.y, multiball.dx, multiball.dy)):
+                ring_write(pool, self.multiball_used, values[:n])
+            self.multiball_used += n
+
+        drops = level.drops
+        drop_count = drops.count
+        self.drop_start[slot] = self.drops_used
+        if drop_count:
+            for pool, values in zip(self.drops, (drops.x, drops.y, drops.kind)):
+                ring_write(pool, self.drops_used, values[:drop_count])
+            self.drops_used += drop_count
+
+        balls = level.balls
+        resting = balls.index(level.resting_ball) if level.resting_ball in balls else -1
+        fields = [sim.ticks, sim.game.state, level.current_level, level.score, level.lives, sim.paddle.x,
+                  level.active_balls, resting, min(len(balls), ball_slots), hit_count, n, drop_count]
+        for index in range(ball_slots):
+            if index < len(balls):
+                ball = balls[index]
+                fields += (ball.x, ball.y, ball.dx, ball.dy, ball.speed, ball.heading, ball.visible,
+                           ball.motion_enabled, ball.colliding_with_block)
+            else:
+                fields += no_ball
+        row.pack_into(self.rows, slot * row.size, *fields)
+        self.newest = number
+
+        # drop the rows whose journal entries have been written over
+        if self.newest - self.oldest >= self.capacity:
+            self.oldest += 1
+        while self.oldest < self.newest and (
+                self.hit_start[self.oldest % self.capacity] < self.hits_used - len(self.hit_index) or
+                self.multiball_start[self.oldest % self.capacity] < self.multiball_used - self.multiball.shape[1] or
+                self.drop_start[self.oldest % self.capacity] < self.drops_used - self.drops.shape[1]):
+            self.oldest += 1
+
+    def level_at_start(self):
+        # the level the tick being recorded started on, from the row before it
+        if self.newest < 0:
+            return self.sim.level.current_level
+        return row_header.unpack_from(self.rows, (self.newest % self.capacity) * row.size)[2]
+
+    def back(self, ticks):
+        # goes back ticks ticks, or as far as there is history for. returns the ticks gone back.
+        number = max(self.newest - ticks, self.oldest)
+        gone = self.newest - number
+        if gone:
+            self.restore_row(number)
+        return gone
+
+    def restore(self, ticks):
+        # goes back to the state after tick ticks, which must be in the history
+        for number in range(self.newest, self.oldest - 1, -1):
+            if self.tick(number) == ticks:
+                self.restore_row(number)
+                return
+        raise ValueError('tick %d is not in the rewind history' % ticks)
+
+    def restore_row(self, number):
+        # rewinds to row number and forgets the rows after it, so play goes on from there
+        sim = self.sim
+        level = sim.level
+        slot = number % self.capacity
+        (ticks, state, current_level, score, lives, paddle_x, active_balls, resting, ball_count, _,
+         multiball_count, drop_count) = row_header.unpack_from(self.rows, slot * row.size)
+
+        # put back every hit since, on whichever level it was
+        start = self.hit_start[(number + 1) % self.capacity] if number < self.newest else self.hits_used
+        indices = ring_read(self.hit_index, start, self.hits_used)
+        levels = ring_read(self.hit_level, start, self.hits_used)
+        self.hits_used = start
+        del self.hit_log[:]
+        restored = []
+        for level_number in np.unique(levels).tolist():
+            index = indices[levels == level_number]
+            np.add.at(self.tables[level_number].column('hits'), index, 1)
+            if level_number == current_level:
+                restored = np.unique(index).tolist()
+
+        if level.current_level != current_level:
+            level.new_level(current_level)
+            level.blocks.column('hits')[:] = self.tables[current_level].column('hits')
+            self.tables[current_level] = level.blocks
+            level.restore_blocks(range(len(level.blocks)))
+        elif restored:
+            level.restore_blocks(restored)
+
+        # the balls and multiballs as they were
+        for ball in list(level.balls):
+            level.remove_ball(ball)
+        level.impacts = []
+        level.resting_ball = None
+        for index in range(ball_count):
+            x, y, dx, dy, speed, heading, visible, motion_enabled, colliding = \
+                ball_entry.unpack_from(self.rows, slot * row.size + row_header.size + index * ball_entry.size)
+            ball = level.create_ball(x, y, 0, heading, bool(visible))
+            ball.speed = speed
+            ball.dx = dx
+            ball.dy = dy
+            ball.motion_enabled = bool(motion_enabled)
+            ball.colliding_with_block = bool(colliding)
+            if index == resting:
+                level.resting_ball = ball
+            if speed and sim.event_driven:
+                level.invalidate(ball)
+        level.active_balls = active_balls
+        multiball = level.multiball
+        multiball.clear()
+        start = self.multiball_start[slot]
+        self.multiball_used = start + multiball_count
+        if multiball_count:
+            multiball.add(*(ring_read(pool, start, self.multiball_used) for pool in self.multiball))
+        drops = level.drops
+        drops.clear()
+        start = self.drop_start[slot]
+        self.drops_used = start + drop_count
+        if drop_count:
+            drops.add(*(ring_read(pool, start, self.drops_used) for pool in self.drops))
+
+        sim.paddle.x = sim.paddle.prev_x = paddle_x
+        level.score = score
+        level.lives = lives
+        sim.game.state = state
+        sim.ticks = ticks
+        self.newest = number
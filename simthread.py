@@ -0,0 +1,173 @@
+# coding=utf-8
+"""
+Breakout Game
+Simulation thread: game logic stepping at a fixed tick rate on its own thread,
+publishing an immutable snapshot of everything the screen shows after every
+tick. The render loop reads whichever snapshot is newest, so a slow frame
+never holds up physics and neither side waits on a lock.
+"""
+
+import threading, time
+from collections import deque
+
+import engine
+from engine import Input
+
+
+class BlockLayout:
+    # where a level's blocks are on the screen and what they are made of, as
+    # read-only copies of the block table's columns. made once per level.
+    def __init__(self, level):
+        blocks = level.blocks
+        self.name = level.name
+        self.block_width = level.block_width
+        self.block_height = level.block_height
+        for name in ('left', 'top', 'right', 'bottom', 'material'):
+            column = blocks.column(name).copy()
+            column.flags.writeable = False
+            setattr(self, name, column)
+
+    def __len__(self):
+        return len(self.left)
+
+
+class Snapshot:
+    # the state of one tick. balls are (prev_x, prev_y, x, y, visible, colliding)
+    # tuples, multiball the previous and current positions as read-only arrays,
+    # so positions can be interpolated across the tick, and drops the same
+    # followed by the drops' kinds. hits is the hits column as bytes, shared
+    # with the previous snapshot when no block was hit.
+    __slots__ = ('tick', 'time', 'state', 'score', 'lives', 'layout', 'hits', 'balls', 'multiball', 'drops',
+                 'paddle')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError('snapshots are read-only')
+
+    def positions(self, alpha):
+        # balls and multiball positions alpha of the way through the tick
+        balls = [(x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha, visible, colliding)
+                 for x0, y0, x1, y1, visible, colliding in self.balls]
+        x0, y0, x1, y1 = self.multiball
+        return balls, x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha
+
+    def drop_positions(self, alpha):
+        # drop positions alpha of the way through the tick, and their kinds
+        x0, y0, x1, y1, kind = self.drops
+        return x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha, kind
+
+
+class SnapshotLevel(engine.Level):
+    # counts changes to the blocks so snapshots only copy them when they change
+    def __init__(self, sim, canvas, radius, game_levels):
+        self.hits_version = 0
+        self.layout_version = 0
+        engine.Level.__init__(self, sim, canvas, radius, game_levels)
+
+    def new_level(self, level):
+        engine.Level.new_level(self, level)
+        self.layout_version += 1
+
+    def hit_block(self, block):
+        self.hits_version += 1
+        return engine.Level.hit_block(self, block)
+
+
+class SnapshotSimulation(engine.Simulation):
+    def __init__(self, canvas, game_levels, game, tick_rate, paddle_size):
+        self.paddle_size = paddle_size
+        engine.Simulation.__init__(self, canvas, game_levels, game, tick_rate=tick_rate)
+
+    def create_level(self, game_levels):
+        return SnapshotLevel(self, self.canvas, self.radius, game_levels)
+
+    def create_paddle(self):
+        return engine.Paddle(self.canvas, self.level, *self.paddle_size)
+
+
+class SimulationThread(threading.Thread):
+    # steps sim every 1 / tick_rate seconds and publishes a Snapshot after
+    # each tick in self.snapshot. the render loop sends inputs with send().
+    # held inputs are sampled by every tick until the next send, presses are
+    # queued so none are lost however many ticks run between frames.
+    held_inputs = Input.LEFT | Input.RIGHT
+
+    def __init__(self, sim, recorder=None, profiler=None):
+        threading.Thread.__init__(self, name='simulation', daemon=True)
+        self.sim = sim
+        self.recorder = recorder
+        self.profiler = profiler
+        self.held = Input.NONE
+        self.presses = deque()
+        self.running = True
+        self.layout = None
+        self.layout_version = None
+        self.hits = None
+        self.hits_version = None
+        self.snapshot = None
+        self.publish()
+
+    def send(self, inputs):
+        # called by the render loop with the inputs collected for a frame
+        self.held = inputs & self.held_inputs
+        presses = inputs & ~self.held_inputs
+        if presses:
+            self.presses.append(presses)
+
+    def stop(self):
+        self.running = False
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        tick_time = 1.0 / self.sim.tick_rate
+        next_tick = time.perf_counter()
+        while self.running:
+            now = time.perf_counter()
+            if now < next_tick:
+                time.sleep(next_tick - now)
+                continue
+            # after a long stall drop the lost time rather than fast forwarding through it
+            if now - next_tick > 0.25:
+                next_tick = now
+            inputs = self.held
+            while self.presses:
+                inputs |= self.presses.popleft()
+            if self.recorder:
+                self.recorder.record(inputs)
+            self.sim.step(inputs)
+            self.publish()
+            if self.profiler:
+                self.profiler.record('tick', now, 'simulation')
+            next_tick += tick_time
+
+    def publish(self):
+        sim = self.sim
+        level = sim.level
+        if level.layout_version != self.layout_version:
+            self.layout_version = level.layout_version
+            self.layout = BlockLayout(level)
+            self.hits_version = None
+        if level.hits_version != self.hits_version:
+            self.hits_version = level.hits_version
+            self.hits = level.blocks.hits.tobytes()
+        multiball = level.multiball
+        n = multiball.count
+        multiball_positions = tuple(array[:n].copy() for array in (multiball.prev_x, multiball.prev_y,
+                                                                    multiball.x, multiball.y))
+        drops = level.drops
+        n = drops.count
+        drop_positions = tuple(array[:n].copy() for array in (drops.prev_x, drops.prev_y, drops.x, drops.y, drops.kind))
+        for array in multiball_positions + drop_positions:
+            array.flags.writeable = False
+        balls = tuple((ball.prev_x, ball.prev_y, ball.x, ball.y, ball.visible, ball.colliding_with_block)
+                      for ball in level.balls)
+        paddle = sim.paddle
+        # one reference assignment, so the render loop sees the old snapshot or the new one, never half of each
+        self.snapshot = Snapshot(tick=sim.ticks, time=time.perf_counter(), state=sim.game.state, score=level.score,
+                                 lives=level.lives, layout=self.layout, hits=self.hits, balls=balls,
+                                 multiball=multiball_positions, drops=drop_positions,
+                                 paddle=(paddle.prev_x, paddle.x, paddle.y))
@@ -0,0 +1,531 @@
+# coding=utf-8
+"""
+Breakout Game
+Spectator stream: a running game sends its state to any number of viewers
+over a local socket. A viewer gets a keyframe with everything on screen,
+then one small delta per message holding only what changed: positions that
+moved, the score, lives or game state if they changed, and the blocks hit
+since the last message. Each message is encoded once however many viewers
+there are. A viewer that falls behind is skipped forward to a fresh keyframe.
+
+usage: python spectate.py [--host 127.0.0.1] [--port 5123] [--levels assets/levels.txt]
+"""
+
+import argparse, socket, struct, sys, time, zlib
+from collections import deque
+
+import numpy as np
+
+import engine
+from levelpack import load_level_pack
+from replay import read_varint, write_varint
+from simthread import BlockLayout, Snapshot
+
+KEYFRAME = ord('K')
+DELTA = ord('D')
+version = 3
+default_port = 5123
+
+# version, tick rate, ticks per message, field x, field width, field height, border width,
+# radius, tick, game state, level, score, lives, paddle x
+keyframe_header = struct.Struct('<BHHHHHHHIBHiHh')
+# x, y and flags (1 visible, 2 colliding) of a regular ball
+ball_entry = struct.Struct('<hhB')
+count_entry = struct.Struct('<H')
+# positions are sent as whole numbers of 1/position_scale pixels
+position_scale = 8
+
+# which fields a delta holds
+STATE = 1
+SCORE = 2
+LIVES = 4
+PADDLE = 8
+BALLS = 16
+MULTIBALL = 32
+BLOCKS = 64
+DROPS = 128
+
+
+def quantize(value):
+    return max(-32768, min(32767, int(round(value * position_scale))))
+
+
+def capture(sim):
+    # what viewers see of the game right now, in the form it is sent in
+    level = sim.level
+    balls = bytearray([len(sim.balls)])
+    for ball in sim.balls:
+        balls += ball_entry.pack(quantize(ball.x), quantize(ball.y),
+                                 ball.visible | (2 if ball.colliding_with_block else 0))
+    multiball = level.multiball
+    n = multiball.count
+    positions = np.concatenate((multiball.x[:n], multiball.y[:n])) * position_scale
+    multiball_bytes = count_entry.pack(n) + np.clip(np.round(positions), -32768, 32767).astype('<i2').tobytes()
+    drops = level.drops
+    n = drops.count
+    positions = np.concatenate((drops.x[:n], drops.y[:n])) * position_scale
+    drop_bytes = (count_entry.pack(n) + np.clip(np.round(positions), -32768, 32767).astype('<i2').tobytes() +
+                  drops.kind[:n].tobytes())
+    # lives go out in 16 bits. caught L drops add lives without limit, so any more show as the most there is room for
+    lives = min(level.lives, 0xffff)
+    return (sim.ticks, sim.game.state, level.current_level, level.score, lives, quantize(sim.paddle.x),
+            bytes(balls), multiball_bytes, level.blocks.hits.tobytes(), drop_bytes)
+
+
+def frame(payload):
+    # a message on the wire: its length as a varint, then the payload
+    out = bytearray()
+    write_varint(out, len(payload))
+    out += payload
+    return bytes(out)
+
+
+def encode_keyframe(sim, ticks_per_message, state):
+    ticks, game_state, level, score, lives, paddle_x, balls, multiball, hits, drops = state
+    canvas = sim.canvas
+    out = bytearray([KEYFRAME])
+    out += keyframe_header.pack(version, sim.tick_rate, ticks_per_message, canvas.offset_x - canvas.border_width,
+                                canvas.width, canvas.height, canvas.border_width, canvas.radius, ticks, game_state,
+                                level, score, lives, paddle_x)
+    out += balls
+    out += multiball
+    out += drops
+    # mostly runs of the same few values, so hits compress well
+    packed = zlib.compress(hits)
+    write_varint(out, len(packed))
+    out += packed
+    return bytes(out)
+
+
+def encode_delta(old, new):
+    flags = 0
+    for flag, field in ((STATE, 1), (SCORE, 3), (LIVES, 4), (PADDLE, 5), (BALLS, 6), (MULTIBALL, 7), (BLOCKS, 8),
+                        (DROPS, 9)):
+        if old[field] != new[field]:
+            flags |= flag
+    out = bytearray([DELTA, flags])
+    write_varint(out, new[0] - old[0])
+    if flags & STATE:
+        out.append(new[1])
+    if flags & SCORE:
+        out += struct.pack('<i', new[3])
+    if flags & LIVES:
+        out += struct.pack('<H', new[4])
+    if flags & PADDLE:
+        out += struct.pack('<h', new[5])
+    if flags & BALLS:
+        out += new[6]
+    if flags & MULTIBALL:
+        out += new[7]
+    if flags & BLOCKS:
+        changed = np.flatnonzero(np.frombuffer(old[8], dtype=np.uint8) != np.frombuffer(new[8], dtype=np.uint8))
+        write_varint(out, len(changed))
+        for index in changed.tolist():
+            write_varint(out, index)
+            out.append(new[8][index])
+    if flags & DROPS:
+        out += new[9]
+    return bytes(out)
+
+
+class Viewer:
+    # one connection and the messages waiting to go out on it
+    def __init__(self, connection):
+        self.connection = connection
+        self.pending = deque()
+        self.sent = 0  # bytes of the first pending message already sent
+        self.queued = 0
+        self.needs_keyframe = True
+
+    def queue(self, message):
+        self.pending.append(message)
+        self.queued += len(message)
+
+    def skip(self):
+        # drops everything not yet started, the next message has to be a keyframe
+        while len(self.pending) > 1 or (self.pending and not self.sent):
+            self.queued -= len(self.pending.pop())
+        self.needs_keyframe = True
+
+    def flush(self):
+        # sends as much as the connection takes without blocking
+        while self.pending:
+            message = self.pending[0]
+            try:
+                sent = self.connection.send(message[self.sent:])
+            except BlockingIOError:
+                return
+            self.sent += sent
+            self.queued -= sent
+            if self.sent < len(message):
+                return
+            self.pending.popleft()
+            self.sent = 0
+
+
+class SpectatorServer:
+    # streams sim to every viewer listener accepts. call broadcast() after each
+    # tick, it sends a message at most rate times a second of game time.
+    max_queued = 256 * 1024  # bytes waiting for a viewer before it is skipped to a keyframe
+
+    def __init__(self, sim, listener, rate=60):
+        self.sim = sim
+        self.listener = listener
+        self.ticks_per_message = max(1, int(round(sim.tick_rate / float(rate))))
+        self.viewers = []
+        self.last = None
+        self.blocks = None
+
+    def broadcast(self):
+        while True:
+            connection = self.listener.accept()
+            if connection is None:
+                break
+            self.viewers.append(Viewer(connection))
+        sim = self.sim
+        if self.last is not None and sim.ticks - self.last[0] < self.ticks_per_message:
+            return
+        state = capture(sim)
+        keyframe = None
+        delta = None
+        if self.last is None or self.blocks is not sim.level.blocks or state[2] != self.last[2]:
+            # a new level, everyone starts again from a keyframe
+            for viewer in self.viewers:
+                viewer.needs_keyframe = True
+        else:
+            delta = frame(encode_delta(self.last, state))
+        self.last = state
+        self.blocks = sim.level.blocks
+        for viewer in list(self.viewers):
+            if viewer.needs_keyframe:
+                if keyframe is None:
+                    keyframe = frame(encode_keyframe(sim, self.ticks_per_message, state))
+                viewer.queue(keyframe)
+                viewer.needs_keyframe = False
+            else:
+                viewer.queue(delta)
+            try:
+                viewer.flush()
+            except OSError:
+                self.viewers.remove(viewer)
+                viewer.connection.close()
+                continue
+            if viewer.queued > self.max_queued:
+                viewer.skip()
+
+    def close(self):
+        for viewer in self.viewers:
+            viewer.connection.close()
+        self.viewers = []
+        self.listener.close()
+
+
+class SpectatorClient:
+    # reads the stream from connection and keeps self.snapshot, a
+    # simthread.Snapshot, up to date with it. game_levels must be the levels
+    # the game is played with, the stream only says which one is being played.
+    def __init__(self, connection, game_levels=None):
+        self.connection = connection
+        self.game_levels = game_levels if game_levels is not None else load_level_pack()
+        self.buffer = bytearray()
+        self.closed = False
+        self.sim = None
+        self.geometry = None
+        self.tick_rate = None
+        self.ticks_per_message = None
+        self.snapshot = None
+        self.tick = 0
+        self.state = None
+        self.level = None
+        self.score = 0
+        self.lives = 0
+        self.paddle = (0.0, 0.0)
+        self.balls = []
+        self.multiball = (np.zeros(0), np.zeros(0))
+        self.drops = (np.zeros(0), np.zeros(0), np.zeros(0, np.uint8))
+        self.hits = None
+        self.hits_bytes = None
+        self.layout = None
+
+    def poll(self):
+        # reads whatever has arrived and applies every complete message. returns how many there were.
+        while not self.closed:
+            try:
+                data = self.connection.recv(65536)
+            except BlockingIOError:
+                break
+            if not data:
+                self.closed = True
+                break
+            self.buffer += data
+        count = 0
+        offset = 0
+        while offset < len(self.buffer):
+            # the length varint may itself not have arrived in full
+            if not any(byte < 0x80 for byte in self.buffer[offset:offset + 5]):
+                break
+            length, start = read_varint(self.buffer, offset)
+            if start + length > len(self.buffer):
+                break
+            self.apply(bytes(self.buffer[start:start + length]))
+            offset = start + length
+            count += 1
+        del self.buffer[:offset]
+        return count
+
+    def apply(self, payload):
+        # positions interpolate from where the previous message left them
+        previous_balls = self.balls
+        previous_multiball = self.multiball
+        previous_drops = self.drops
+        previous_paddle = self.paddle[1]
+        if payload[0] == KEYFRAME:
+            offset = self.read_keyframe(payload)
+            previous_balls = None
+            previous_multiball = None
+            previous_drops = None
+            previous_paddle = self.paddle[0]
+        elif payload[0] == DELTA:
+            if self.tick_rate is None:
+                raise ValueError('delta before the first keyframe')
+            offset = self.read_delta(payload)
+        else:
+            raise ValueError('unknown message type %r' % payload[0])
+        if offset != len(payload):
+            raise ValueError('message has %d bytes left over' % (len(payload) - offset))
+        self.paddle = (previous_paddle, self.paddle[1])
+        self.publish(previous_balls, previous_multiball, previous_drops)
+
+    def read_keyframe(self, payload):
+        fields = keyframe_header.unpack_from(payload, 1)
+        if fields[0] != version:
+            raise ValueError('not a version %d spectator stream' % version)
+        self.tick_rate, self.ticks_per_message = fields[1:3]
+        geometry = fields[3:8]
+        self.tick, self.state, level, self.score, self.lives, paddle_x = fields[8:]
+        if geometry != self.geometry:
+            self.geometry = geometry
+            x, width, height, border_width, radius = geometry
+            self.sim = engine.Simulation(engine.Field(x, 0, width, height, border_width, radius), self.game_levels)
+            self.level = None
+        if level != self.level:
+            self.level = level
+            self.sim.level.new_level(level)
+            self.layout = BlockLayout(self.sim.level)
+        self.paddle = (paddle_x / float(position_scale), paddle_x / float(position_scale))
+        offset = self.read_balls(payload, 1 + keyframe_header.size)
+        offset = self.read_multiball(payload, offset)
+        offset = self.read_drops(payload, offset)
+        length, offset = read_varint(payload, offset)
+        self.hits = bytearray(zlib.decompress(payload[offset:offset + length]))
+        self.hits_bytes = bytes(self.hits)
+        return offset + length
+
+    def read_delta(self, payload):
+        flags = payload[1]
+        ticks, offset = read_varint(payload, 2)
+        self.tick += ticks
+        if flags & STATE:
+            self.state = payload[offset]
+            offset += 1
+        if flags & SCORE:
+            self.score = struct.unpack_from('<i', payload, offset)[0]
+            offset += 4
+        if flags & LIVES:
+            self.lives = struct.unpack_from('<H', payload, offset)[0]
+            offset += 2
+        if flags & PADDLE:
+            x = struct.unpack_from('<h', payload, offset)[0] / float(position_scale)
+            self.paddle = (x, x)
+            offset += 2
+        if flags & BALLS:
+            offset = self.read_balls(payload, offset)
+        if flags & MULTIBALL:
+            offset = self.read_multiball(payload, offset)
+        if flags & BLOCKS:
+            count, offset = read_varint(payload, offset)
+            for _ in range(count):
+                index, offset = read_varint(payload, offset)
+                self.hits[index] = payload[offset]
+                offset += 1
+            self.hits_bytes = bytes(self.hits)
+        if flags & DROPS:
+            offset = self.read_drops(payload, offset)
+        return offset
+
+    def read_balls(self, payload, offset):
+        count = payload[offset]
+        offset += 1
+        self.balls = []
+        for _ in range(count):
+            x, y, flags = ball_entry.unpack_from(payload, offset)
+            offset += ball_entry.size
+            self.balls.append((x / float(position_scale), y / float(position_scale), bool(flags & 1), bool(flags & 2)))
+        return offset
+
+    def read_multiball(self, payload, offset):
+        count = count_entry.unpack_from(payload, offset)[0]
+        offset += count_entry.size
+        positions = np.frombuffer(payload, dtype='<i2', count=count * 2, offset=offset) / float(position_scale)
+        self.multiball = (positions[:count], positions[count:])
+        return offset + count * 4
+
+    def read_drops(self, payload, offset):
+        count = count_entry.unpack_from(payload, offset)[0]
+        offset += count_entry.size
+        positions = np.frombuffer(payload, dtype='<i2', count=count * 2, offset=offset) / float(position_scale)
+        offset += count * 4
+        self.drops = (positions[:count], positions[count:], np.frombuffer(payload, np.uint8, count, offset))
+        return offset + count
+
+    def publish(self, previous_balls, previous_multiball, previous_drops):
+        if previous_balls is None or len(previous_balls) != len(self.balls):
+            previous_balls = self.balls
+        balls = tuple((px, py, x, y, visible, colliding)
+                      for (px, py, _, _), (x, y, visible, colliding) in zip(previous_balls, self.balls))
+        x, y = self.multiball
+        if previous_multiball is None or len(previous_multiball[0]) != len(x):
+            previous_multiball = self.multiball
+        multiball = (previous_multiball[0], previous_multiball[1], x, y)
+        # a drop caught or lost since the last message shifts the rest along, so those don't interpolate
+        x, y, kind = self.drops
+        if previous_drops is None or len(previous_drops[0]) != len(x):
+            previous_drops = self.drops
+        drops = (previous_drops[0], previous_drops[1], x, y, kind)
+        for array in multiball + drops:
+            array.flags.writeable = False
+        self.snapshot = Snapshot(tick=self.tick, time=time.perf_counter(), state=self.state, score=self.score,
+                                 lives=self.lives, layout=self.layout, hits=self.hits_bytes, balls=balls,
+                                 multiball=multiball, drops=drops,
+                                 paddle=(self.paddle[0], self.paddle[1], self.sim.paddle.y))
+
+
+class SocketListener:
+    # accepts viewers on a TCP port without blocking
+    def __init__(self, host='127.0.0.1', port=default_port):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen()
+        self.socket.setblocking(False)
+
+    def accept(self):
+        try:
+            connection, _ = self.socket.accept()
+        except BlockingIOError:
+            return None
+        connection.setblocking(False)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection
+
+    def close(self):
+        self.socket.close()
+
+
+def connect(host='127.0.0.1', port=default_port):
+    connection = socket.create_connection((host, port))
+    connection.setblocking(False)
+    return connection
+
+
+class LoopbackConnection:
+    # one end of an in-memory connection with the non-blocking socket calls the
+    # stream uses. at most capacity bytes can be waiting to be read at once.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.incoming = bytearray()
+        self.peer = None
+        self.closed = False
+
+    def send(self, data):
+        if self.closed or self.peer.closed:
+            raise ConnectionResetError('loopback connection closed')
+        room = self.capacity - len(self.peer.incoming)
+        if room <= 0:
+            raise BlockingIOError()
+        data = data[:room]
+        self.peer.incoming += data
+        return len(data)
+
+    def recv(self, size):
+        if not self.incoming:
+            if self.peer.closed:
+                return b''
+            raise BlockingIOError()
+        data = bytes(self.incoming[:size])
+        del self.incoming[:size]
+        return data
+
+    def close(self):
+        self.closed = True
+
+
+class LoopbackListener:
+    # stands in for SocketListener in tests: connect() returns the viewer's end
+    # of a new connection and the server picks up the other end
+    def __init__(self, capacity=64 * 1024):
+        self.capacity = capacity
+        self.waiting = deque()
+
+    def connect(self):
+        server_end = LoopbackConnection(self.capacity)
+        viewer_end = LoopbackConnection(self.capacity)
+        server_end.peer = viewer_end
+        viewer_end.peer = server_end
+        self.waiting.append(server_end)
+        return viewer_end
+
+    def accept(self):
+        return self.waiting.popleft() if self.waiting else None
+
+    def close(self):
+        self.waiting.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Watch a game started with main.py --spectate')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=default_port)
+    parser.add_argument('--levels', default='assets/levels.txt', help='the level file the game is played with')
+    args = parser.parse_args(argv)
+    with load_level_pack(args.levels) as game_levels:
+        return watch(SpectatorClient(connect(args.host, args.port), game_levels))
+
+
+def watch(client):
+    # shows client's stream in a window until either end closes it
+    import pygame
+    import main as game_main
+    from engine import Game
+    from resources import AssetManager
+
+    while client.snapshot is None:
+        client.poll()
+        if client.closed:
+            print('the game closed the connection')
+            return 1
+        time.sleep(0.01)
+
+    pygame.font.init()
+    assets = AssetManager()
+    field_x, width, height, border_width, radius = client.geometry
+    window = game_main.initialize(field_x + width + border_width * 2, height, 'breakout spectator')
+    assets.convert()
+    canvas = game_main.Canvas(Game(), assets, field_x, 0, radius)
+    view = game_main.SnapshotView(client, client.tick_rate / float(client.ticks_per_message), canvas, assets)
+    clock = pygame.time.Clock()
+    while not client.closed:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return 0
+        client.poll()
+        window.fill(game_main.black)
+        view.draw(window)
+        pygame.display.update()
+        clock.tick(60)
+    print('the game closed the connection')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
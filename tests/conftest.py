@@ -0,0 +1,7 @@
+# coding=utf-8
+import os, sys
+
+# headless, and the modules sit at the top of the repo
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,46 @@
+# coding=utf-8
+import numpy as np
+import pygame
+import pytest
+
+from blocks import BlockTable, entry_dtype
+
+
+def sample_entries():
+    entries = np.zeros(4, entry_dtype)
+    entries['bx'] = [0, 3, 7, 2]
+    entries['by'] = [0, 0, 1, 5]
+    entries['material'] = [b'A', b'S', b'F', b'S']
+    entries['reward'] = [b'.', b'L', b'B', b'S']
+    return entries
+
+
+def test_entries_round_trip():
+    entries = sample_entries()
+    table = BlockTable.from_entries(entries)
+    assert len(table) == 4
+    assert table.entries().tobytes() == entries.tobytes()
+    # S blocks take three hits, the rest one
+    assert table.hits.tolist() == [1, 3, 1, 3]
+
+
+def test_layout_matches_rect_math():
+    table = BlockTable.from_entries(sample_entries())
+    x, y, width, height = 170.5, 93, 37.3, 14
+    table.layout(x, y, width, height, 10)
+    for block in table:
+        assert block['rect'] == pygame.Rect(x + block['bx'] * width, y + block['by'] * height, width, height)
+
+
+def test_view_writes_hits_through():
+    table = BlockTable.from_entries(sample_entries())
+    block = table[1]
+    assert (block['material'], block['reward']) == ('S', 'L')
+    block['hits'] = 1
+    assert table.hits[1] == 1
+    assert table.column('hits')[1] == 1
+    assert table[-3] == block
+    with pytest.raises(KeyError):
+        block['material'] = 'A'
+    with pytest.raises(IndexError):
+        table[4]
@@ -0,0 +1,60 @@
+# coding=utf-8
+import math
+
+import engine
+from engine import Game, Input
+from levelpack import parse_levels
+
+
+def one_row_sim(material):
+    # a level of one row of blocks, with balls launched faster than a block is high
+    levels = list(parse_levels([' '.join([material + '.'] * 16), 'name:One row']))
+    sim = engine.Simulation(game_levels=levels, seed=3)
+    level = sim.level
+    level.lives = 1000
+    level.ball_speed = (level.block_height + 2 * sim.radius + 3) / sim.speed_scale
+    assert level.ball_speed * sim.speed_scale >= level.block_height
+    return sim
+
+
+def overlaps_live_block(sim, ball):
+    blocks = sim.level.blocks
+    for index in range(len(blocks)):
+        if blocks.hits[index] == 0:
+            continue
+        # distance from the ball's centre to the block's rect
+        dx = max(blocks.left[index] - ball.x, 0, ball.x - blocks.right[index])
+        dy = max(blocks.top[index] - ball.y, 0, ball.y - blocks.bottom[index])
+        if math.hypot(dx, dy) < ball.radius - 1e-6:
+            return True
+    return False
+
+
+def test_fast_ball_does_not_tunnel_through_a_row():
+    sim = one_row_sim('S')
+    sim.step(Input.KEY | Input.LAUNCH)
+    sim.step()
+    ball = sim.balls[0]
+    blocks = sim.level.blocks
+    index = len(blocks) // 2
+    # straight up under the middle block
+    ball.move((blocks.left[index] + blocks.right[index]) / 2, blocks.bottom[index] + 100)
+    ball.heading = math.pi
+    ball.set_speed(ball.speed)
+    for _ in range(20):
+        sim.step()
+        assert ball.y - ball.radius >= blocks.bottom[index] - 1e-6
+        if blocks.hits[index] < 3:
+            break
+    assert blocks.hits[index] == 2
+
+
+def test_fast_ball_never_ends_a_tick_inside_a_block():
+    sim = one_row_sim('A')
+    for _ in range(3000):
+        if sim.step(Input.KEY | Input.LAUNCH) == Game.WIN:
+            break
+        for ball in sim.balls:
+            assert not overlaps_live_block(sim, ball)
+    # some blocks were hit along the way
+    assert sum(sim.level.blocks.hits) < len(sim.level.blocks)
@@ -0,0 +1,107 @@
+# coding=utf-8
+import math
+
+import pytest
+
+import engine
+from engine import Input
+from levelpack import parse_levels
+
+
+def start(event_driven=False):
+    # a ball in play at twice the base tick rate
+    sim = engine.Simulation(game_levels=list(parse_levels(['AL AS', 'name:Two'])), seed=1,
+                            tick_rate=engine.base_tick_rate * 2, event_driven=event_driven)
+    sim.step(Input.KEY | Input.LAUNCH)
+    sim.step()
+    return sim
+
+
+def paddle_centre(sim):
+    return sim.paddle.x + sim.canvas.offset_x, sim.paddle.y + sim.canvas.offset_y
+
+
+def test_drop_falls_and_is_caught():
+    sim = start()
+    level = sim.level
+    drops = level.drops
+    lives = level.lives
+    px, py = paddle_centre(sim)
+    drops.spawn(px + 10, py - 100, ord('L'))
+    assert drops.count == 1
+    step = drops.fall_speed * sim.speed_scale
+    for n in range(1, 1000):
+        drops.update()
+        if not drops.count:
+            break
+        assert drops.y[0] == py - 100 + n * step
+    assert level.lives == lives + 1
+    # caught as soon as it overlaps the paddle
+    assert py - 100 + n * step > py - (drops.height + sim.paddle.height) / 2
+
+
+def test_missed_drop_is_lost_below_the_field():
+    sim = start()
+    level = sim.level
+    drops = level.drops
+    lives = level.lives
+    px, py = paddle_centre(sim)
+    x = px + sim.paddle.width if px < sim.canvas.ball_box.inside_rect.centerx else px - sim.paddle.width
+    drops.spawn(x, py - 100, ord('L'))
+    drops.spawn(px, py - 100, ord('B'))
+    bottom = sim.canvas.ball_box.inside_rect.bottom
+    while drops.count:
+        drops.update()
+        assert (drops.y[:drops.count] - drops.height / 2 < bottom).all()
+    assert level.lives == lives
+    assert level.multiball.count == 2
+
+
+def test_full_pool_drops_no_more():
+    sim = start()
+    drops = sim.level.drops
+    for i in range(drops.capacity + 5):
+        drops.spawn(300 + i, 50, ord('S'))
+    assert drops.count == drops.capacity
+    assert drops.x[drops.capacity - 1] == 300 + drops.capacity - 1
+
+
+@pytest.mark.parametrize('event_driven', [False, True])
+def test_slow_drops_slow_every_ball_down_to_min_speed(event_driven):
+    sim = start(event_driven)
+    level = sim.level
+    level.collect(ord('B'))
+    multiball = level.multiball
+    ball = sim.balls[0]
+    speed = ball.speed
+    level.collect(ord('S'))
+    ball = sim.balls[0]
+    assert math.hypot(ball.dx, ball.dy) == pytest.approx(speed * level.slow_down)
+    assert ball.speed == pytest.approx(speed * level.slow_down)
+    speeds = [math.hypot(dx, dy) for dx, dy in zip(multiball.dx[:2], multiball.dy[:2])]
+    assert speeds == pytest.approx([speed * level.slow_down] * 2)
+    for _ in range(10):
+        level.collect(ord('S'))
+    slowest = level.ball_speed * sim.speed_scale * level.min_speed
+    assert math.hypot(sim.balls[0].dx, sim.balls[0].dy) == pytest.approx(slowest)
+    assert [math.hypot(dx, dy) for dx, dy in zip(multiball.dx[:2], multiball.dy[:2])] == pytest.approx([slowest] * 2)
+
+
+@pytest.mark.parametrize('event_driven', [False, True])
+def test_ball_drops_split_every_ball_in_play(event_driven):
+    sim = start(event_driven)
+    level = sim.level
+    multiball = level.multiball
+    # the ball has moved on since its last update in event-driven mode
+    sim.advance(5)
+    ball = sim.balls[0]
+    level.collect(ord('B'))
+    assert multiball.count == 2
+    assert multiball.x[:2].tolist() == [ball.x] * 2 and multiball.y[:2].tolist() == [ball.y] * 2
+    heading = math.atan2(ball.dy, ball.dx)
+    turns = sorted(math.atan2(dy, dx) - heading for dx, dy in zip(multiball.dx[:2], multiball.dy[:2]))
+    assert turns == pytest.approx([-multiball.spread, multiball.spread])
+    # each of the three balls in play now releases two more
+    level.collect(ord('B'))
+    assert multiball.count == 8
+    assert len(sim.balls) == 1
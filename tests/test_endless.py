@@ -0,0 +1,24 @@
+# coding=utf-8
+import endless
+from engine import Input
+
+
+def play(event_driven, skip):
+    sim = endless.EndlessSimulation(seed=7, event_driven=event_driven)
+    sim.step(Input.KEY | Input.LAUNCH)
+    if skip:
+        sim.advance(600)
+    else:
+        for _ in range(600):
+            sim.step()
+    level = sim.level
+    balls = [(ball.x, ball.y, ball.dx, ball.dy) for ball in sim.balls]
+    return (sim.ticks, sim.game.state, level.lives, level.rows_scrolled, level.chunks_read, level.offset, level.scroll,
+            level.blocks.hits.tobytes(), balls)
+
+
+def test_advance_scrolls_like_step():
+    expected = play(False, False)
+    assert expected[3] > 0
+    assert play(True, False) == expected
+    assert play(True, True) == expected
@@ -0,0 +1,55 @@
+# coding=utf-8
+import engine
+from bench import follow_ball
+from engine import Game, Input
+from levelpack import parse_levels
+
+# small levels with every reward, so a short game has multiballs, drops and a level change
+level_lines = ['SB AL SB AS', 'AB .. .. SL', 'name:First', 'BB AS', 'name:Second']
+
+
+def start(event_driven):
+    sim = engine.Simulation(game_levels=list(parse_levels(level_lines)), seed=2, event_driven=event_driven)
+    sim.level.lives = 1000
+    return sim
+
+
+def snapshot(sim):
+    level = sim.level
+    n = level.multiball.count
+    k = level.drops.count
+    return (sim.ticks, sim.game.state, level.current_level, level.score, level.lives, sim.paddle.x,
+            tuple((ball.x, ball.y, ball.dx, ball.dy, ball.visible, ball.motion_enabled) for ball in sim.balls),
+            level.resting_ball is not None, level.blocks.hits.tobytes(), level.multiball.x[:n].tobytes(),
+            level.multiball.y[:n].tobytes(), level.multiball.dx[:n].tobytes(), level.multiball.dy[:n].tobytes(),
+            level.drops.x[:k].tobytes(), level.drops.y[:k].tobytes(), level.drops.kind[:k].tobytes())
+
+
+def test_event_driven_plays_like_fixed_ticks():
+    sim = start(False)
+    # a lazy paddle, so there are long runs of no input for advance to skip
+    runs = []
+    states = {}
+    levels = set()
+    multiballs = drops = 0
+    while sim.game.state != Game.WIN:
+        inputs = follow_ball(sim) if sim.ticks % 3 == 0 else Input.NONE
+        if runs and runs[-1][0] == inputs:
+            runs[-1][1] += 1
+        else:
+            runs.append([inputs, 1])
+        sim.step(inputs)
+        states[sim.ticks] = snapshot(sim)
+        levels.add(sim.level.current_level)
+        multiballs = max(multiballs, sim.level.multiball.count)
+        drops = max(drops, sim.level.drops.count)
+        assert sim.ticks < 20000
+    assert levels == {0, 1} and multiballs and drops
+
+    sim = start(True)
+    skipped = 0
+    for inputs, count in runs:
+        skipped += min(sim.idle_ticks(inputs), count)
+        sim.advance(count, inputs)
+        assert snapshot(sim) == states[sim.ticks]
+    assert skipped > len(states) // 4
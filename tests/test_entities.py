@@ -0,0 +1,55 @@
+# coding=utf-8
+import entities
+
+
+class Mover:
+    update_layer = 1
+    update_states = (1,)
+
+    def __init__(self, log, registry=None):
+        self.log = log
+        self.registry = registry
+        self.victim = None
+
+    def update(self):
+        self.log.append(self)
+        if self.victim is not None:
+            self.registry.remove(self.victim)
+
+
+class Early(Mover):
+    update_layer = 0
+    update_states = None
+
+
+class Still:
+    def draw(self, surface):
+        pass
+
+
+def test_updates_scheduled_by_state_and_layer():
+    log = []
+    registry = entities.Registry()
+    first = Mover(log, registry)
+    second = Mover(log)
+    early = Early(log)
+    registry.add(Still())
+    registry.add(first)
+    first.victim = registry.add(second)
+    registry.add(early)
+    for o in registry.updated(1):
+        o.update()
+    # second was removed by first before its turn came
+    assert log == [early, first]
+    assert list(registry.updated(2)) == [early]
+
+
+def test_new_entity_of_a_known_type_keeps_the_schedules():
+    registry = entities.Registry()
+    registry.add(Mover([]))
+    schedule = registry.updating(1)
+    registry.add(Mover([]))
+    assert registry.updating(1) is schedule
+    assert len(list(registry.updated(1))) == 2
+    registry.add(Early([]))
+    assert registry.updating(1) is not schedule
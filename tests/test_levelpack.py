@@ -0,0 +1,44 @@
+# coding=utf-8
+import os
+
+import engine
+from levelpack import load_level_pack
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def names(pack):
+    return [pack[i]['name'] for i in range(len(pack))]
+
+
+def test_stale_pack_is_rebuilt(tmp_path):
+    source = str(tmp_path / 'levels.txt')
+    with open(source, 'w') as levels:
+        levels.write('AB .. SL\nname:Old\n')
+    with load_level_pack(source) as pack:
+        assert names(pack) == ['Old']
+    stat = os.stat(source)
+    # the same size, so only the mtime tells the pack is stale
+    with open(source, 'w') as levels:
+        levels.write('SL .. AB\nname:New\n')
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+    with load_level_pack(source) as pack:
+        assert names(pack) == ['New']
+        assert pack[0]['blocks'].entries().tolist() == [(0, 0, b'S', b'L'), (2, 0, b'A', b'B')]
+    # up to date now, used as is
+    with load_level_pack(source) as pack:
+        assert pack.is_current(source)
+
+
+def test_simulation_closes_only_the_pack_it_opened(monkeypatch):
+    monkeypatch.chdir(root)
+    with engine.Simulation(seed=1) as sim:
+        pack = sim.level_pack
+        assert len(pack) == sim.level.level_count
+        assert not pack.data.closed
+    assert pack.data.closed and pack.file.closed
+    sim.close()
+    with load_level_pack() as pack:
+        with engine.Simulation(game_levels=pack, seed=1):
+            pass
+        assert not pack.data.closed
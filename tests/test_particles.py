@@ -0,0 +1,22 @@
+# coding=utf-8
+import pygame
+import pytest
+
+import particles
+
+
+@pytest.mark.parametrize('depth', [16, 24])
+def test_draw_pixels_on_other_depths(depth):
+    # the same pixels as drawing on a 32 bit surface and converting
+    pool = particles.ParticlePool(pygame.Rect(0, 0, 200, 100), seed=1)
+    for size in (1, 2, 3):
+        pool.emit(100, 50, 200, (200, 120, 60), 4, 40, size, 10)
+    pool.update()
+    reference = pygame.Surface((200, 100), depth=32)
+    pool.draw_pixels(reference)
+    expected = pygame.Surface((200, 100), depth=depth)
+    expected.blit(reference, (0, 0))
+    surface = pygame.Surface((200, 100), depth=depth)
+    pool.draw_pixels(surface)
+    assert (pygame.surfarray.array3d(surface) == pygame.surfarray.array3d(expected)).all()
+    assert pygame.surfarray.array3d(surface).any()
@@ -0,0 +1,26 @@
+# coding=utf-8
+import numpy as np
+
+import pool
+
+
+class Pairs(pool.MovingPool):
+    capacity = 4
+    fields = pool.MovingPool.fields + (('tag', np.uint8, ()),)
+
+
+def test_add_and_keep_move_every_field_together():
+    pairs = Pairs()
+    pairs.add(np.arange(3.0), np.arange(3.0) * 2, np.array([7, 8, 9]))
+    # only one more fits
+    pairs.add(np.array([5.0, 6.0]), np.array([1.0, 1.0]), np.array([4, 4]))
+    assert pairs.count == 4
+    pairs.x[:4] += 10
+    pairs.keep(np.array([True, False, True, True]))
+    assert pairs.count == 3
+    assert pairs.x[:3].tolist() == [10.0, 12.0, 15.0]
+    assert pairs.prev_x[:3].tolist() == [0.0, 2.0, 5.0]
+    assert pairs.y[:3].tolist() == [0.0, 4.0, 1.0]
+    assert pairs.tag[:3].tolist() == [7, 9, 4]
+    xs, _ = pairs.get_positions(0.5)
+    assert xs.tolist() == [5.0, 7.0, 10.0]
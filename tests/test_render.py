@@ -0,0 +1,45 @@
+# coding=utf-8
+import pygame
+import pytest
+
+import render
+
+
+class EmptyWorld:
+    def visible(self):
+        return []
+
+
+@pytest.fixture
+def window():
+    pygame.display.init()
+    window = render.video.Window('test', (64, 48))
+    yield window
+    window.destroy()
+    pygame.display.quit()
+
+
+@pytest.mark.skipif(render.video is None, reason='this pygame has no pygame._sdl2.video')
+def test_texture_fill_takes_rgb_tuples(window):
+    # the background and fill colors main.py passes are plain (r, g, b) tuples
+    renderer = render.TextureRenderer(window, EmptyWorld(), (0, 0, 255))
+    renderer.draw()
+    renderer.fill((255, 0, 0), (0, 0, 32, 48))
+    frame = renderer.to_surface()
+    assert frame.get_at((8, 8))[:3] == (255, 0, 0)
+    assert frame.get_at((40, 8))[:3] == (0, 0, 255)
+
+
+def test_digit_counter_widens_for_more_digits():
+    pygame.font.init()
+    font = pygame.font.Font(None, 20)
+    counter = render.DigitCounter(font, (255, 255, 255), 'Score: ', 6)
+    label_width = counter.label.get_width()
+    assert counter.get(123).get_width() == label_width + counter.digit_width * 6
+    # seven digits no longer fit, and the last one isn't cut off
+    surface = counter.get(1234567)
+    assert surface.get_width() == label_width + counter.digit_width * 7
+    wide = render.DigitCounter(font, (255, 255, 255), 'Score: ', 7)
+    assert pygame.image.tobytes(surface, 'RGBA') == pygame.image.tobytes(wide.get(1234567), 'RGBA')
+    # and stays wide, zero padded
+    assert pygame.image.tobytes(counter.get(42), 'RGBA') == pygame.image.tobytes(wide.get(42), 'RGBA')
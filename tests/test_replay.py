@@ -0,0 +1,71 @@
+# coding=utf-8
+import engine
+import replay
+import rewind
+from bench import follow_ball
+from engine import Game, Input
+from levelpack import parse_levels
+
+level_lines = ['SB AL SB AS', 'AB .. .. SL', 'name:First', 'BB AS', 'name:Second']
+
+
+def levels():
+    # every game and replay gets its own copy, as blocks are hit in place
+    return list(parse_levels(level_lines))
+
+
+def play(sim, recorder, ticks, history=None):
+    for _ in range(ticks):
+        inputs = follow_ball(sim)
+        recorder.record(inputs)
+        sim.step(inputs)
+        if history:
+            history.record()
+        if sim.game.state in (Game.WIN, Game.LOSS):
+            break
+
+
+def test_varints_round_trip():
+    out = bytearray()
+    values = [0, 1, 127, 128, 300, 1 << 21, (1 << 32) - 1]
+    for value in values:
+        replay.write_varint(out, value)
+    assert len(out) == 1 + 1 + 1 + 2 + 2 + 4 + 5
+    offset = 0
+    for value in values:
+        read, offset = replay.read_varint(out, offset)
+        assert read == value
+    assert offset == len(out)
+
+
+def test_recording_replays_to_the_same_state():
+    sim = engine.Simulation(game_levels=levels(), seed=9)
+    recorder = replay.Recorder(sim)
+    # a long idle run, so some counts take more than one varint byte
+    for _ in range(300):
+        recorder.record(Input.NONE)
+        sim.step()
+    play(sim, recorder, 3000)
+    assert sim.level.current_level == 1
+    recording = replay.Replay(recorder.encode())
+    assert recording.final_state == replay.final_state(sim)
+    assert recording.runs == [tuple(run) for run in recorder.runs]
+    assert recording.runs[0] == (Input.NONE, 300)
+    assert recording.verify(levels()) == []
+
+
+def test_truncated_recording_replays_after_a_rewind():
+    sim = engine.Simulation(game_levels=levels(), seed=4)
+    recorder = replay.Recorder(sim)
+    history = rewind.Rewind(sim, seconds=30)
+    play(sim, recorder, 1000, history)
+    assert history.back(250) == 250
+    recorder.truncate(sim.ticks)
+    assert sum(count for inputs, count in recorder.runs) == sim.ticks == 750
+    # play on differently from the rewound ticks
+    for _ in range(40):
+        recorder.record(Input.LEFT)
+        sim.step(Input.LEFT)
+        history.record()
+    play(sim, recorder, 500, history)
+    assert replay.Replay(recorder.encode()).verify(levels()) == []
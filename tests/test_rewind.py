@@ -0,0 +1,52 @@
+# coding=utf-8
+import pytest
+
+import engine
+import rewind
+from bench import follow_ball
+from engine import Game
+from levelpack import parse_levels
+
+# small levels with every reward, so a short game has multiballs, drops and a level change
+level_lines = ['SB AL SB AS', 'AB .. .. SL', 'name:First', 'BB AS', 'name:Second']
+
+
+def snapshot(sim):
+    level = sim.level
+    n = level.multiball.count
+    k = level.drops.count
+    return (sim.ticks, sim.game.state, level.current_level, level.score, level.lives, sim.paddle.x,
+            tuple((ball.x, ball.y, ball.dx, ball.dy, ball.visible, ball.motion_enabled) for ball in sim.balls),
+            level.resting_ball is not None, level.blocks.hits.tobytes(), level.multiball.x[:n].tobytes(),
+            level.multiball.y[:n].tobytes(), level.drops.y[:k].tobytes(), level.drops.kind[:k].tobytes())
+
+
+@pytest.mark.parametrize('event_driven', [False, True])
+def test_rewound_game_plays_out_the_same(event_driven):
+    sim = engine.Simulation(game_levels=list(parse_levels(level_lines)), seed=11, event_driven=event_driven)
+    history = rewind.Rewind(sim, seconds=100)
+    states = {0: snapshot(sim)}
+    inputs = []
+    changed = None
+    multiballs = drops = 0
+    while changed is None or sim.ticks < changed + 200:
+        inputs.append(follow_ball(sim))
+        level = sim.level.current_level
+        sim.step(inputs[-1])
+        history.record()
+        states[sim.ticks] = snapshot(sim)
+        multiballs = max(multiballs, sim.level.multiball.count)
+        drops = max(drops, sim.level.drops.count)
+        if changed is None and sim.level.current_level != level:
+            changed = sim.ticks
+        assert sim.game.state not in (Game.WIN, Game.LOSS)
+    assert multiballs and drops
+
+    # back to before the level change, then the same inputs again
+    start = changed - 300
+    history.restore(start)
+    assert snapshot(sim) == states[start]
+    for ticks in range(start, len(inputs)):
+        sim.step(inputs[ticks])
+        history.record()
+        assert snapshot(sim) == states[sim.ticks]
@@ -0,0 +1,80 @@
+# coding=utf-8
+import engine
+import spectate
+from bench import follow_ball
+from engine import Game, Input
+from levelpack import parse_levels
+
+# two small levels, so a short game gets through a level change
+level_lines = ['.. AL SB ..', 'A. .. .. S.', 'name:First', 'B. AS', 'name:Second']
+
+
+class CountingClient(spectate.SpectatorClient):
+    keyframes = 0
+
+    def read_keyframe(self, payload):
+        self.keyframes += 1
+        return spectate.SpectatorClient.read_keyframe(self, payload)
+
+
+def start(capacity=64 * 1024):
+    sim = engine.Simulation(game_levels=list(parse_levels(level_lines)), seed=5)
+    listener = spectate.LoopbackListener(capacity)
+    server = spectate.SpectatorServer(sim, listener, rate=sim.tick_rate)
+    # the viewer has its own copy of the levels, like a separate process would
+    client = CountingClient(listener.connect(), list(parse_levels(level_lines)))
+    return sim, server, client
+
+
+def assert_in_sync(sim, client):
+    scale = float(spectate.position_scale)
+    assert client.tick == sim.ticks
+    assert client.state == sim.game.state
+    assert client.level == sim.level.current_level
+    assert client.score == sim.level.score
+    assert client.lives == sim.level.lives
+    assert bytes(client.hits) == sim.level.blocks.hits.tobytes()
+    assert len(client.balls) == len(sim.balls)
+    for (x, y, visible, colliding), ball in zip(client.balls, sim.balls):
+        assert abs(x - ball.x) <= 0.5 / scale and abs(y - ball.y) <= 0.5 / scale
+        assert visible == bool(ball.visible) and colliding == ball.colliding_with_block
+
+
+def test_client_follows_keyframes_and_deltas():
+    sim, server, client = start()
+    levels_seen = set()
+    for tick in range(4000):
+        if tick == 100:
+            # more lives than fit in a byte, as caught L drops can give
+            sim.level.lives = 300
+        sim.step(follow_ball(sim))
+        server.broadcast()
+        assert client.poll() == 1
+        assert_in_sync(sim, client)
+        levels_seen.add(sim.level.current_level)
+        if sim.game.state in (Game.WIN, Game.LOSS):
+            break
+    assert levels_seen == {0, 1}
+    # the first message and the level change
+    assert client.keyframes == 2
+
+
+def test_slow_viewer_resyncs_from_a_keyframe():
+    sim, server, client = start(capacity=512)
+    server.max_queued = 4096
+    sim.step(Input.KEY | Input.LAUNCH)
+    server.broadcast()
+    client.poll()
+    assert client.keyframes == 1
+    # the viewer stops reading while the game goes on, until it is skipped
+    for _ in range(600):
+        sim.step(follow_ball(sim))
+        server.broadcast()
+    for _ in range(600):
+        sim.step(follow_ball(sim))
+        server.broadcast()
+        client.poll()
+        if client.keyframes > 1 and client.tick == sim.ticks:
+            break
+    assert client.keyframes > 1
+    assert_in_sync(sim, client)